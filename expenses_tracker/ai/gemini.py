@@ -1,17 +1,24 @@
 import logging
-from datetime import datetime
 
-from expenses_tracker.config import Config
+from expenses_tracker.ai.insights_cache import InsightsCache, cache_dir, prompt_key
+from expenses_tracker.ai.map_reduce import map_reduce_prompt
+from expenses_tracker.ai.prompt_builder import (
+    build_expenses_summary, estimate_tokens, prompt_size_report, DEFAULT_TOKEN_BUDGET, DEFAULT_SAMPLE_ROWS
+)
+from expenses_tracker.config import Config, setup_logging
+from expenses_tracker.data_process import store
+from expenses_tracker.diagnostics import span
 import os
+import sys
 from pathlib import Path
 import google.generativeai as genai
 
 config = Config()
 DATA_DIR = config.data_folder
 GEMINI_KEY = config.gemini['key']
+MODEL_NAME = "gemini-1.5-flash"
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
 
 def get_user_background():
@@ -20,60 +27,118 @@ def get_user_background():
         return f.read()
 
 
-def get_user_expenses():
-    if os.getenv('DEMO') == '1':
-        logger.info("using demo files")
-        files = list(Path(DATA_DIR).glob('*demo_expenses*.md'))
-    else:
-        files = list(Path(DATA_DIR).glob('*transactions*.md'))
+FULL_TEXT_SAMPLE_ROWS = 1_000
+
+
+def full_expenses_text(df) -> str:
+    """every transaction as csv"""
+    df = df.drop(columns=[store.SOURCE_COL])
+    df = df.dropna(axis=1, how='all')  # drop columns the statements leave empty
+    return df.to_csv(index=False, date_format='%Y-%m-%d')
+
+
+def estimate_full_chars(df) -> int:
+    """length of full_expenses_text, from evenly spread sample rows (the whole ledger as csv is slow to build)"""
+    sample = df.iloc[::max(1, len(df) // FULL_TEXT_SAMPLE_ROWS)]
+    return round(len(full_expenses_text(sample)) * len(df) / len(sample))
+
 
-    logger.info(f"found {len(files)} expenses files")
-    return "\n\n".join([f"{Path(f).read_text()}" for f in files])
+def get_user_expenses(token_budget=DEFAULT_TOKEN_BUDGET, sample_rows=DEFAULT_SAMPLE_ROWS):
+    df = store.load_store()
+    logger.info(f"found {len(df)} transactions in store")
+    if df.empty:
+        return ""
 
+    summary = build_expenses_summary(df, token_budget, sample_rows)
+    report = prompt_size_report(estimate_full_chars(df), summary)
+    logger.info(f"expenses prompt size: {report}")
+    return summary
 
-def get_user_insights(prompt="") -> Path or None:
+
+def get_user_insights(prompt="", chunked=False, period='M', stream=None, use_cache=True) -> Path or None:
+    """chunked: summarize each period (month 'M' or quarter 'Q') concurrently, then combine them.
+    for long histories that do not fit in one prompt.
+    stream: write the answer to the insights file as it arrives (default from config).
+    None if gemini is not configured or there are no expenses"""
     if os.getenv('DEMO') == '1':
         insights_file = Path(DATA_DIR) / "demo_insights.md"
         return insights_file
-    else:
-        if not GEMINI_KEY:
-            logger.error("Gemini key not configured")
-            return None
-        genai.configure(api_key=GEMINI_KEY)
-
-        if not prompt:
-            prompt = get_prompt()
 
-        model_str = "gemini-1.5-flash"
-        model = genai.GenerativeModel(model_str)
-        logger.info(f"generating content from gemini. model={model_str}")
-        response = model.generate_content(prompt)
+    if not GEMINI_KEY:
+        logger.error("Gemini key not configured")
+        return None
+    genai.configure(api_key=GEMINI_KEY)
+
+    model = genai.GenerativeModel(MODEL_NAME)
+    if chunked:
+        prompt = map_reduce_prompt(model, MODEL_NAME, store.load_store(), get_user_background(), period)
+    elif not prompt:
+        prompt = get_prompt()
+        if prompt is None:
+            return None
 
-    print(response.text)
+    logger.info(f"generating content from gemini. model={MODEL_NAME}, chunked={chunked}")
+    return generate_insights(model, MODEL_NAME, prompt, stream, use_cache)
+
+
+def get_insights_cache() -> InsightsCache:
+    options = config.insights
+    return InsightsCache(cache_dir(DATA_DIR), options['cache_max_age_days'],
+                         options['cache_max_size_mb'])
+
+
+def generate_insights(model, model_name: str, prompt: str, stream=None, use_cache=True) -> Path:
+    """insights file of the prompt: the cached one if this prompt was answered before, otherwise generated"""
+    stream = config.insights['stream'] if stream is None else stream
+    cache = get_insights_cache()
+    key = prompt_key(model_name, prompt)
+
+    cached_file = cache.get(key) if use_cache else None
+    if cached_file:
+        logger.info(f"insights unchanged, from cache: {cached_file}")
+        return cached_file
+
+    # written to a partial file, so a running dashboard shows insights are being generated
+    try:
+        with (span("llm.generate", model=model_name, prompt_tokens=estimate_tokens(prompt), stream=stream),
+              cache.open_partial(key) as f):
+            if stream:
+                for chunk in model.generate_content(prompt, stream=True):
+                    f.write(chunk.text)
+                    f.flush()
+                    print(chunk.text, end="", flush=True)
+                print()
+            else:
+                text = model.generate_content(prompt).text
+                f.write(text)
+                print(text)
+    except Exception:
+        cache.discard(key)
+        raise
+    insights_file = cache.commit(key)
 
-    insights_file = Path(DATA_DIR) / f"user_insights_gemini_{datetime.now().strftime("%d-%m-%Y, %H-%M")}.md"
-    insights_file.write_text(response.text)
     logger.info(f"insights saved to {insights_file}")
-
     return insights_file
 
 
-def get_prompt():
-    expenses = get_user_expenses()
+def get_prompt(token_budget=DEFAULT_TOKEN_BUDGET, sample_rows=DEFAULT_SAMPLE_ROWS) -> str | None:
+    """None if there are no expenses"""
+    expenses = get_user_expenses(token_budget, sample_rows)
     if not expenses:
         logger.error("No expenses files found")
-        exit(1)
+        return None
 
     prompt = f"""You are helping the user to manage and get insights about their expenses.
 User background:
 {get_user_background()}
 
-User expenses are credit card transactions from markdown files provided here:
+User expenses are summaries of their credit card transactions (amounts in ILS):
 {expenses}
 
 Please read the user's background and understand the user's expenses. 
 then provide insights in markdown format. be concise:
 - What are the user's main expenses?
+- Subscriptions and installments: are any worth cancelling, and what is still left to pay?
 - Short recommendations
 - Summary and any other insights you can provide
 """
@@ -82,5 +147,8 @@ then provide insights in markdown format. be concise:
 
 
 if __name__ == "__main__":
+    setup_logging()
     p = get_prompt()
+    if p is None:
+        sys.exit(1)
     print(get_user_insights(p))
@@ -0,0 +1,99 @@
+"""
+generated insights, cached by content: the file name is a hash of the model name and the prompt.
+the prompt holds the user background and the expenses summary, so an unchanged prompt is not sent again.
+
+entries older than max_age_days are evicted, then the least recently used ones until the cache fits max_size_mb.
+while an answer is streamed it is written to <hash>.md.partial, renamed to <hash>.md when complete.
+"""
+import hashlib
+import logging
+import os
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+INSIGHTS_CACHE_DIRNAME = "insights_cache"
+PARTIAL_SUFFIX = ".partial"
+MAX_AGE_DAYS = 30
+MAX_SIZE_MB = 20
+STALE_PARTIAL_SEC = 120  # a partial not written to for this long is left over from a failed run
+
+
+def cache_dir(data_dir) -> Path:
+    return Path(data_dir) / INSIGHTS_CACHE_DIRNAME
+
+
+def latest_insights(data_dir) -> Path | None:
+    """latest complete insights: newest cache entry, or a file of older versions (user_insights_gemini_*.md)"""
+    files = list(cache_dir(data_dir).glob("*.md")) + list(Path(data_dir).glob("user_insights_gemini_*.md"))
+    return max(files, key=os.path.getmtime, default=None)
+
+
+def streaming_insights(data_dir) -> Path | None:
+    """insights being generated now, if any"""
+    now = time.time()
+    partials = [f for f in cache_dir(data_dir).glob(f"*.md{PARTIAL_SUFFIX}")
+                if now - os.path.getmtime(f) < STALE_PARTIAL_SEC]
+    return max(partials, key=os.path.getmtime, default=None)
+
+
+def prompt_key(model_name: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model_name}\n{prompt}".encode('utf-8')).hexdigest()
+
+
+class InsightsCache:
+
+    def __init__(self, cache_dir, max_age_days=MAX_AGE_DAYS, max_size_mb=MAX_SIZE_MB):
+        self.cache_dir = Path(cache_dir)
+        self.max_age_sec = max_age_days * 24 * 60 * 60
+        self.max_size_bytes = max_size_mb * 1024 * 1024
+
+    def path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.md"
+
+    def partial_path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.md{PARTIAL_SUFFIX}"
+
+    def get(self, key: str) -> Path | None:
+        """cached insights file, or None. a hit is touched, so it is the latest insights and recently used"""
+        path = self.path(key)
+        if not path.exists():
+            return None
+        if time.time() - path.stat().st_mtime > self.max_age_sec:
+            logger.info(f"insights cache: expired {path.name}")
+            path.unlink(missing_ok=True)
+            return None
+        path.touch()
+        return path
+
+    def open_partial(self, key: str):
+        """text file to stream an answer into. call commit(key) when the answer is complete"""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        return open(self.partial_path(key), 'w', encoding='utf-8')
+
+    def commit(self, key: str) -> Path:
+        path = self.path(key)
+        os.replace(self.partial_path(key), path)
+        self.evict()
+        return path
+
+    def discard(self, key: str):
+        self.partial_path(key).unlink(missing_ok=True)
+
+    def entries(self) -> list[Path]:
+        """complete entries, latest first"""
+        if not self.cache_dir.exists():
+            return []
+        return sorted(self.cache_dir.glob("*.md"), key=os.path.getmtime, reverse=True)
+
+    def evict(self):
+        now = time.time()
+        total_size = 0
+        for path in self.entries():
+            stat = path.stat()
+            if (now - stat.st_mtime > self.max_age_sec) or (total_size + stat.st_size > self.max_size_bytes):
+                logger.info(f"insights cache: evicting {path.name}")
+                path.unlink(missing_ok=True)
+                continue
+            total_size += stat.st_size
@@ -0,0 +1,205 @@
+"""
+insights over long histories: summarize each month (or quarter) separately and concurrently (map),
+then combine the chunk summaries in one final call (reduce).
+
+chunk summaries are cached by prompt hash, so only new or changed months are sent again. like the insights cache,
+entries unused for cache_max_age_days are evicted, then the least recently used above CHUNKS_CACHE_MAX_ENTRIES.
+any model with generate_content(prompt) -> response.text works; FakeModel runs offline.
+only transient errors (rate limit, unavailable, timeout) are retried; others, like a bad api key, fail at once.
+"""
+import json
+import logging
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from types import SimpleNamespace
+
+import pandas as pd
+
+from expenses_tracker.ai.insights_cache import prompt_key
+from expenses_tracker.ai.prompt_builder import build_expenses_summary, overview, recurring_summary
+from expenses_tracker.config import Config
+from expenses_tracker.diagnostics import span
+
+try:
+    from google.api_core.exceptions import DeadlineExceeded, ResourceExhausted, ServiceUnavailable
+    GOOGLE_TRANSIENT_ERRORS = (ResourceExhausted, ServiceUnavailable, DeadlineExceeded)
+except ImportError:  # offline runs with FakeModel
+    GOOGLE_TRANSIENT_ERRORS = ()
+
+logger = logging.getLogger(__name__)
+
+config = Config()
+DATA_DIR = config.data_folder
+
+CHUNKS_CACHE_FILENAME = "insights_chunks_cache.json"
+CHUNKS_CACHE_MAX_ENTRIES = 500
+
+MAP_WORKERS = 4
+MAX_RETRIES = 4
+BACKOFF_SEC = 2  # doubled on each retry, with jitter
+CHUNK_TOKEN_BUDGET = 1_500
+CHUNK_SAMPLE_ROWS = 10
+
+
+class FakeTransientError(Exception):
+    """FakeModel's rate limit error"""
+
+
+TRANSIENT_ERRORS = (FakeTransientError, *GOOGLE_TRANSIENT_ERRORS)
+
+
+class FakeModel:
+    """stand-in for the gemini model, for offline runs and benchmarks"""
+
+    def __init__(self, model_name="fake", latency_sec=0.5, fail_rate=0.0, seed=None):
+        self.model_name = model_name
+        self.latency_sec = latency_sec
+        self.fail_rate = fail_rate
+        self.calls = 0
+        self._random = random.Random(seed)
+
+    def generate_content(self, prompt: str, stream=False):
+        self.calls += 1
+        time.sleep(self.latency_sec)
+        if self._random.random() < self.fail_rate:
+            raise FakeTransientError("429 resource exhausted (fake)")
+        first_line = prompt.strip().splitlines()[0] if prompt.strip() else ""
+        text = f"- summary of {len(prompt)} chars prompt: {first_line[:80]}"
+        if stream:
+            return (SimpleNamespace(text=word + " ") for word in text.split())
+        return SimpleNamespace(text=text)
+
+
+def split_history(df: pd.DataFrame, period='M') -> dict:
+    """period name ('2024-12' or '2024Q4') -> transactions of that period"""
+    periods = df['חודש חיוב'].dt.asfreq(period) if period != 'M' else df['חודש חיוב']
+    return {str(p): chunk for p, chunk in df.groupby(periods, sort=True)}
+
+
+def chunk_prompt(period_name: str, chunk: pd.DataFrame) -> str:
+    summary = build_expenses_summary(chunk, CHUNK_TOKEN_BUDGET, CHUNK_SAMPLE_ROWS)
+    return f"""Summarize the user's credit card expenses for {period_name} in up to 5 short bullet points:
+main categories, notable or unusual charges, and changes within the period.
+
+{summary}
+"""
+
+
+def reduce_prompt(df: pd.DataFrame, chunk_summaries: dict, user_background: str) -> str:
+    summaries = "\n\n".join(f"### {name}\n{text.strip()}" for name, text in chunk_summaries.items())
+    return f"""You are helping the user to manage and get insights about their expenses.
+User background:
+{user_background}
+
+Overall: {overview(df)}
+
+Recurring charges over the whole history:
+{recurring_summary(df) or "none found"}
+
+Summaries of the user's expenses by period:
+{summaries}
+
+Please read the user's background and understand the user's expenses over time.
+then provide insights in markdown format. be concise:
+- What are the user's main expenses, and how did they change over time?
+- Subscriptions and installments: are any worth cancelling, and what is still left to pay?
+- Short recommendations
+- Summary and any other insights you can provide
+"""
+
+
+def generate_with_retry(model, prompt: str, retries=MAX_RETRIES, backoff_sec=BACKOFF_SEC) -> str:
+    """generate_content, retrying transient errors (rate limits, unavailable, timeouts) with exponential backoff"""
+    for attempt in range(retries + 1):
+        try:
+            return model.generate_content(prompt).text
+        except TRANSIENT_ERRORS as e:
+            if attempt == retries:
+                raise
+            delay = backoff_sec * (2 ** attempt) * (1 + random.random() / 2)
+            logger.warning(f"generate_content failed ({e}), retry {attempt + 1}/{retries} in {delay:.1f} sec")
+            time.sleep(delay)
+
+
+class ChunksCache:
+    """chunk summary by prompt hash: {key: {text, used}}, used is the time it was last read or written"""
+
+    def __init__(self, path, max_age_days=None, max_entries=CHUNKS_CACHE_MAX_ENTRIES):
+        self.path = Path(path)
+        max_age_days = config.insights['cache_max_age_days'] if max_age_days is None else max_age_days
+        self.max_age_sec = max_age_days * 24 * 60 * 60
+        self.max_entries = max_entries
+        self.entries = {}
+        if self.path.exists():
+            try:
+                entries = json.loads(self.path.read_text(encoding='utf-8'))
+                # entries of older versions are plain text, without a use time: dropped
+                self.entries = {key: entry for key, entry in entries.items() if isinstance(entry, dict)}
+            except Exception as e:
+                logger.warning(f"ignoring unreadable chunks cache {self.path}: {e}")
+
+    def get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        entry['used'] = time.time()
+        return entry['text']
+
+    def set(self, key, text):
+        self.entries[key] = {'text': text, 'used': time.time()}
+
+    def evict(self):
+        now = time.time()
+        latest = sorted(self.entries.items(), key=lambda item: item[1]['used'], reverse=True)
+        kept = {key: entry for key, entry in latest[:self.max_entries] if now - entry['used'] <= self.max_age_sec}
+        if len(kept) < len(self.entries):
+            logger.info(f"chunks cache: evicting {len(self.entries) - len(kept)} entries")
+        self.entries = kept
+
+    def save(self):
+        self.evict()
+        self.path.write_text(json.dumps(self.entries, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def summarize_chunks(model, model_name: str, chunks: dict, workers=MAP_WORKERS, cache_path=None) -> dict:
+    """period name -> summary text. uncached chunks are summarized concurrently"""
+    cache = ChunksCache(cache_path or Path(DATA_DIR) / CHUNKS_CACHE_FILENAME)
+
+    prompts = {name: chunk_prompt(name, chunk) for name, chunk in chunks.items()}
+    keys = {name: prompt_key(model_name, prompt) for name, prompt in prompts.items()}
+    summaries = {name: text for name, key in keys.items() if (text := cache.get(key)) is not None}
+
+    missing = [name for name in prompts if name not in summaries]
+    logger.info(f"map: {len(missing)} chunks to summarize, {len(summaries)} cached")
+    if missing:
+        with span("llm.map", chunks=len(missing), workers=workers), ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {name: pool.submit(generate_with_retry, model, prompts[name]) for name in missing}
+        for name, future in futures.items():
+            try:
+                summaries[name] = future.result()
+                cache.set(keys[name], summaries[name])
+            except Exception as e:
+                logger.error(f"map: failed to summarize {name}: {e}")
+    cache.save()  # also the use times of the cached chunks
+
+    return {name: summaries[name] for name in prompts if name in summaries}
+
+
+def map_reduce_prompt(model, model_name: str, df: pd.DataFrame, user_background: str, period='M',
+                      workers=MAP_WORKERS, cache_path=None) -> str:
+    """runs the map step. returns the reduce prompt"""
+    chunks = split_history(df, period)
+    chunk_summaries = summarize_chunks(model, model_name, chunks, workers, cache_path)
+    if not chunk_summaries:
+        raise RuntimeError("no chunk was summarized")
+
+    logger.info(f"reduce: combining {len(chunk_summaries)} chunk summaries")
+    return reduce_prompt(df, chunk_summaries, user_background)
+
+
+def map_reduce_insights(model, model_name: str, df: pd.DataFrame, user_background: str, period='M',
+                        workers=MAP_WORKERS, cache_path=None) -> str:
+    prompt = map_reduce_prompt(model, model_name, df, user_background, period, workers, cache_path)
+    return generate_with_retry(model, prompt)
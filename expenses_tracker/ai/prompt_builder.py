@@ -0,0 +1,155 @@
+"""
+compact summaries of the transactions for the LLM prompt, instead of every row.
+sections are added by priority while they fit in the token budget.
+"""
+import logging
+
+import pandas as pd
+
+from expenses_tracker.data_process import recurring
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4  # rough estimate, good enough for budgeting
+DEFAULT_TOKEN_BUDGET = 4_000
+DEFAULT_SAMPLE_ROWS = 30
+TOP_MERCHANTS = 15
+OUTLIER_STD = 3  # charges this many std above their category mean
+MAX_OUTLIERS = 15
+
+AMOUNT_COL = 'סכום חיוב'
+MONTH_COL = 'חודש חיוב'
+SAMPLE_COLS = ['תאריך עסקה', 'שם בית העסק', 'קטגוריה', 'סוג עסקה', 'סכום חיוב']
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN
+
+
+def to_text(df: pd.DataFrame) -> str:
+    return df.to_csv(index=False, float_format='%.2f', date_format='%Y-%m-%d')
+
+
+def overview(df: pd.DataFrame) -> str:
+    months = df[MONTH_COL].dropna()
+    return (f"period: {months.min()} to {months.max()} ({months.nunique()} months), "
+            f"transactions: {len(df)}, total: {df[AMOUNT_COL].sum():,.2f} ILS")
+
+
+def monthly_totals(df: pd.DataFrame) -> pd.DataFrame:
+    monthly = df.groupby(MONTH_COL)[AMOUNT_COL].agg(total='sum', transactions='count').reset_index()
+    monthly['change_pct'] = (monthly['total'].pct_change() * 100).round(1)
+    monthly[MONTH_COL] = monthly[MONTH_COL].astype(str)
+    return monthly
+
+
+def category_totals(df: pd.DataFrame) -> pd.DataFrame:
+    categories = (df.groupby('קטגוריה', observed=True)[AMOUNT_COL]
+                  .agg(total='sum', transactions='count')
+                  .sort_values('total', ascending=False)
+                  .reset_index())
+    categories['share_pct'] = (categories['total'] / categories['total'].sum() * 100).round(1)
+    return categories
+
+
+def category_deltas(df: pd.DataFrame) -> pd.DataFrame:
+    """category totals of the last month compared to the average of the previous months"""
+    pivot = df.pivot_table(index='קטגוריה', columns=MONTH_COL, values=AMOUNT_COL, aggfunc='sum',
+                           fill_value=0, observed=True)
+    if pivot.shape[1] < 2:
+        return pd.DataFrame()
+    last = pivot.iloc[:, -1]
+    previous_avg = pivot.iloc[:, :-1].mean(axis=1)
+    deltas = pd.DataFrame({'last_month': last, 'previous_avg': previous_avg, 'change': last - previous_avg})
+    deltas = deltas[deltas['change'].abs() > 0].sort_values('change', key=abs, ascending=False)
+    return deltas.round(2).reset_index()
+
+
+def top_merchants(df: pd.DataFrame, n=TOP_MERCHANTS) -> pd.DataFrame:
+    return (df.groupby('שם בית העסק', observed=True)[AMOUNT_COL]
+            .agg(total='sum', transactions='count')
+            .nlargest(n, 'total')
+            .reset_index())
+
+
+def outliers(df: pd.DataFrame, n=MAX_OUTLIERS) -> pd.DataFrame:
+    """charges far above the usual charge of their category"""
+    by_category = df.groupby('קטגוריה', observed=True)[AMOUNT_COL]
+    threshold = by_category.transform('mean') + OUTLIER_STD * by_category.transform('std').fillna(0)
+    unusual = df[df[AMOUNT_COL] > threshold]
+    return unusual.nlargest(n, AMOUNT_COL)[SAMPLE_COLS]
+
+
+def recurring_sections(df: pd.DataFrame) -> list[tuple[str, pd.DataFrame]]:
+    """active subscriptions, their price changes and the installment plans still being paid (see recurring.py)"""
+    subs = recurring.subscriptions(df)
+    active = subs[subs['active'].astype(bool)]
+    plans = recurring.active_installments(recurring.installment_plans(df))
+    return [
+        ("Subscriptions and recurring charges", active[['merchant', 'kind', 'amount', 'monthly_cost', 'first']]),
+        ("Subscription price changes",
+         recurring.price_changes(active)[['merchant', 'previous_amount', 'amount', 'price_changed_on']]),
+        ("Installment plans with remaining payments",
+         plans[['merchant', 'amount', 'payment', 'payments', 'remaining_amount', 'end_month']]),
+    ]
+
+
+def recurring_summary(df: pd.DataFrame) -> str:
+    """recurring_sections as text, for prompts over chunks of the history (see map_reduce.py)"""
+    return "\n".join(f"## {title}\n{to_text(content).strip()}\n"
+                     for title, content in recurring_sections(df) if not content.empty)
+
+
+def build_expenses_summary(df: pd.DataFrame, token_budget=DEFAULT_TOKEN_BUDGET,
+                           sample_rows=DEFAULT_SAMPLE_ROWS) -> str:
+    """summary text of the transactions, within token_budget (estimated).
+    sample_rows: cap of raw rows appended at the end if there is room left (0 for none)"""
+    sections = [
+        ("Overview", overview(df)),
+        ("Monthly totals", monthly_totals(df)),
+        ("Category totals", category_totals(df)),
+        ("Top merchants", top_merchants(df)),
+        *recurring_sections(df),
+        ("Last month by category, compared to the average of previous months", category_deltas(df)),
+        ("Unusually large charges", outliers(df)),
+    ]
+
+    parts = []
+    used_tokens = 0
+    for title, content in sections:
+        if isinstance(content, pd.DataFrame):
+            if content.empty:
+                continue
+            content = to_text(content)
+        part = f"## {title}\n{content.strip()}\n"
+        tokens = estimate_tokens(part)
+        if used_tokens + tokens > token_budget:
+            logger.info(f"prompt budget: skipping section '{title}' ({tokens} tokens)")
+            continue
+        parts.append(part)
+        used_tokens += tokens
+
+    if sample_rows:
+        sample = df.sort_values('תאריך עסקה').tail(sample_rows)[SAMPLE_COLS]
+        title = "## Latest transactions (sample)\n"
+        # drop rows until the sample fits
+        while len(sample):
+            part = title + to_text(sample)
+            if used_tokens + estimate_tokens(part) <= token_budget:
+                parts.append(part)
+                break
+            sample = sample.iloc[len(sample) // 4 + 1:]
+
+    return "\n".join(parts)
+
+
+def prompt_size_report(full_chars: int, summary_text: str) -> dict:
+    """full_chars: length of the transactions as csv, the prompt before summaries (estimated, see gemini.py)"""
+    report = {
+        'full_chars': full_chars,
+        'full_tokens': full_chars // CHARS_PER_TOKEN,
+        'summary_chars': len(summary_text),
+        'summary_tokens': estimate_tokens(summary_text),
+    }
+    report['reduction'] = round(report['full_chars'] / max(report['summary_chars'], 1), 1)
+    return report
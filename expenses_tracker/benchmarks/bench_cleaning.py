@@ -0,0 +1,100 @@
+"""
+microbenchmark: per-row apply() cleaning (previous load_transactions) vs. the column-level clean_transactions.
+
+python -m expenses_tracker.benchmarks.bench_cleaning --rows 1000000
+the per-row version is slow, so it runs on a sample (--legacy-rows) and its time is extrapolated.
+"""
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+from expenses_tracker.data_process.transactions import clean_transactions
+
+
+#### previous per-row implementation, kept for comparison
+
+def legacy_clean_amount(amount):
+    if isinstance(amount, str):
+        return float(amount.replace('₪', '').replace(',', '').strip())
+    return amount
+
+
+def legacy_parse_date(date_str):
+    if pd.isna(date_str):
+        return None
+
+    try:
+        for fmt in ['%d-%m-%Y', '%Y-%m-%d %H:%M:%S']:
+            try:
+                return pd.to_datetime(date_str, format=fmt)
+            except:
+                continue
+        return pd.to_datetime(date_str)
+    except:
+        return None
+
+
+def legacy_clean_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    df['סכום חיוב'] = df['סכום חיוב'].apply(legacy_clean_amount)
+    df['תאריך עסקה'] = df['תאריך עסקה'].apply(legacy_parse_date)
+    df['תאריך חיוב'] = df['תאריך חיוב'].apply(legacy_parse_date)
+    df['חודש חיוב'] = df['תאריך חיוב'].apply(lambda x: f"{x.month}/{x.year}" if isinstance(x, datetime) else None)
+    return df
+
+
+####
+
+def synthetic_ledger(rows: int, seed=0) -> pd.DataFrame:
+    """raw string columns, as parsed from markdown statements"""
+    rng = np.random.default_rng(seed)
+    days = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 5 * 365, rows), unit='D')
+    tx_dates = days.strftime('%Y-%m-%d 00:00:00').to_numpy(dtype=object)
+    # some rows use the dd-mm-yyyy format
+    alt = rng.random(rows) < 0.1
+    tx_dates[alt] = days[alt].strftime('%d-%m-%Y')
+
+    charge_dates = (days + pd.offsets.MonthBegin(1)).strftime('%Y-%m-%d 00:00:00')
+    amounts = np.round(rng.gamma(2.0, 150.0, rows), 2)
+    amount_strs = pd.Series(amounts).map('{:,.2f}'.format).to_numpy(dtype=object)
+    shekel = rng.random(rows) < 0.3
+    amount_strs[shekel] = '₪' + amount_strs[shekel]
+
+    return pd.DataFrame({
+        'תאריך עסקה': tx_dates,
+        'סכום חיוב': amount_strs,
+        'תאריך חיוב': charge_dates.to_numpy(dtype=object),
+    })
+
+
+def timed(fn, df) -> float:
+    start = time.perf_counter()
+    fn(df.copy())
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--legacy-rows', type=int, default=20_000)
+    args = parser.parse_args()
+
+    df = synthetic_ledger(args.rows)
+    print(f"rows: {args.rows:,}")
+
+    vectorized_sec = timed(clean_transactions, df)
+    print(f"vectorized: {vectorized_sec:.2f} sec")
+
+    legacy_rows = min(args.legacy_rows, args.rows)
+    legacy_sample_sec = timed(legacy_clean_transactions, df.head(legacy_rows))
+    legacy_sec = legacy_sample_sec * args.rows / legacy_rows
+    note = "" if legacy_rows == args.rows else f" (extrapolated from {legacy_rows:,} rows: {legacy_sample_sec:.2f} sec)"
+    print(f"per-row apply: {legacy_sec:.2f} sec{note}")
+
+    print(f"speedup: x{legacy_sec / vectorized_sec:,.0f}")
+
+
+if __name__ == '__main__':
+    main()
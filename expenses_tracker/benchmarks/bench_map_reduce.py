@@ -0,0 +1,74 @@
+"""
+benchmark of map-reduce insights with the offline FakeModel: sequential vs. concurrent map, and a warm cache.
+
+python -m expenses_tracker.benchmarks.bench_map_reduce --months 36 --latency 0.5
+"""
+import argparse
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from expenses_tracker.ai.map_reduce import FakeModel, map_reduce_insights
+
+CATEGORIES = ['מזון וצריכה', 'מסעדות, קפה וברים', 'דלק, חשמל וגז', 'ביטוח', 'פנאי, בידור וספורט', 'שונות']
+CARDS = ['1234', '5678']
+MERCHANTS = ['סופרמרקט', 'בית קפה', 'תחנת דלק', 'חברת חשמל', 'מסעדה', 'ביטוח חובה', 'חנות ספרים', 'AMAZON.COM']
+
+
+def synthetic_ledger(months: int, rows_per_month=300, seed=0) -> pd.DataFrame:
+    rng = np.random.default_rng(seed)
+    rows = months * rows_per_month
+    charge_months = pd.period_range(end=pd.Period('2024-12', 'M'), periods=months, freq='M')
+    month = charge_months[rng.integers(0, months, rows)]
+    installments = rng.random(rows) < 0.05
+    return pd.DataFrame({
+        'תאריך עסקה': month.to_timestamp() - pd.to_timedelta(rng.integers(1, 30, rows), unit='D'),
+        'שם בית העסק': pd.Categorical(rng.choice(MERCHANTS, rows)),
+        'קטגוריה': pd.Categorical(rng.choice(CATEGORIES, rows)),
+        '4 ספרות אחרונות של כרטיס האשראי': pd.Categorical(rng.choice(CARDS, rows)),
+        'סוג עסקה': pd.Categorical(np.where(installments, 'תשלומים', 'רגילה')),
+        'סכום חיוב': np.round(rng.gamma(2.0, 150.0, rows), 2),
+        'חודש חיוב': month,
+        'הערות': pd.Categorical(np.where(installments, 'תשלום 2 מתוך 6', None)),
+    })
+
+
+def run(df, workers, latency, cache_path) -> tuple[float, int]:
+    model = FakeModel(latency_sec=latency)
+    start = time.perf_counter()
+    map_reduce_insights(model, model.model_name, df, "benchmark user", workers=workers, cache_path=cache_path)
+    return time.perf_counter() - start, model.calls
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--months', type=int, default=36)
+    parser.add_argument('--latency', type=float, default=0.5, help="fake model latency per call, sec")
+    parser.add_argument('--workers', type=int, default=8)
+    args = parser.parse_args()
+
+    df = synthetic_ledger(args.months)
+    print(f"months: {args.months}, rows: {len(df):,}, fake latency: {args.latency} sec")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sequential_cache = Path(tmp) / "sequential.json"
+        concurrent_cache = Path(tmp) / "concurrent.json"
+
+        sec, calls = run(df, 1, args.latency, sequential_cache)
+        print(f"sequential map: {sec:.2f} sec, {calls} calls")
+        sec, calls = run(df, args.workers, args.latency, concurrent_cache)
+        print(f"concurrent map ({args.workers} workers): {sec:.2f} sec, {calls} calls")
+        sec, calls = run(df, args.workers, args.latency, concurrent_cache)
+        print(f"warm cache: {sec:.2f} sec, {calls} calls")
+
+        new_month = synthetic_ledger(1, seed=1)
+        new_month['חודש חיוב'] = pd.Period('2025-01', 'M')
+        sec, calls = run(pd.concat([df, new_month], ignore_index=True), args.workers, args.latency, concurrent_cache)
+        print(f"one new month: {sec:.2f} sec, {calls} calls")
+
+
+if __name__ == '__main__':
+    main()
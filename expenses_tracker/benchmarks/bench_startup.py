@@ -0,0 +1,80 @@
+"""
+startup benchmark of the quick cli commands: wall time, and import time from python -X importtime.
+
+python -m expenses_tracker.benchmarks.bench_startup --budget-ms 500
+exits with code 1 if a command is over the budget, or imports a heavy module it does not need.
+commands run on the demo statements. the store is brought up to date first, so only startup is measured.
+"""
+import argparse
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).parent.parent.parent
+
+# command -> main.py arguments
+COMMANDS = {
+    'help': ['--help'],
+    'ingest': ['--demo', 'ingest'],
+    'totals': ['--demo', 'totals'],
+}
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow', 'playwright', 'pypdf', 'markitdown', 'google', 'streamlit']
+DEFAULT_BUDGET_MS = 500
+TOP_IMPORTS = 5
+
+IMPORT_TIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def run_importtime(args: list) -> tuple[float, list]:
+    """(wall sec, [(module, cumulative us)] of top level imports)"""
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, "-X", "importtime", "main.py", *args], cwd=ROOT_DIR,
+                            capture_output=True, text=True)
+    wall_sec = time.perf_counter() - start
+    if result.returncode != 0:
+        raise RuntimeError(f"main.py {' '.join(args)} failed:\n{result.stderr[-2000:]}")
+
+    imports = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_TIME_LINE.match(line)
+        if match and len(match.group(3)) == 1:  # top level: one space of indent
+            imports.append((match.group(4), int(match.group(2))))
+    return wall_sec, imports
+
+
+def measure(args: list, repeat: int) -> tuple[float, list]:
+    """best of repeat runs"""
+    runs = [run_importtime(args) for _ in range(repeat)]
+    return min(runs, key=lambda run: run[0])
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--budget-ms', type=int, default=DEFAULT_BUDGET_MS)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    run_importtime(COMMANDS['ingest'])  # build the demo store and .pyc files, not part of startup
+
+    over_budget = False
+    for name, command_args in COMMANDS.items():
+        wall_sec, imports = measure(command_args, args.repeat)
+        import_ms = sum(us for _, us in imports) / 1000
+        heavy = sorted({m.split('.')[0] for m, _ in imports if m.split('.')[0] in HEAVY_MODULES})
+        ok = (wall_sec * 1000 <= args.budget_ms) and not heavy
+        over_budget |= not ok
+
+        print(f"{name}: {wall_sec * 1000:.0f} ms wall, {import_ms:.0f} ms imports "
+              f"[{'OK' if ok else 'OVER BUDGET'}]")
+        for module, us in sorted(imports, key=lambda i: i[1], reverse=True)[:TOP_IMPORTS]:
+            print(f"    {module:<45} {us / 1000:>7.1f} ms")
+        if heavy:
+            print(f"    heavy modules imported: {', '.join(heavy)}")
+
+    sys.exit(1 if over_budget else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+scale benchmark of the statements pipeline, on synthetic MAX statements (see synthetic_statements).
+
+python -m expenses_tracker.benchmarks.bench_suite --scales 10000 100000 1000000
+each scale times: to_markdown, load_transactions, read_excel_transactions, get_excel_sums, building the store
+ledger (normalize), the dashboard aggregations, detecting recurring charges, the gemini prompt, building the sqlite
+query db and a query on it, and reports the memory (deep) of the parsed statements
+and of the compact store ledger. results are saved to benchmarks/results/, and compared to the previous results
+file: stages slower by more than --regression (ratio) are flagged.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from expenses_tracker.ai.prompt_builder import build_expenses_summary
+from expenses_tracker.benchmarks.synthetic_statements import generate
+from expenses_tracker.credit_cards.reconcile import get_excel_sums
+from expenses_tracker.data_process import dedup, query_db, recurring, store
+from expenses_tracker.data_process.transactions import load_transactions, read_excel_transactions
+
+RESULTS_DIR = Path(__file__).parent / "results"
+DEFAULT_SCALES = [10_000, 100_000]
+DEFAULT_MONTHS = 12
+# what the dashboard SQL panel suggests: average monthly spend of a category, by year and card
+QUERY_SQL = """SELECT substr(month, 1, 4) AS year, card, SUM(amount) / COUNT(DISTINCT month) AS monthly
+FROM expenses WHERE category = ? GROUP BY year, card"""
+REGRESSION_RATIO = 1.25
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return time.perf_counter() - start, result
+
+
+def to_markdown_all(excel_files):
+    from expenses_tracker.data_process.process_credit_files import to_markdown
+    for f in excel_files:
+        to_markdown(str(f))
+
+
+def parse_statements(excel_files) -> pd.DataFrame:
+    frames = []
+    for f in excel_files:
+        df = read_excel_transactions(f)
+        df[store.SOURCE_COL] = Path(f).name
+        frames.append(df)
+    return pd.concat(frames, ignore_index=True)
+
+
+def memory_mb(df: pd.DataFrame) -> float:
+    return round(df.memory_usage(deep=True).sum() / 1024 ** 2, 2)
+
+
+def dashboard_aggregations(ledger: pd.DataFrame):
+    """what the dashboard computes (uncached): the cube, category totals of every month and of all months,
+    monthly totals, and the month filter of the transactions table"""
+    cube = store.build_cube(ledger)
+    months = cube[store.MONTH_COL].unique()
+    for month in [None, *months]:
+        month_cube = cube if month is None else cube[cube[store.MONTH_COL] == month]
+        month_cube.groupby('קטגוריה', observed=True)[store.AMOUNT_COL].sum().sort_values()
+    cube.groupby(store.MONTH_COL)[store.AMOUNT_COL].sum().sort_index()
+    ledger[ledger[store.MONTH_COL] == months.max()]
+
+
+def detect_recurring(ledger: pd.DataFrame):
+    """what the dashboard Recurring view computes"""
+    return recurring.subscriptions(ledger), recurring.installment_plans(ledger)
+
+
+def run_scale(transactions: int, months: int, work_dir: Path) -> tuple[dict, dict]:
+    """(seconds by stage, memory MB of the parsed statements and of the ledger)"""
+    out_dir = work_dir / f"scale_{transactions}"
+    results = {}
+    results['generate'], files = timed(generate, out_dir, transactions, months)
+    excel_files = [f for f in files if f.suffix == '.xlsx']
+    md_files = [f for f in files if f.suffix == '.md']
+
+    try:
+        results['to_markdown'], _ = timed(to_markdown_all, excel_files)
+    except ImportError as e:
+        print(f"    to_markdown skipped: {e}")
+    results['load_transactions'], _ = timed(lambda: [load_transactions(f) for f in md_files])
+    results['read_excel_transactions'], _ = timed(lambda: [read_excel_transactions(f) for f in excel_files])
+    results['get_excel_sums'], _ = timed(lambda: [get_excel_sums(f) for f in excel_files])
+    parsed = parse_statements(excel_files)
+    memory = {'parsed_statements': memory_mb(parsed)}
+    results['normalize_ledger'], ledger = timed(store.normalize, parsed)
+    memory['ledger'] = memory_mb(ledger)
+    results['dashboard_aggregations'], _ = timed(dashboard_aggregations, ledger)
+    amounts = store.with_amounts(ledger.copy())  # in place, ledger keeps its agorot for the query db
+    results['detect_recurring'], _ = timed(detect_recurring, amounts)
+    results['build_prompt'], _ = timed(build_expenses_summary, amounts)
+    results['build_query_db'], db_path = timed(build_query_db, ledger, work_dir)
+    category = ledger['קטגוריה'].mode()[0]
+    results['query_db'], _ = timed(query_db.query, db_path, QUERY_SQL, (category,))
+    return results, memory
+
+
+def build_query_db(ledger: pd.DataFrame, work_dir: Path) -> Path:
+    path = work_dir / f"transactions_{len(ledger)}.sqlite"
+    ledger = ledger.assign(**{store.DUPLICATE_COL: dedup.duplicate_mask(ledger)})
+    query_db.update_query_db(path, ledger, ledger[store.SOURCE_COL].unique(), duplicate_col=store.DUPLICATE_COL,
+                             rebuild=True)
+    return path
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              cwd=Path(__file__).parent).stdout.strip() or None
+    except OSError:
+        return None
+
+
+def latest_results() -> dict | None:
+    files = sorted(RESULTS_DIR.glob("bench_*.json"))
+    return json.loads(files[-1].read_text(encoding='utf-8')) if files else None
+
+
+def compare(current: dict, previous: dict, regression_ratio: float) -> list[str]:
+    """stages slower than regression_ratio times the previous run"""
+    regressions = []
+    print(f"compared to {previous['timestamp']} (commit {previous.get('commit')}):")
+    for scale, stages in current['results'].items():
+        for stage, sec in stages.items():
+            before = previous['results'].get(scale, {}).get(stage)
+            if not before:
+                continue
+            ratio = sec / before
+            flag = "REGRESSION" if ratio > regression_ratio else ""
+            print(f"    {scale:>9} {stage:<24} {before:>8.2f} -> {sec:>8.2f} sec  x{ratio:.2f} {flag}")
+            if flag:
+                regressions.append(f"{scale} {stage}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--scales', type=int, nargs='+', default=DEFAULT_SCALES, help="transactions in total")
+    parser.add_argument('--months', type=int, default=DEFAULT_MONTHS)
+    parser.add_argument('--regression', type=float, default=REGRESSION_RATIO)
+    parser.add_argument('--no-save', action='store_true')
+    args = parser.parse_args()
+
+    previous = latest_results()
+    current = {
+        'timestamp': datetime.now().isoformat(timespec='seconds'),
+        'commit': git_commit(),
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'months': args.months,
+        'results': {},
+        'memory_mb': {},
+    }
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        for scale in args.scales:
+            print(f"{scale:,} transactions, {args.months} months:")
+            results, memory = run_scale(scale, args.months, Path(work_dir))
+            for stage, sec in results.items():
+                print(f"    {stage:<24} {sec:>8.2f} sec")
+            for frame, mb in memory.items():
+                print(f"    {frame:<24} {mb:>8.2f} MB")
+            current['results'][str(scale)] = results
+            current['memory_mb'][str(scale)] = memory
+
+    if not args.no_save:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        results_file = RESULTS_DIR / f"bench_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        results_file.write_text(json.dumps(current, indent=2), encoding='utf-8')
+        print(f"results saved: {results_file}")
+
+    regressions = compare(current, previous, args.regression) if previous else []
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
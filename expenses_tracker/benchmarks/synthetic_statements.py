@@ -0,0 +1,182 @@
+"""
+synthetic MAX statements at any scale: excel files with the MAX layout (regular and 'עסקאות חו"ל ומט"ח' sheets,
+user / cards / month rows above the header, 'סך הכל' at the bottom), and the markdown to_markdown makes of them.
+
+python -m expenses_tracker.benchmarks.synthetic_statements --transactions 100000 --months 12 --out ./synthetic
+writes transactions_<yyyy-mm>.xlsx / .md, so the files can also be copied to the data folder.
+"""
+import argparse
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = [
+    'תאריך עסקה', 'שם בית העסק', 'קטגוריה', '4 ספרות אחרונות של כרטיס האשראי', 'סוג עסקה', 'סכום חיוב',
+    'מטבע חיוב', 'סכום עסקה מקורי', 'מטבע עסקה מקורי', 'תאריך חיוב', 'הערות', 'תיוגים', 'מועדון הנחות',
+    'מפתח דיסקונט', 'אופן ביצוע ההעסקה', 'שער המרה ממטבע מקור/התחשבנות לש"ח',
+]
+REGULAR_SHEET = 'עסקאות במועד החיוב'
+FOREIGN_SHEET = 'עסקאות חו"ל ומט"ח'
+
+# category -> (merchants, typical amount)
+MERCHANTS = {
+    'מזון וצריכה': (['שופרסל דיל', 'רמי לוי', 'יוחננוף', 'ויקטורי', 'מכולת השכונה', 'טיב טעם', 'AM:PM'], 180),
+    'מסעדות, קפה וברים': (['ארומה', 'קפה קפה', 'מסעדת השף', 'פיצה האט', 'גרג', 'בורגר סאלון', 'וולט'], 90),
+    'דלק, חשמל וגז': (['פז', 'דלק', 'סונול', 'ten', 'חברת החשמל', 'סופרגז'], 250),
+    'תחבורה ורכבים': (['רב קו', 'גט טקסי', 'חניון אחוזות החוף', 'כביש 6', 'מוסך המרכז'], 60),
+    'פנאי, בידור וספורט': (['סינמה סיטי', 'הולמס פלייס', 'ספוטיפיי', 'נטפליקס', 'צומת ספרים', 'סטימצקי'], 120),
+    'אופנה': (['קסטרו', 'פוקס', 'H&M', 'זארה', 'נייקי'], 220),
+    'ביטוח': (['הראל ביטוח', 'מגדל', 'כלל ביטוח', 'ביטוח ישיר'], 400),
+    'תקשורת ומחשבים': (['פרטנר', 'סלקום', 'הוט', 'בזק', 'KSP', 'באג'], 110),
+    'רפואה ובתי מרקחת': (['סופר-פארם', 'בי פארם', 'מכבי', 'כללית'], 80),
+    'שונות': (['עירייה', 'דואר ישראל', 'חנות לבית', 'איקאה'], 150),
+}
+FOREIGN_MERCHANTS = ['AMAZON.COM', 'AWS', 'ALIEXPRESS', 'BOOKING.COM', 'APPLE.COM/BILL', 'GOOGLE *CLOUD', 'UBER']
+FOREIGN_CURRENCIES = {'$': 3.7, '€': 4.0, '£': 4.7}
+REGULAR_TYPES = ['רגילה', 'תשלומים', 'הוראת קבע']
+REGULAR_TYPES_P = [0.85, 0.08, 0.07]
+MAX_INSTALLMENTS = 12
+
+
+def month_transactions(month: pd.Period, rows: int, cards: list, foreign_share: float,
+                       rng: np.random.Generator) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(regular, foreign) transactions charged in month. dates as the statements show them (dd-mm-yyyy)"""
+    n_foreign = int(rows * foreign_share)
+    n_regular = rows - n_foreign
+    previous = month - 1
+    charge_date = month.start_time.replace(day=10).strftime('%d-%m-%Y')
+
+    def dates(n):
+        days = rng.integers(0, previous.days_in_month, n)
+        return (previous.start_time + pd.to_timedelta(days, unit='D')).strftime('%d-%m-%Y')
+
+    categories = list(MERCHANTS)
+    category_idx = rng.integers(0, len(categories), n_regular)
+    merchant_pick = rng.random(n_regular)
+    names, cats, typical = [], [], []
+    for i, p in zip(category_idx, merchant_pick):
+        merchants, amount = MERCHANTS[categories[i]]
+        names.append(merchants[int(p * len(merchants))])
+        cats.append(categories[i])
+        typical.append(amount)
+    amounts = np.round(np.array(typical) * rng.lognormal(0, 0.6, n_regular), 2)
+
+    types = rng.choice(REGULAR_TYPES, n_regular, p=REGULAR_TYPES_P)
+    installments = np.where(types == 'תשלומים', rng.integers(2, MAX_INSTALLMENTS + 1, n_regular), 1)
+    installment_no = np.minimum(rng.integers(1, MAX_INSTALLMENTS + 1, n_regular), installments)
+    comments = np.where(installments > 1,
+                        pd.Series(installment_no).astype(str) + ' מתוך ' + pd.Series(installments).astype(str),
+                        None)
+
+    regular = pd.DataFrame({
+        'תאריך עסקה': dates(n_regular),
+        'שם בית העסק': names,
+        'קטגוריה': cats,
+        '4 ספרות אחרונות של כרטיס האשראי': rng.choice(cards, n_regular),
+        'סוג עסקה': types,
+        'סכום חיוב': amounts,
+        'מטבע חיוב': '₪',
+        'סכום עסקה מקורי': np.round(amounts * installments, 2),
+        'מטבע עסקה מקורי': '₪',
+        'תאריך חיוב': charge_date,
+        'הערות': comments,
+    }).reindex(columns=COLUMNS)
+
+    currencies = rng.choice(list(FOREIGN_CURRENCIES), n_foreign)
+    rates = np.array([FOREIGN_CURRENCIES[c] for c in currencies]) * rng.uniform(0.97, 1.03, n_foreign)
+    original = np.round(rng.lognormal(3, 0.8, n_foreign), 2)
+    foreign = pd.DataFrame({
+        'תאריך עסקה': dates(n_foreign),
+        'שם בית העסק': rng.choice(FOREIGN_MERCHANTS, n_foreign),
+        'קטגוריה': 'שונות',
+        '4 ספרות אחרונות של כרטיס האשראי': rng.choice(cards, n_foreign),
+        'סוג עסקה': 'דחוי חודש',
+        'סכום חיוב': np.round(original * rates, 2),
+        'מטבע חיוב': '₪',
+        'סכום עסקה מקורי': original,
+        'מטבע עסקה מקורי': currencies,
+        'תאריך חיוב': charge_date,
+        'אופן ביצוע ההעסקה': 'אינטרנט',
+        'שער המרה ממטבע מקור/התחשבנות לש"ח': np.round(rates, 4),
+    }).reindex(columns=COLUMNS)
+
+    return regular, foreign
+
+
+def sheet_rows(df: pd.DataFrame, month: pd.Period, cards: list) -> pd.DataFrame:
+    """the sheet as MAX exports it: rows above the header, the transactions, and the total below"""
+    def single(value):
+        return [value] + [None] * (len(COLUMNS) - 1)
+
+    top = [single('כל המשתמשים (1)'), single(f'כל הכרטיסים ({len(cards)})'), single(month.strftime('%m/%Y')),
+           COLUMNS]
+    bottom = [single(None), single('סך הכל'), single(round(float(df['סכום חיוב'].sum()), 2))]
+    rows = pd.DataFrame(top + df.to_numpy(dtype=object).tolist() + bottom)
+    return rows.astype(object).where(rows.notna(), None)
+
+
+def write_xlsx(path, sheets: dict):
+    with pd.ExcelWriter(path, engine='openpyxl') as writer:
+        for name, rows in sheets.items():
+            rows.to_excel(writer, sheet_name=name, header=False, index=False)
+
+
+def markdown_table(rows: pd.DataFrame) -> str:
+    """same table to_markdown (markitdown) writes: first row as header, 'Unnamed: i', NaN for empty cells"""
+    first = rows.iloc[0].tolist()
+    header = [first[0]] + [f'Unnamed: {i}' for i in range(1, len(first))]
+    cells = rows.iloc[1:].astype(str).replace({'None': 'NaN', 'nan': 'NaN'})
+    lines = ['| ' + ' | '.join(header) + ' |', '| ' + ' | '.join(['---'] * len(header)) + ' |']
+    lines += ('| ' + cells.agg(' | '.join, axis=1) + ' |').tolist()
+    return '\n'.join(lines)
+
+
+def write_markdown(path, sheets: dict):
+    text = '\n\n'.join(f'## {name}\n{markdown_table(rows)}' for name, rows in sheets.items())
+    Path(path).write_text(text + '\n', encoding='utf-8')
+
+
+def generate(out_dir, transactions=10_000, months=12, cards=3, foreign_share=0.1, formats=('xlsx', 'md'),
+             last_month='2024-12', seed=0) -> list[Path]:
+    """write months statements with transactions in total. returns the written files"""
+    rng = np.random.default_rng(seed)
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    card_numbers = [f'{n:04d}' for n in rng.choice(10_000, cards, replace=False)]
+    per_month = np.full(months, transactions // months)
+    per_month[:transactions % months] += 1
+
+    files = []
+    last = pd.Period(last_month, 'M')
+    for i, rows in enumerate(per_month):
+        month = last - (months - 1 - i)
+        regular, foreign = month_transactions(month, int(rows), card_numbers, foreign_share, rng)
+        sheets = {REGULAR_SHEET: sheet_rows(regular, month, card_numbers),
+                  FOREIGN_SHEET: sheet_rows(foreign, month, card_numbers)}
+        stem = out_dir / f'transactions_{month.strftime("%Y-%m")}'
+        if 'xlsx' in formats:
+            write_xlsx(stem.with_suffix('.xlsx'), sheets)
+            files.append(stem.with_suffix('.xlsx'))
+        if 'md' in formats:
+            write_markdown(stem.with_suffix('.md'), sheets)
+            files.append(stem.with_suffix('.md'))
+    return files
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--out', required=True)
+    parser.add_argument('--transactions', type=int, default=10_000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--cards', type=int, default=3)
+    parser.add_argument('--formats', nargs='+', default=['xlsx', 'md'], choices=['xlsx', 'md'])
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    files = generate(args.out, args.transactions, args.months, args.cards, formats=args.formats, seed=args.seed)
+    print(f"wrote {len(files)} files to {args.out}")
+
+
+if __name__ == '__main__':
+    main()
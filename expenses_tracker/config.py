@@ -4,10 +4,19 @@ from pathlib import Path
 import logging
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+
+LOG_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
 
 root_proj = Path(__file__).parent.parent
 
+# account of [max_credentials]. its statements are saved in the data folder itself
+DEFAULT_ACCOUNT = 'default'
+
+
+def setup_logging(level=logging.DEBUG):
+    """configure logging of an entry point (cli, dashboard, module run as a script). modules only get loggers"""
+    logging.basicConfig(level=level, format=LOG_FORMAT)
+
 
 class Config:
     _instance = None
@@ -42,6 +51,35 @@ class Config:
     def max_credentials(self):
         return self._config['max_credentials']
 
+    @property
+    def max_accounts(self) -> list[dict]:
+        """MAX logins {name, username, password}: [max_credentials] as the default account, and each [[max_accounts]]"""
+        accounts = []
+        if self._config.get('max_credentials', {}).get('username'):
+            accounts.append({'name': DEFAULT_ACCOUNT} | self._config['max_credentials'])
+        accounts += self._config.get('max_accounts', [])
+        return accounts
+
+    @property
+    def max_browser(self) -> dict:
+        defaults = {'headless': False, 'reuse_session': False, 'capture_network': False}
+        return defaults | self._config.get('max_browser', {})
+
+    @property
+    def insights(self) -> dict:
+        defaults = {'stream': True, 'cache_max_age_days': 30, 'cache_max_size_mb': 20}
+        return defaults | self._config.get('insights', {})
+
+    @property
+    def diagnostics(self) -> dict:
+        defaults = {'enabled': True, 'max_file_mb': 5}
+        return defaults | self._config.get('diagnostics', {})
+
+    @property
+    def refresh(self) -> dict:
+        defaults = {'download_every_hours': 12, 'watch_interval_sec': 5, 'insights': False}
+        return defaults | self._config.get('refresh', {})
+
     @property
     def gemini(self):
         return self._config['gemini']
@@ -1,18 +1,16 @@
+import json
 import logging
 import os
-import re
 import time
 from datetime import datetime
 from pathlib import Path
 
-import pandas as pd
-import pypdf
 from playwright.sync_api import sync_playwright, Page
 
-from expenses_tracker.config import Config
+from expenses_tracker.config import Config, setup_logging
+from expenses_tracker.credit_cards.reconcile import compare_excel_to_pdf
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
 ########
 
@@ -21,10 +19,6 @@ DOWNLOADS_DIR = config.data_folder
 
 if not DOWNLOADS_DIR:
     DOWNLOADS_DIR = './data'
-if not os.path.exists(DOWNLOADS_DIR):
-    os.makedirs(DOWNLOADS_DIR)  # raises if exists
-
-logger.info(f"Downloads folder: {DOWNLOADS_DIR}")
 
 MONTHS_OFFSETS_TO_DOWNLOAD = [-2, -1, 0]
 
@@ -36,16 +30,28 @@ MONTHS_HEB_TO_NUM = {
 
 URL = "https://www.max.co.il/"
 
+CLOSE_BROWSER_DELAY_SEC = 10
+
+# saved login cookies/localStorage (playwright storage state) and the statements pages urls
+SESSION_FILENAME = "max_session.json"
+
 
 ########
 
-def login_and_download_from_max(username: str, password: str):
+def login_and_download_from_max(username: str, password: str, close_delay_sec=CLOSE_BROWSER_DELAY_SEC,
+                                headless=None, reuse_session=None):
+    browser_options = config.max_browser
+    headless = browser_options['headless'] if headless is None else headless
+    reuse_session = browser_options['reuse_session'] if reuse_session is None else reuse_session
+    session = load_session() if reuse_session else None
+
     downloaded_files = []
     with sync_playwright() as p:
-        browser = p.chromium.launch(headless=False)
+        browser = p.chromium.launch(headless=headless)
         context = browser.new_context(
             accept_downloads=True,
-            service_workers="block"
+            service_workers="block",
+            storage_state=session['storage_state'] if session else None,
         )
         page = context.new_page()
 
@@ -53,50 +59,97 @@ def login_and_download_from_max(username: str, password: str):
             logger.info(f"open page...")
             page.goto(URL, wait_until="domcontentloaded")
 
-            # menu איזור אישי
-            page.wait_for_selector("span:has-text('כניסה לאיזור האישי')", timeout=5_000)
-            page.locator("span:has-text('כניסה לאיזור האישי')").click()
-            # sub menu לקוחות פרטיים
-            page.wait_for_selector("span:has-text('לקוחות פרטיים')", timeout=5_000)
-            page.locator("span:has-text('לקוחות פרטיים')").click()
-
-            # fill in login form
-            page.locator("a#login-password-link").click()
-            logger.info(f"logging in...")
-            page.locator("input#user-name").fill(username)
-            page.locator("input#password").fill(password)
-            logger.info(f"filled in login form")
-            page.get_by_text("לכניסה לאזור האישי").click()
-
-            page.wait_for_selector("li.all-actions", timeout=7_000)
-            logger.info(f"logged in")
+            if session and is_logged_in(page):
+                logger.info(f"logged in with saved session")
+            else:
+                login(page, username, password)
 
             # (note: decided to handle unexpected popups, if any, manually)
 
             page.wait_for_load_state("domcontentloaded")
+            if reuse_session:
+                save_session(context.storage_state())
 
             # download excel
             download_excel_files(page, downloaded_files)
-            # display excel sum
-            for f in downloaded_files:
-                if f.endswith('.xlsx'):
-                    get_excel_sums(f)
 
             # pdf
             download_pdf_files(page, downloaded_files)
+            # display excel sums, and compare to pdf
             compare_excel_to_pdf(downloaded_files)
 
         except Exception as e:
             logger.exception(e)
 
         finally:
-            sec = 10
-            logger.info(f"closing browser in {sec} sec...")
-            time.sleep(sec)  # keep browser open for debugging
+            if close_delay_sec and not headless:
+                logger.info(f"closing browser in {close_delay_sec} sec...")
+                time.sleep(close_delay_sec)  # keep browser open for debugging
             browser.close()
             return downloaded_files
 
 
+def login(page: Page, username: str, password: str):
+    # menu איזור אישי
+    page.wait_for_selector("span:has-text('כניסה לאיזור האישי')", timeout=5_000)
+    page.locator("span:has-text('כניסה לאיזור האישי')").click()
+    # sub menu לקוחות פרטיים
+    page.wait_for_selector("span:has-text('לקוחות פרטיים')", timeout=5_000)
+    page.locator("span:has-text('לקוחות פרטיים')").click()
+
+    # fill in login form
+    page.locator("a#login-password-link").click()
+    logger.info(f"logging in...")
+    page.locator("input#user-name").fill(username)
+    page.locator("input#password").fill(password)
+    logger.info(f"filled in login form")
+    page.get_by_text("לכניסה לאזור האישי").click()
+
+    page.wait_for_selector("li.all-actions", timeout=7_000)
+    logger.info(f"logged in")
+
+
+def is_logged_in(page: Page, timeout=5_000) -> bool:
+    """the personal area menu shows only when logged in"""
+    try:
+        page.wait_for_selector("li.all-actions", timeout=timeout)
+        return True
+    except Exception:
+        logger.info(f"saved session expired")
+        return False
+
+
+#### session
+
+def session_path(out_dir=None) -> Path:
+    """out_dir: folder of the account's files (default: the data folder)"""
+    return Path(out_dir or DOWNLOADS_DIR) / SESSION_FILENAME
+
+
+def load_session(out_dir=None) -> dict or None:
+    """saved session: {'storage_state': playwright storage state, 'urls': {name: url}}"""
+    path = session_path(out_dir)
+    if not path.exists():
+        return None
+    try:
+        return json.loads(path.read_text(encoding='utf-8'))
+    except Exception as e:
+        logger.warning(f"ignoring unreadable session file: {e}")
+        return None
+
+
+def save_session(storage_state: dict, urls: dict = None, out_dir=None):
+    """note: the file holds login cookies. it is kept in the data folder only"""
+    session = load_session(out_dir) or {}
+    session['storage_state'] = storage_state
+    if urls:
+        session['urls'] = session.get('urls', {}) | urls
+    path = session_path(out_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(session), encoding='utf-8')
+    logger.debug(f"session saved: {path}")
+
+
 def download_excel_files(page, downloaded_files):
     # menu "פעולות"
     page.locator("li.all-actions > a:has-text('פעולות')").click()
@@ -178,12 +231,7 @@ def click_download(download_btn, out_filename, page: Page) -> str:
         logger.info(f"clicked on download button")
         page.wait_for_timeout(500)
 
-        out_filepath = Path(DOWNLOADS_DIR) / out_filename
-        if os.path.exists(out_filepath):
-            timestamp = datetime.now().strftime("%H%M%S")
-            new_filename = Path(out_filename).stem + f"_{timestamp}{Path(out_filename).suffix}"
-            out_filepath = Path(DOWNLOADS_DIR) / new_filename
-            logger.info(f"file already exists. saving as: {new_filename}")
+        out_filepath = get_out_filepath(out_filename)
 
         logger.debug(f"before download_info.value")
         download = download_info.value
@@ -193,24 +241,16 @@ def click_download(download_btn, out_filename, page: Page) -> str:
     return str(out_filepath)
 
 
-def get_excel_sums(f):
-    excel_sum_col = 5  # 6th column 'סכום חיוב'
-    excel_df = pd.read_excel(f, sheet_name=[0, 1])
-
-    excel_sums = []
-    for i in range(2):
-        sheet = excel_df[i]
-        s = 0
-        for val in sheet.iloc[:, excel_sum_col]:
-            if type(val) in [int, float] and not pd.isna(val):
-                num = float(val)
-                s += num
-        s = round(s, 2)
-        excel_sums.append(s)
-
-    f_name = Path(f).name
-    logger.info(f"{f_name}: {sum(excel_sums):,} = {excel_sums}")
-    return excel_sums
+def get_out_filepath(out_filename, out_dir=None) -> Path:
+    out_dir = Path(out_dir or DOWNLOADS_DIR)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    out_filepath = out_dir / out_filename
+    if os.path.exists(out_filepath):
+        timestamp = datetime.now().strftime("%H%M%S")
+        new_filename = Path(out_filename).stem + f"_{timestamp}{Path(out_filename).suffix}"
+        out_filepath = out_dir / new_filename
+        logger.info(f"file already exists. saving as: {new_filename}")
+    return out_filepath
 
 
 #### pdf
@@ -292,73 +332,8 @@ def format_month(month_str: str) -> str:
     return f"{year}-{month_num}"
 
 
-def compare_excel_to_pdf(downloaded_files, allowed_diff=0.01):
-    filtered_files = [f for f in downloaded_files if "future" not in f]
-    pdfs = [f for f in filtered_files if f.endswith(".pdf")]
-    excels = [f for f in filtered_files if f.endswith(".xlsx")]
-
-    for pdf_file in pdfs:
-        pdf_file_name = Path(pdf_file).stem
-        try:
-            pdf_sums = get_pdf_sums(pdf_file)
-            pdf_sums.sort()
-        except Exception as e:
-            logger.exception(e)
-            continue
-
-        # lookup dddd-dd
-        match = re.search(r"\d{4}-\d{2}", pdf_file_name)
-        if match:
-            yyyy_mm = match.group()
-            excel_files_match = [f for f in excels if (yyyy_mm in f)]
-            logging.debug(f"pdf: '{pdf_file}', match excel_files: {excel_files_match}")
-            for f in excel_files_match:  # supposed to be just one file, but anyway
-                if not os.path.exists(f):
-                    logger.warning(f"{f} not found")
-                    continue
-
-                logger.info(f"comparing {pdf_file} to {f}")
-                excel_sums = get_excel_sums(f)
-                logger.debug(f"pdf: {pdf_sums}, excel: {excel_sums}")
-
-                # cmp
-                excel_sums.sort()
-                sums_ok = True
-                for i in range(len(pdf_sums)):
-                    if i >= len(excel_sums):
-                        logger.warning(f"pdf: {pdf_sums[i]}, excel: missing")
-                        break
-                    if abs(pdf_sums[i] - excel_sums[i]) > allowed_diff:
-                        logger.warning(f"pdf: {pdf_sums[i]}, excel: {excel_sums[i]}")
-                        sums_ok = False
-
-                if sums_ok:
-                    logger.info(f"sums OK")
-
-
-def get_pdf_sums(pdf_file) -> list:
-    reader = pypdf.PdfReader(pdf_file)
-    num_pages = len(reader.pages)
-    texts = []
-    for i in range(num_pages):
-        page = reader.pages[i]
-        text = page.extract_text()
-        texts.append(text)
-    text = "\n".join(texts)
-
-    lines = text.splitlines()
-    pdf_sums = []
-    for i in range(len(lines)):
-        line = lines[i]
-        if ("חיובים" in line) and ("בתאריך" in line):
-            sum_line = lines[i + 2]
-            sum = sum_line.replace(",", "")
-            sum = float(sum)
-            pdf_sums.append(sum)
-    return pdf_sums
-
-
 if __name__ == "__main__":
+    setup_logging()
     username = config.max_credentials['username']
     password = config.max_credentials['password']
 
@@ -0,0 +1,340 @@
+"""
+concurrent version of get_max_visa_files: login once, then download every month's excel and pdf
+in parallel pages of the same (authenticated) browser context.
+several accounts (see Config.max_accounts) download at the same time, each in its own browser context
+(own cookies) and into its own folder, so a refresh takes about as long as the slowest account.
+"""
+import asyncio
+import logging
+
+from playwright.async_api import async_playwright, expect, Page, Browser, BrowserContext
+
+from expenses_tracker.config import Config, DEFAULT_ACCOUNT, setup_logging
+from expenses_tracker.credit_cards.get_max_visa_files import (
+    URL, MONTHS_OFFSETS_TO_DOWNLOAD, format_month, get_out_filepath, load_session, save_session
+)
+from expenses_tracker.credit_cards.max_network_capture import ResponseRecorder, transactions_from_responses
+from expenses_tracker.credit_cards.reconcile import compare_excel_to_pdf
+from expenses_tracker.data_process.sources import account_dir
+from expenses_tracker.diagnostics import span
+
+logger = logging.getLogger(__name__)
+
+config = Config()
+
+DOWNLOAD_WORKERS = 4  # pages downloading at the same time, per account
+DOWNLOAD_RETRIES = 2
+DOWNLOAD_TIMEOUT_SEC = 60  # per attempt, including page load
+
+EXCEL_MENU_TEXT = "פירוט החיובים והעסקאות"
+PDF_MENU_TEXT = "דפי הפירוט והמכתבים"
+
+
+def download_from_max_concurrently(username: str, password: str, months_offsets=MONTHS_OFFSETS_TO_DOWNLOAD,
+                                   workers=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES, close_delay_sec=0,
+                                   headless=None, reuse_session=None, capture_network=None, on_download=None) -> list:
+    """same result as login_and_download_from_max: list of downloaded files.
+    with capture_network, each month's transactions api responses are saved as json instead of
+    downloading excel and pdf files.
+    on_download: optional callback, called with each file path as soon as it is downloaded"""
+    account = {'name': DEFAULT_ACCOUNT, 'username': username, 'password': password}
+    return download_accounts_concurrently([account], months_offsets, workers, retries, close_delay_sec, headless,
+                                          reuse_session, capture_network, on_download)
+
+
+def download_accounts_concurrently(accounts: list[dict], months_offsets=MONTHS_OFFSETS_TO_DOWNLOAD,
+                                   workers=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES, close_delay_sec=0,
+                                   headless=None, reuse_session=None, capture_network=None,
+                                   on_download=None) -> list:
+    """download_from_max_concurrently for each account {name, username, password}, at the same time.
+    files of an account are saved in its folder (see sources.account_dir). returns the files of all accounts"""
+    browser_options = config.max_browser
+    headless = browser_options['headless'] if headless is None else headless
+    reuse_session = browser_options['reuse_session'] if reuse_session is None else reuse_session
+    capture_network = browser_options['capture_network'] if capture_network is None else capture_network
+    with span("download", accounts=len(accounts), months=len(months_offsets),
+              capture_network=capture_network) as download_span:
+        downloaded_files = asyncio.run(download_accounts(accounts, months_offsets, workers, retries, close_delay_sec,
+                                                         headless, reuse_session, capture_network, on_download))
+        download_span.rows = len(downloaded_files)
+    return downloaded_files
+
+
+async def download_accounts(accounts: list[dict], months_offsets=MONTHS_OFFSETS_TO_DOWNLOAD,
+                            workers=DOWNLOAD_WORKERS, retries=DOWNLOAD_RETRIES, close_delay_sec=0,
+                            headless=False, reuse_session=False, capture_network=False, on_download=None) -> list:
+    """one browser, a context per account"""
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=headless)
+        try:
+            results = await asyncio.gather(*[
+                login_and_download(browser, account['name'], account['username'], account['password'],
+                                   months_offsets, workers, retries, reuse_session, capture_network, on_download)
+                for account in accounts
+            ])
+        finally:
+            if close_delay_sec and not headless:
+                logger.info(f"closing browser in {close_delay_sec} sec...")
+                await asyncio.sleep(close_delay_sec)  # keep browser open for debugging
+            await browser.close()
+
+    for account_files in results:
+        # display excel sums, and compare to pdf (no files in capture_network mode).
+        # after the downloads: it's blocking, and would hold the other accounts
+        compare_excel_to_pdf(account_files)
+
+    downloaded_files = [f for account_files in results for f in account_files]
+    logger.info(f"downloaded {len(downloaded_files)} files of {len(accounts)} accounts")
+    return downloaded_files
+
+
+async def login_and_download(browser: Browser, account: str, username: str, password: str,
+                             months_offsets=MONTHS_OFFSETS_TO_DOWNLOAD, workers=DOWNLOAD_WORKERS,
+                             retries=DOWNLOAD_RETRIES, reuse_session=False, capture_network=False,
+                             on_download=None) -> list:
+    """download the account's statements in a new context of the browser. errors are logged, not raised,
+    so one account failing does not stop the others"""
+    out_dir = account_dir(account)
+    session = load_session(out_dir) if reuse_session else None
+
+    downloaded_files = []
+    context = await browser.new_context(
+        accept_downloads=True,
+        service_workers="block",
+        storage_state=session['storage_state'] if session else None,
+    )
+    page = await context.new_page()
+
+    try:
+        with span("download.account", account=account):
+            urls = await open_statements_pages(page, username, password, session)
+            excel_url, pdf_url = urls[EXCEL_MENU_TEXT], urls[PDF_MENU_TEXT]
+            if reuse_session:
+                save_session(await context.storage_state(), urls, out_dir)
+
+            # index of the current month in the months menu
+            await page.goto(excel_url, wait_until="domcontentloaded")
+            selected_month_idx = await get_selected_month_index(page)
+            logger.info(f"{account}: selected_month_idx: {selected_month_idx}, excel url: {excel_url}, "
+                        f"pdf url: {pdf_url}")
+            await page.close()
+            if selected_month_idx is None:
+                raise RuntimeError("selected month not found in dates menu")
+
+            semaphore = asyncio.Semaphore(workers)
+            tasks = []
+            for offset in months_offsets:
+                month_idx = selected_month_idx + offset
+                if capture_network:
+                    tasks.append(run_download(context, semaphore, retries, f"{account} capture {offset:+d}",
+                                              excel_url, capture_transactions_for_month, month_idx, offset,
+                                              out_dir, on_download=on_download))
+                    continue
+                tasks.append(run_download(context, semaphore, retries, f"{account} excel {offset:+d}", excel_url,
+                                          download_excel_for_month, month_idx, offset, out_dir,
+                                          on_download=on_download))
+                if offset <= 0:
+                    tasks.append(run_download(context, semaphore, retries, f"{account} pdf {offset:+d}", pdf_url,
+                                              download_pdf_for_month, month_idx, out_dir,
+                                              on_download=on_download))
+
+            results = await asyncio.gather(*tasks)
+            downloaded_files.extend(f for f in results if f)
+
+    except Exception as e:
+        logger.exception(f"{account}: {e}")
+
+    finally:
+        await context.close()
+
+    logger.info(f"{account}: downloaded {len(downloaded_files)} files")
+    return downloaded_files
+
+
+async def open_statements_pages(page: Page, username: str, password: str, session=None) -> dict:
+    """make sure the context is logged in. returns the statements pages urls {menu text: url}.
+    with a valid saved session this goes straight to the statements page, skipping login"""
+    saved_urls = (session or {}).get('urls', {})
+    if session and all(saved_urls.get(name) for name in [EXCEL_MENU_TEXT, PDF_MENU_TEXT]):
+        await page.goto(saved_urls[EXCEL_MENU_TEXT], wait_until="domcontentloaded")
+        try:
+            await page.locator("div.combo-text.dates").wait_for(timeout=7_000)
+            logger.info(f"logged in with saved session")
+            return saved_urls
+        except Exception:
+            logger.info(f"saved session expired")
+
+    with span("download.login"):
+        await login(page, username, password)
+    urls = {}
+    for name in [EXCEL_MENU_TEXT, PDF_MENU_TEXT]:
+        urls[name] = await open_actions_menu_page(page, name)
+    return urls
+
+
+async def login(page: Page, username: str, password: str):
+    logger.info(f"open page...")
+    await page.goto(URL, wait_until="domcontentloaded")
+
+    # menu איזור אישי
+    await page.locator("span:has-text('כניסה לאיזור האישי')").click(timeout=5_000)
+    # sub menu לקוחות פרטיים
+    await page.locator("span:has-text('לקוחות פרטיים')").click(timeout=5_000)
+
+    # fill in login form
+    await page.locator("a#login-password-link").click()
+    logger.info(f"logging in...")
+    await page.locator("input#user-name").fill(username)
+    await page.locator("input#password").fill(password)
+    logger.info(f"filled in login form")
+    await page.get_by_text("לכניסה לאזור האישי").click()
+
+    await page.wait_for_selector("li.all-actions", timeout=7_000)
+    logger.info(f"logged in")
+
+
+async def open_actions_menu_page(page: Page, menu_text: str) -> str:
+    """open a page from the "פעולות" menu. returns its url"""
+    await page.locator("li.all-actions > a:has-text('פעולות')").click()
+    all_links = await page.get_by_text(menu_text).all()
+    if len(all_links) >= 2:
+        await all_links[1].click()
+    else:
+        await all_links[0].click()
+    logger.info(f"clicked on '{menu_text}'")
+
+    await page.locator("div.combo-text.dates").wait_for()
+    return page.url
+
+
+async def run_download(context: BrowserContext, semaphore, retries, name, url, download_fn, *args,
+                       on_download=None):
+    """run download_fn in a new page of the context, retrying on failure. returns file path or None"""
+    downloaded_file = None
+    async with semaphore:
+        for attempt in range(1, retries + 2):
+            page = await context.new_page()
+            try:
+                with span("download.file", task=name, attempt=attempt):
+                    await page.goto(url, wait_until="domcontentloaded")
+                    coro = download_fn(page, *args)
+                    downloaded_file = await asyncio.wait_for(coro, DOWNLOAD_TIMEOUT_SEC)
+                break
+            except Exception as e:
+                logger.warning(f"{name}: attempt {attempt} failed: {e!r}")
+            finally:
+                await page.close()
+        else:
+            logger.error(f"{name}: download failed")
+
+    if downloaded_file and on_download:
+        on_download(downloaded_file)
+    return downloaded_file
+
+
+async def select_month(page: Page, month_idx: int) -> str:
+    """select month from the dates menu and wait for the page to show it. returns the month text"""
+    dates_menu = page.locator("div.combo-text.dates")
+    await dates_menu.click()
+    month_items = await page.locator("li.month").all()
+    target_month = month_items[month_idx]
+    month_text_heb = (await target_month.text_content()).strip()
+    await target_month.click()
+
+    await expect(dates_menu).to_contain_text(month_text_heb)
+    with span("download.networkidle"):
+        await page.wait_for_load_state("networkidle")
+    logger.info(f"selected month {month_idx}: '{month_text_heb}'")
+    return month_text_heb
+
+
+async def download_excel_for_month(page: Page, month_idx: int, months_offset: int, out_dir=None) -> str:
+    if months_offset == 0 and month_idx > 0:
+        # website bug: downloads partial file if current month is the first one selected
+        await select_month(page, month_idx - 1)
+    month_text_heb = await select_month(page, month_idx)
+
+    out_filename = f"transactions_{format_month(month_text_heb)}.xlsx"
+    if months_offset > 0:
+        out_filename = out_filename.replace(".xlsx", "_future.xlsx")
+
+    excel_button = page.locator("div.print-excel").locator("span.download-excel")
+    return await click_download(excel_button, out_filename, page, out_dir)
+
+
+async def capture_transactions_for_month(page: Page, month_idx: int, months_offset: int, out_dir=None) -> str:
+    """record the transactions api responses of the month, and save them as json"""
+    recorder = ResponseRecorder(page)
+    try:
+        # reload to record the responses of page load (categories). then select another month first,
+        # so the target month is requested while recording even if it is the one shown on load
+        await page.reload(wait_until="domcontentloaded")
+        await select_month(page, month_idx - 1 if month_idx > 0 else month_idx + 1)
+        await recorder.wait()
+        recorder.clear_transactions()
+
+        month_text_heb = await select_month(page, month_idx)
+        await recorder.wait()
+        if not recorder.transactions_responses():
+            raise RuntimeError(f"no transactions response for '{month_text_heb}'")
+        transactions_from_responses(recorder.responses)  # raises if the api payload is not the expected one
+    finally:
+        recorder.detach()
+
+    out_filename = f"transactions_{format_month(month_text_heb)}.json"
+    if months_offset > 0:
+        out_filename = out_filename.replace(".json", "_future.json")
+    return recorder.save(get_out_filepath(out_filename, out_dir))
+
+
+async def download_pdf_for_month(page: Page, month_idx: int, out_dir=None) -> str:
+    curr_month_text = await select_month(page, month_idx)
+
+    month_second_el = page.locator(f':text("{curr_month_text}")').nth(1)
+    await month_second_el.hover()
+
+    download_button = page.locator('a:has-text("להורדה")')
+    filename = f"{format_month(curr_month_text)}.pdf"
+    return await click_download(download_button, filename, page, out_dir)
+
+
+async def click_download(download_btn, out_filename, page: Page, out_dir=None) -> str:
+    """click btn and save file. return downloaded file path"""
+    logger.info(f"start download process for {out_filename}")
+    await download_btn.wait_for(state="visible")
+    async with page.expect_download() as download_info:
+        await download_btn.hover()
+        await download_btn.click()
+
+    download = await download_info.value
+    out_filepath = get_out_filepath(out_filename, out_dir)
+    await download.save_as(out_filepath)
+
+    logger.info(f"file downloaded: {out_filepath}")
+    return str(out_filepath)
+
+
+async def get_selected_month_index(page: Page):
+    dates_menu = page.locator("div.combo-text.dates")
+    await dates_menu.click()
+    month_items = await page.locator("li.month").all()
+
+    for i, item in enumerate(month_items):
+        if "selected-month" in (await item.get_attribute("class") or ""):
+            await item.click()  # close the menu
+            return i
+
+    await dates_menu.click()
+    return None
+
+
+if __name__ == "__main__":
+    setup_logging()
+    accounts = config.max_accounts
+
+    if not accounts or not all(account['username'] and account['password'] for account in accounts):
+        logger.error("in project config: set username and password")
+        exit(1)
+
+    downloaded_files = download_accounts_concurrently(accounts)
+    logger.info(f"downloaded {len(downloaded_files)} files: {downloaded_files}")
@@ -0,0 +1,172 @@
+"""
+build transactions from the json responses the MAX transactions page loads when a month is selected,
+instead of downloading and parsing the excel file.
+
+captured responses are saved as json fixtures (transactions_<yyyy-mm>.json in the data folder), which the store
+reads like excel statements. to check a recorded capture or fixture offline (e.g. data/fixtures):
+python -m expenses_tracker.credit_cards.max_network_capture <fixture.json>
+
+the api urls and field names below are not verified against a live capture yet, and
+data/fixtures/max_transactions_responses.json is synthetic (built from the demo excel statement, not recorded).
+a payload without the expected keys raises ValueError (and logs what was found), it does not give zero rows.
+"""
+import asyncio
+import json
+import logging
+import sys
+from pathlib import Path
+from typing import TYPE_CHECKING
+
+import pandas as pd
+
+if TYPE_CHECKING:  # playwright is needed only while capturing, not to read saved captures
+    from playwright.async_api import Page, Response
+
+from expenses_tracker.config import setup_logging
+from expenses_tracker.data_process.transactions import clean_transactions
+
+logger = logging.getLogger(__name__)
+
+TRANSACTIONS_API = "/api/registered/transactionDetails/getTransactionsAndGraphs"
+CATEGORIES_API = "/api/contents/getCategories"
+
+# api transaction field -> statement column
+FIELDS_TO_COLUMNS = {
+    'purchaseDate': 'תאריך עסקה',
+    'merchantName': 'שם בית העסק',
+    'categoryId': 'קטגוריה',
+    'shortCardNumber': '4 ספרות אחרונות של כרטיס האשראי',
+    'planName': 'סוג עסקה',
+    'actualPaymentAmount': 'סכום חיוב',
+    'paymentCurrency': 'מטבע חיוב',
+    'originalAmount': 'סכום עסקה מקורי',
+    'originalCurrency': 'מטבע עסקה מקורי',
+    'paymentDate': 'תאריך חיוב',
+    'comments': 'הערות',
+}
+
+# fields a transaction can't be used without
+REQUIRED_FIELDS = ['purchaseDate', 'paymentDate', 'merchantName', 'actualPaymentAmount']
+
+CURRENCY_SYMBOLS = {'376': '₪', 'ILS': '₪', '840': '$', 'USD': '$', '978': '€', 'EUR': '€'}
+
+
+class ResponseRecorder:
+    """records json responses of the transactions (and categories) api while attached to a page"""
+
+    def __init__(self, page: 'Page'):
+        self.page = page
+        self.responses = []
+        self._pending = set()
+        page.on("response", self._on_response)
+
+    def _on_response(self, response: 'Response'):
+        if (TRANSACTIONS_API in response.url) or (CATEGORIES_API in response.url):
+            task = asyncio.ensure_future(self._record(response))
+            self._pending.add(task)
+            task.add_done_callback(self._pending.discard)
+
+    async def _record(self, response: 'Response'):
+        try:
+            body = await response.json()
+        except Exception as e:
+            logger.warning(f"unreadable response {response.url}: {e}")
+            return
+        self.responses.append({'url': response.url, 'status': response.status, 'body': body})
+
+    async def wait(self):
+        """wait for bodies of responses already received"""
+        if self._pending:
+            await asyncio.gather(*self._pending)
+
+    def clear_transactions(self):
+        """drop recorded transactions responses, keep categories"""
+        self.responses = [r for r in self.responses if TRANSACTIONS_API not in r['url']]
+
+    def transactions_responses(self) -> list:
+        return [r for r in self.responses if TRANSACTIONS_API in r['url']]
+
+    def save(self, path) -> str:
+        Path(path).write_text(json.dumps(self.responses, ensure_ascii=False), encoding='utf-8')
+        logger.info(f"saved {len(self.responses)} responses: {path}")
+        return str(path)
+
+    def detach(self):
+        self.page.remove_listener("response", self._on_response)
+
+
+def load_fixture(path) -> list:
+    return json.loads(Path(path).read_text(encoding='utf-8'))
+
+
+def unexpected_payload(message: str) -> ValueError:
+    logger.error(f"unexpected MAX api payload: {message}. the api may have changed, see max_network_capture.py")
+    return ValueError(f"unexpected MAX api payload: {message}")
+
+
+def response_result(response: dict):
+    body = response.get('body')
+    if not isinstance(body, dict) or 'result' not in body:
+        keys = list(body) if isinstance(body, dict) else type(body).__name__
+        raise unexpected_payload(f"no 'result' in the body of {response.get('url')} (found: {keys})")
+    return body['result']
+
+
+def transactions_from_responses(responses: list) -> pd.DataFrame:
+    """typed transactions df, with the same columns as the excel statements.
+    raises ValueError if there is no transactions response, or it is not in the expected format"""
+    categories = {}
+    transactions = []
+    transactions_responses = 0
+    for r in responses:
+        if CATEGORIES_API in r['url']:
+            result = response_result(r) or []
+            categories |= {str(c['id']): c['name'] for c in result if 'id' in c and 'name' in c}
+            if result and not categories:
+                logger.warning(f"categories response without id / name (found: {list(result[0])}), "
+                               f"category ids are kept")
+        elif TRANSACTIONS_API in r['url']:
+            result = response_result(r)
+            if not isinstance(result, dict) or 'transactions' not in result:
+                keys = list(result) if isinstance(result, dict) else type(result).__name__
+                raise unexpected_payload(f"no 'result.transactions' in {r['url']} (found: {keys})")
+            transactions.extend(result['transactions'] or [])
+            transactions_responses += 1
+
+    if not transactions_responses:
+        raise unexpected_payload(f"no {TRANSACTIONS_API} response among {len(responses)} responses")
+    if not transactions:
+        return pd.DataFrame(columns=list(FIELDS_TO_COLUMNS.values()))
+
+    missing = sorted({field for t in transactions for field in REQUIRED_FIELDS if field not in t})
+    if missing:
+        raise unexpected_payload(f"transactions without {missing} (found: {sorted(transactions[0])})")
+
+    df = pd.json_normalize(transactions)
+    df = df.reindex(columns=list(FIELDS_TO_COLUMNS)).rename(columns=FIELDS_TO_COLUMNS)
+
+    df['קטגוריה'] = df['קטגוריה'].astype('string').map(lambda c: categories.get(c, c), na_action='ignore')
+    for col in ['מטבע חיוב', 'מטבע עסקה מקורי']:
+        currency = df[col].astype('string')
+        df[col] = currency.map(CURRENCY_SYMBOLS).fillna(currency)
+
+    df = clean_transactions(df)
+    valid = df['תאריך עסקה'].notna() & df['סכום חיוב'].notna()
+    if not valid.any():
+        raise unexpected_payload(f"none of {len(df)} transactions has a readable purchase date and amount "
+                                 f"(e.g. {transactions[0].get('purchaseDate')!r}, "
+                                 f"{transactions[0].get('actualPaymentAmount')!r})")
+    return df[valid].reset_index(drop=True)
+
+
+def read_captured_transactions(path) -> pd.DataFrame:
+    """transactions of a saved capture / fixture file"""
+    return transactions_from_responses(load_fixture(path))
+
+
+if __name__ == '__main__':
+    setup_logging()
+    fixture = sys.argv[1]
+    df = read_captured_transactions(fixture)
+    print(df.to_string())
+    print(f"{len(df)} transactions, sum: {df['סכום חיוב'].sum():,.2f}")
@@ -0,0 +1,240 @@
+"""
+compare excel statement sums to the pdf statements (the pdf is always final).
+
+sums are extracted in a process pool, and cached by file content hash, so each file is parsed once.
+the pool spawns its processes (no fork): reconcile runs in pipeline threads, and forking a process with threads
+can deadlock. spawned processes import pandas again, so a few files are read in this process instead.
+to validate every statement, of each account's folder (months are matched within an account):
+python -m expenses_tracker.credit_cards.reconcile
+"""
+import json
+import logging
+import multiprocessing
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field
+from pathlib import Path
+
+import pandas as pd
+
+from expenses_tracker.config import Config, setup_logging
+from expenses_tracker.data_process.manifest import file_hash
+from expenses_tracker.data_process.sources import account_dir, account_names
+
+logger = logging.getLogger(__name__)
+
+config = Config()
+DATA_DIR = config.data_folder
+
+SUMS_CACHE_FILENAME = "sums_cache.json"
+SEQUENTIAL_MAX_FILES = 2  # read in this process: cheaper than starting worker processes
+
+
+@dataclass
+class MonthReconciliation:
+    month: str  # yyyy-mm
+    pdf_file: str
+    excel_file: str = None
+    pdf_sums: list = field(default_factory=list)
+    excel_sums: list = field(default_factory=list)
+    mismatches: list = field(default_factory=list)  # (pdf sum, excel sum or None)
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.excel_file) and not self.mismatches
+
+
+def get_excel_sums(f):
+    excel_sum_col = 5  # 6th column 'סכום חיוב'
+    excel_df = pd.read_excel(f, sheet_name=[0, 1])
+
+    excel_sums = []
+    for i in range(2):
+        sheet = excel_df[i]
+        s = 0
+        for val in sheet.iloc[:, excel_sum_col]:
+            if type(val) in [int, float] and not pd.isna(val):
+                num = float(val)
+                s += num
+        s = round(s, 2)
+        excel_sums.append(s)
+
+    return excel_sums
+
+
+def get_pdf_sums(pdf_file) -> list:
+    import pypdf  # only needed to validate downloads
+
+    reader = pypdf.PdfReader(pdf_file)
+    num_pages = len(reader.pages)
+    texts = []
+    for i in range(num_pages):
+        page = reader.pages[i]
+        text = page.extract_text()
+        texts.append(text)
+    text = "\n".join(texts)
+
+    lines = text.splitlines()
+    pdf_sums = []
+    for i in range(len(lines)):
+        line = lines[i]
+        if ("חיובים" in line) and ("בתאריך" in line):
+            sum_line = lines[i + 2]
+            sum = sum_line.replace(",", "")
+            sum = float(sum)
+            pdf_sums.append(sum)
+    return pdf_sums
+
+
+def get_sums(f) -> list:
+    """sums of a pdf or excel statement"""
+    if str(f).endswith(".pdf"):
+        return get_pdf_sums(f)
+    return get_excel_sums(f)
+
+
+class SumsCache:
+    """statement sums by file content hash. file stats are kept too, so unchanged files are not re-hashed"""
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.files = {}  # path -> {mtime, size, hash}
+        self.sums = {}  # hash -> sums
+        if self.path.exists():
+            try:
+                cache = json.loads(self.path.read_text(encoding='utf-8'))
+                self.files, self.sums = cache['files'], cache['sums']
+            except Exception as e:
+                logger.warning(f"ignoring unreadable sums cache {self.path}: {e}")
+
+    def hash_of(self, f) -> str:
+        stat = os.stat(f)
+        entry = self.files.get(str(f))
+        if entry and (entry['mtime'] == stat.st_mtime) and (entry['size'] == stat.st_size):
+            return entry['hash']
+        h = file_hash(f)
+        self.files[str(f)] = {'mtime': stat.st_mtime, 'size': stat.st_size, 'hash': h}
+        return h
+
+    def get(self, f):
+        return self.sums.get(self.hash_of(f))
+
+    def set(self, f, sums: list):
+        self.sums[self.hash_of(f)] = sums
+
+    def save(self):
+        cache = {'files': self.files, 'sums': self.sums}
+        self.path.write_text(json.dumps(cache, ensure_ascii=False, indent=2), encoding='utf-8')
+
+
+def extract_sums(files, workers=None):
+    """(file, sums or None if it could not be read) of each file"""
+    max_workers = min(workers or os.cpu_count() or 1, len(files))
+    if len(files) <= SEQUENTIAL_MAX_FILES or max_workers == 1:
+        results = []
+        for f in files:
+            try:
+                results.append((f, get_sums(f)))
+            except Exception as e:
+                logger.error(f"failed to read sums of {f}: {e}")
+                results.append((f, None))
+        return results
+
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {f: pool.submit(get_sums, f) for f in files}
+    results = []
+    for f, future in futures.items():
+        try:
+            results.append((f, future.result()))
+        except Exception as e:
+            logger.error(f"failed to read sums of {f}: {e}")
+            results.append((f, None))
+    return results
+
+
+def get_all_sums(files, workers=None) -> dict:
+    """file -> sums (None if it could not be read). uncached files are read in parallel processes"""
+    cache = SumsCache(Path(DATA_DIR) / SUMS_CACHE_FILENAME)
+    all_sums = {}
+    missing = []
+    for f in files:
+        sums = cache.get(f)
+        if sums is None:
+            missing.append(f)
+        else:
+            all_sums[f] = sums
+
+    if missing:
+        logger.info(f"extracting sums of {len(missing)} files ({len(all_sums)} cached)")
+        for f, sums in extract_sums(missing, workers):
+            all_sums[f] = sums
+            if sums is not None:
+                cache.set(f, sums)
+        cache.save()
+
+    return all_sums
+
+
+def reconcile(files, allowed_diff=0.01, workers=None) -> list[MonthReconciliation]:
+    """per month comparison of pdf sums to the excel sums of the same month"""
+    filtered_files = [str(f) for f in files if f and ("future" not in str(f))]
+    pdfs = [f for f in filtered_files if f.endswith(".pdf")]
+    excels = [f for f in filtered_files if f.endswith(".xlsx")]
+    all_sums = get_all_sums(pdfs + excels, workers)
+
+    for f in excels:
+        if all_sums[f] is not None:
+            logger.info(f"{Path(f).name}: {sum(all_sums[f]):,.2f} = {all_sums[f]}")
+
+    results = []
+    for pdf_file in pdfs:
+        # lookup dddd-dd
+        match = re.search(r"\d{4}-\d{2}", Path(pdf_file).stem)
+        if (not match) or (all_sums[pdf_file] is None):
+            continue
+        yyyy_mm = match.group()
+        pdf_sums = sorted(all_sums[pdf_file])
+
+        excel_files_match = [f for f in excels if (yyyy_mm in Path(f).name) and (all_sums[f] is not None)]
+        if not excel_files_match:
+            results.append(MonthReconciliation(yyyy_mm, pdf_file, pdf_sums=pdf_sums,
+                                               mismatches=[(s, None) for s in pdf_sums]))
+            continue
+
+        for f in excel_files_match:  # supposed to be just one file, but anyway
+            excel_sums = sorted(all_sums[f])
+            mismatches = []
+            for i in range(len(pdf_sums)):
+                if i >= len(excel_sums):
+                    mismatches.append((pdf_sums[i], None))
+                elif abs(pdf_sums[i] - excel_sums[i]) > allowed_diff:
+                    mismatches.append((pdf_sums[i], excel_sums[i]))
+            results.append(MonthReconciliation(yyyy_mm, pdf_file, f, pdf_sums, excel_sums, mismatches))
+
+    return results
+
+
+def compare_excel_to_pdf(downloaded_files, allowed_diff=0.01) -> list[MonthReconciliation]:
+    """reconcile and log the results"""
+    results = reconcile(downloaded_files, allowed_diff)
+    for r in results:
+        logger.info(f"comparing {r.pdf_file} to {r.excel_file}")
+        logger.debug(f"pdf: {r.pdf_sums}, excel: {r.excel_sums}")
+        for pdf_sum, excel_sum in r.mismatches:
+            logger.warning(f"pdf: {pdf_sum}, excel: {excel_sum if excel_sum is not None else 'missing'}")
+        if r.ok:
+            logger.info(f"sums OK")
+    return results
+
+
+if __name__ == "__main__":
+    setup_logging()
+    for account in account_names():
+        folder = account_dir(account)
+        files = [str(f) for f in folder.glob('*') if f.suffix in [".pdf", ".xlsx"]] if folder.exists() else []
+        print(f"account {account}: {len(files)} files")
+        results = compare_excel_to_pdf(files)
+        for r in sorted(results, key=lambda r: r.month):
+            print(f"{r.month}: {'OK' if r.ok else 'MISMATCH'} pdf={sum(r.pdf_sums):,.2f} "
+                  f"excel={sum(r.excel_sums):,.2f}")
@@ -0,0 +1,124 @@
+"""
+safe writes of the store files, which the dashboard and the refresh daemon (two processes) may both update.
+
+replacing(path): the file is written to a temp file next to it, then renamed over it (os.replace is atomic),
+so a reader sees the previous file or the new one, never a partial one.
+FileLock: one writer at a time. the lock is a file created exclusively (O_EXCL), which works on any os without a
+dependency. it holds the pid of its owner: a lock of a process that no longer runs is left over from a killed
+process, and taken over. a long rebuild keeps its lock however long it takes. where the pid can't be checked
+(windows), or the file has no pid, a lock older than stale_sec is taken over.
+"""
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+LOCK_POLL_SEC = 0.2
+
+
+def pid_alive(pid: int) -> bool | None:
+    """None if it can't be checked on this os"""
+    if os.name == 'nt':  # os.kill terminates the process on windows
+        return None
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:  # runs, as another user
+        return True
+    return True
+
+
+@contextmanager
+def replacing(path):
+    """yields a temp path to write, that replaces path if the block completes"""
+    path = Path(path)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        yield tmp
+        os.replace(tmp, path)
+    finally:
+        tmp.unlink(missing_ok=True)
+
+
+def write_text(path, text: str):
+    with replacing(path) as tmp:
+        tmp.write_text(text, encoding='utf-8')
+
+
+class FileLock:
+    """inter-process lock, reentrant within the process (threads wait on each other)"""
+
+    def __init__(self, path, stale_sec=600):
+        self.path = Path(path)
+        self.stale_sec = stale_sec
+        self._thread_lock = threading.RLock()
+        self._depth = 0
+
+    def acquire(self, timeout_sec=None) -> bool:
+        """False if the lock was not acquired within timeout_sec (None: wait as long as it takes)"""
+        deadline = None if timeout_sec is None else time.monotonic() + timeout_sec
+        if not self._thread_lock.acquire(timeout=-1 if timeout_sec is None else timeout_sec):
+            return False
+        if self._depth:
+            self._depth += 1
+            return True
+        while True:
+            try:
+                fd = os.open(self.path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+                os.write(fd, str(os.getpid()).encode())
+                os.close(fd)
+                self._depth = 1
+                return True
+            except FileExistsError:
+                self._remove_if_stale()
+            if deadline is not None and time.monotonic() >= deadline:
+                self._thread_lock.release()
+                return False
+            time.sleep(LOCK_POLL_SEC)
+
+    def release(self):
+        self._depth -= 1
+        if not self._depth:
+            # taken over (e.g. judged stale by another process): that process owns it now
+            if self._owner() == os.getpid():
+                self.path.unlink(missing_ok=True)
+            else:
+                logger.warning(f"lock {self.path} was taken over by another process")
+        self._thread_lock.release()
+
+    def _owner(self) -> int | None:
+        """pid written in the lock file, None if there is no file or no pid in it (yet)"""
+        try:
+            return int(self.path.read_text())
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def _remove_if_stale(self):
+        owner = self._owner()
+        alive = None if owner is None else pid_alive(owner)
+        if alive:
+            return
+        if alive is None:
+            try:
+                age = time.time() - self.path.stat().st_mtime
+            except FileNotFoundError:
+                return
+            if age <= self.stale_sec:
+                return
+            logger.warning(f"removing stale lock {self.path} ({age:.0f} sec old)")
+        else:
+            logger.warning(f"removing lock {self.path} of process {owner}, which is no longer running")
+        if self._owner() == owner:  # not taken over meanwhile by another process
+            self.path.unlink(missing_ok=True)
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
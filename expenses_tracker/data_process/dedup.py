@@ -0,0 +1,76 @@
+"""
+duplicate transactions across statements: a month downloaded again (saved as transactions_<month>_<HHMMSS>),
+in several formats, or both as a partial '_future' statement and as the final one. a card seen by two accounts
+(see Config.max_accounts) has its transactions in the statements of both.
+
+rows are keyed by a hash of their normalized transaction date, business, amount, card and charge date.
+a transaction repeated within a statement (two coffees on the same day) is kept: the n-th occurrence of a key in
+one statement only duplicates the n-th occurrence in another. of duplicates, the row of the latest added statement
+is kept. a '_future' statement is superseded altogether once the final statement of its month is in.
+hashing and numbering occurrences are linear in the rows (no sorting), so it runs on the whole ledger at each save.
+"""
+import logging
+import re
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+SOURCE_COL = 'קובץ מקור'
+KEY_DATE_COLS = ['תאריך עסקה', 'תאריך חיוב']
+KEY_TEXT_COLS = ['שם בית העסק', '4 ספרות אחרונות של כרטיס האשראי']
+KEY_AGOROT_COL = 'סכום חיוב באגורות'
+
+# partner/transactions_2024-12_future_093012 -> (partner/transactions_2024-12, future)
+STATEMENT_NAME = re.compile(r'^(?P<statement>.*?)(?P<future>_future)?(?:_\d{6})?$')
+
+
+def statement_of(source_name: str) -> tuple[str, bool]:
+    """(statement name, whether it is a partial '_future' one) of a source file name"""
+    match = STATEMENT_NAME.match(Path(source_name).with_suffix('').as_posix())
+    return match['statement'], bool(match['future'])
+
+
+def superseded_sources(source_names) -> set:
+    """'_future' statements of months that have a final statement"""
+    statements = {name: statement_of(name) for name in source_names}
+    final = {statement for statement, future in statements.values() if not future}
+    return {name for name, (statement, future) in statements.items() if future and statement in final}
+
+
+def hash_text(col: pd.Series) -> np.ndarray:
+    """hash of the stripped, case folded text. a categorical column hashes its (few) categories only"""
+    if not isinstance(col.dtype, pd.CategoricalDtype):
+        col = col.astype('category')
+    categories = col.cat.categories.astype(str).str.strip().str.casefold().str.split().str.join(' ')
+    hashes = pd.util.hash_array(categories.to_numpy(dtype=object))
+    codes = col.cat.codes.to_numpy()
+    return np.where(codes >= 0, hashes[codes], np.uint64(0))
+
+
+def transaction_keys(df: pd.DataFrame) -> np.ndarray:
+    parts = {col: pd.to_datetime(df[col]).dt.normalize().to_numpy(dtype='int64') for col in KEY_DATE_COLS}
+    parts |= {col: hash_text(df[col]) for col in KEY_TEXT_COLS}
+    parts[KEY_AGOROT_COL] = df[KEY_AGOROT_COL].to_numpy(dtype='int64')
+    return pd.util.hash_pandas_object(pd.DataFrame(parts), index=False).to_numpy()
+
+
+def duplicate_mask(df: pd.DataFrame) -> np.ndarray:
+    """True for rows that repeat a row of another statement, or belong to a superseded one.
+    df rows are in the order statements were added (see store.save_store)"""
+    if df.empty:
+        return np.zeros(0, dtype=bool)
+    superseded = df[SOURCE_COL].isin(superseded_sources(df[SOURCE_COL].unique())).to_numpy()
+    final = df[~superseded]
+
+    keys = pd.DataFrame({'key': transaction_keys(final), 'source': final[SOURCE_COL].to_numpy()})
+    keys['occurrence'] = keys.groupby(['key', 'source'], sort=False, observed=True).cumcount()
+    repeated = keys.duplicated(['key', 'occurrence'], keep='last').to_numpy()
+
+    mask = superseded.copy()
+    mask[~superseded] = repeated
+    if mask.any():
+        logger.info(f"duplicates: {repeated.sum()} repeated rows, {superseded.sum()} rows of superseded statements")
+    return mask
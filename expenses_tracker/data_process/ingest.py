@@ -0,0 +1,35 @@
+import logging
+import os
+from pathlib import Path
+
+from expenses_tracker.data_process import sources
+from expenses_tracker.diagnostics import span
+
+logger = logging.getLogger(__name__)
+
+
+def export_markdown(excel_files):
+    """optional markdown copy of the statements (the store reads excel files directly)"""
+    from expenses_tracker.data_process.process_credit_files import to_markdown  # markitdown is slow to import
+
+    for f in excel_files:
+        if not f:
+            continue
+        md_file = Path(f).with_suffix(".md")
+        if md_file.exists() and os.path.getmtime(md_file) >= os.path.getmtime(f):
+            continue
+        with span("convert.to_markdown", file=Path(f).name):
+            to_markdown(str(f))
+        logger.info(f"exported {md_file.name}")
+
+
+def refresh(excel_files=(), markdown=False, parsed=None) -> bool:
+    """merge new or changed statements into the store. returns whether the store changed.
+    parsed: optional {file: transactions} of statements already loaded"""
+    if markdown:
+        export_markdown(excel_files)
+    if sources.is_up_to_date():
+        return False
+
+    from expenses_tracker.data_process import store  # pandas, only when there is something to merge
+    return store.update_store(parsed)
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import logging
+import os
+from pathlib import Path
+
+from expenses_tracker.data_process.atomic import write_text
+
+logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def relative_name(file_path, root=None) -> str:
+    """path relative to root ('<account>/transactions_2024-12.xlsx'), or the file name if it's not under root"""
+    if root is not None:
+        try:
+            return Path(file_path).resolve().relative_to(Path(root).resolve()).as_posix()
+        except ValueError:
+            pass
+    return Path(file_path).name
+
+
+def file_hash(file_path) -> str:
+    """sha256 of the file content"""
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        while chunk := f.read(HASH_CHUNK_SIZE):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+class Manifest:
+    """record of ingested source files: name (relative to root) -> {hash, mtime, size, rows}.
+    files that failed to parse are recorded too (failed: the error), so they are retried only once they change"""
+
+    def __init__(self, path, root=None):
+        self.path = Path(path)
+        self.root = root
+        self.entries = {}
+        self.dirty = False
+        if self.path.exists():
+            try:
+                self.entries = json.loads(self.path.read_text(encoding='utf-8'))
+            except Exception as e:
+                logger.warning(f"ignoring unreadable manifest {self.path}: {e}")
+
+    def is_changed(self, file_path) -> bool:
+        """new file, or content differs from the recorded one.
+        mtime and size are checked first, so unchanged files are not hashed"""
+        entry = self.entries.get(relative_name(file_path, self.root))
+        if entry is None:
+            return True
+        stat = os.stat(file_path)
+        if (stat.st_mtime == entry['mtime']) and (stat.st_size == entry['size']):
+            return False
+        if file_hash(file_path) == entry['hash']:
+            # touched but same content
+            entry['mtime'] = stat.st_mtime
+            self.dirty = True
+            return False
+        return True
+
+    def update(self, file_path, rows=None, error=None):
+        stat = os.stat(file_path)
+        entry = {
+            'hash': file_hash(file_path),
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'rows': rows,
+        }
+        if error is not None:
+            entry['failed'] = error
+        self.entries[relative_name(file_path, self.root)] = entry
+        self.dirty = True
+
+    def remove(self, file_name):
+        if self.entries.pop(file_name, None) is not None:
+            self.dirty = True
+
+    def names(self) -> set:
+        return set(self.entries)
+
+    def save(self):
+        if not self.dirty:
+            return
+        write_text(self.path, json.dumps(self.entries, ensure_ascii=False, indent=2))
+        self.dirty = False
@@ -0,0 +1,162 @@
+"""
+sqlite copy of the ledger for ad-hoc queries (data/transactions.sqlite), filled at ingest next to the store.
+
+    python main.py query "SELECT month, SUM(amount) FROM expenses GROUP BY month"
+
+tables use english column names (see COLUMNS). query the `expenses` view: transactions without duplicates
+(see dedup.py), with amount in ₪. `transactions` has every row of every statement, and amount_agorot.
+indexed on month, category and merchant, so filtered queries read only the matching rows from disk.
+like the store, the db is updated by statement: rows of changed or removed statements are replaced.
+queries run on a read only connection, and must be a single SELECT (or WITH) statement. mode=ro alone does not
+make a connection read only (ATTACH opens another, writable db), so an authorizer also denies everything but reads.
+sqlite is in the standard library, no pandas here.
+"""
+import logging
+import re
+import sqlite3
+import time
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SOURCE_COL = 'קובץ מקור'
+# db column -> ledger column
+COLUMNS = {
+    'source': SOURCE_COL,
+    'seq': None,  # row number within the source statement
+    'account': 'חשבון',
+    'transaction_date': 'תאריך עסקה',
+    'charge_date': 'תאריך חיוב',
+    'month': 'חודש חיוב',
+    'merchant': 'שם בית העסק',
+    'category': 'קטגוריה',
+    'card': '4 ספרות אחרונות של כרטיס האשראי',
+    'type': 'סוג עסקה',
+    'amount_agorot': 'סכום חיוב באגורות',
+    'notes': 'הערות',
+    'tags': 'תיוגים',
+}
+DATE_COLUMNS = ['transaction_date', 'charge_date']
+INSERT_BATCH_ROWS = 50_000
+DEFAULT_LIMIT = 1_000
+# authorizer actions of a query: reading tables and views, calling functions. ATTACH, PRAGMA and writes are denied
+QUERY_ACTIONS = {sqlite3.SQLITE_SELECT, sqlite3.SQLITE_READ, sqlite3.SQLITE_FUNCTION}
+LEADING_COMMENTS = re.compile(r'\A(\s+|--[^\n]*|/\*.*?\*/)*', re.DOTALL)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS transactions (
+    source TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    account TEXT,
+    transaction_date TEXT,  -- yyyy-mm-dd
+    charge_date TEXT,
+    month TEXT,  -- yyyy-mm, of the charge
+    merchant TEXT,
+    category TEXT,
+    card TEXT,
+    type TEXT,
+    amount_agorot INTEGER NOT NULL,
+    notes TEXT,
+    tags TEXT,
+    PRIMARY KEY (source, seq)
+);
+CREATE INDEX IF NOT EXISTS transactions_month ON transactions (month, category);
+CREATE INDEX IF NOT EXISTS transactions_category ON transactions (category, month, card, amount_agorot);
+CREATE INDEX IF NOT EXISTS transactions_merchant ON transactions (merchant, month);
+CREATE TABLE IF NOT EXISTS duplicates (
+    source TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    PRIMARY KEY (source, seq)
+);
+CREATE VIEW IF NOT EXISTS expenses AS
+SELECT source, account, transaction_date, charge_date, month, merchant, category, card, type,
+       amount_agorot / 100.0 AS amount, notes, tags
+FROM transactions t
+WHERE NOT EXISTS (SELECT 1 FROM duplicates d WHERE d.source = t.source AND d.seq = t.seq);
+"""
+
+
+def connect(path) -> sqlite3.Connection:
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def ledger_rows(df):
+    """db rows of ledger rows: text dates and months, None for missing values"""
+    out = df.reindex(columns=[c for c in COLUMNS.values() if c])
+    out.columns = [c for c, ledger_col in COLUMNS.items() if ledger_col]
+    for col in DATE_COLUMNS:
+        out[col] = out[col].dt.strftime('%Y-%m-%d')
+    out['month'] = out['month'].astype(str)
+    out.insert(1, 'seq', df['seq'].to_numpy())
+    out = out.astype(object).where(out.notna(), None)
+    return out.itertuples(index=False, name=None)
+
+
+def update_query_db(path, df, added_names, stale_names=(), duplicate_col=None, rebuild=False):
+    """replace the rows of stale_names by the ledger rows of added_names, and refresh the duplicates.
+    df: the whole ledger (with duplicate_col), as save_store saved it"""
+    df = df.assign(seq=df.groupby(SOURCE_COL, observed=True).cumcount())
+    conn = connect(path)
+    try:
+        with conn:
+            if rebuild:
+                conn.execute("DELETE FROM transactions")
+            conn.executemany("DELETE FROM transactions WHERE source = ?", [(name,) for name in stale_names])
+
+            added = df[df[SOURCE_COL].isin(set(added_names))]
+            placeholders = ', '.join('?' * len(COLUMNS))
+            rows = ledger_rows(added)
+            while batch := [row for _, row in zip(range(INSERT_BATCH_ROWS), rows)]:
+                conn.executemany(f"INSERT INTO transactions VALUES ({placeholders})", batch)
+
+            # duplicates depend on all statements, they are few: rewritten
+            conn.execute("DELETE FROM duplicates")
+            if duplicate_col in df.columns:
+                duplicates = df.loc[df[duplicate_col], [SOURCE_COL, 'seq']]
+                conn.executemany("INSERT INTO duplicates VALUES (?, ?)",
+                                 zip(duplicates[SOURCE_COL].astype(str), duplicates['seq'].astype(int)))
+        logger.info(f"query db updated: {path}, rows added: {len(added)}")
+    finally:
+        conn.close()
+
+
+def authorize_query(action, *_) -> int:
+    return sqlite3.SQLITE_OK if action in QUERY_ACTIONS else sqlite3.SQLITE_DENY
+
+
+def check_select(sql: str):
+    """raises if sql does not start with SELECT / WITH. execute() refuses more than one statement,
+    and the authorizer refuses anything but reads (e.g. a WITH ... DELETE)"""
+    if not re.match(r'(SELECT|WITH)\b', LEADING_COMMENTS.sub('', sql), re.IGNORECASE):
+        raise sqlite3.ProgrammingError("only SELECT (or WITH) queries are allowed")
+
+
+def query(path, sql: str, params=(), limit=DEFAULT_LIMIT) -> tuple[list, list, float]:
+    """(column names, rows, seconds) of a read only query. at most limit rows are fetched"""
+    check_select(sql)
+    if not Path(path).exists():
+        raise FileNotFoundError(f"no query db yet: {path}. run: python main.py ingest")
+    conn = sqlite3.connect(f"{Path(path).resolve().as_uri()}?mode=ro", uri=True)
+    conn.set_authorizer(authorize_query)
+    try:
+        start = time.perf_counter()
+        cursor = conn.execute(sql, params)
+        rows = cursor.fetchmany(limit) if limit else cursor.fetchall()
+        columns = [d[0] for d in cursor.description or []]
+        return columns, rows, time.perf_counter() - start
+    finally:
+        conn.close()
+
+
+def format_table(columns: list, rows: list) -> str:
+    """plain text table, for the cli"""
+    cells = [[str(c) for c in columns]] + [["" if v is None else f"{v:,.2f}" if isinstance(v, float) else str(v)
+                                             for v in row] for row in rows]
+    widths = [max(len(row[i]) for row in cells) for i in range(len(columns))]
+    lines = ["  ".join(v.ljust(w) for v, w in zip(row, widths)) for row in cells]
+    lines.insert(1, "  ".join("-" * w for w in widths))
+    return "\n".join(lines)
@@ -0,0 +1,243 @@
+"""
+recurring charges over the whole history: subscriptions (charges of a merchant every month or every year),
+installment plans ('תשלומים') with their remaining payments, and price changes of subscriptions.
+
+charges are grouped by normalized merchant name (see search_index.normalize_text, 'NETFLIX.COM' / 'Netflix com')
+and card. a group is a subscription when most intervals between its charges are about a month (or a year), and its
+amount is stable: a low coefficient of variation, or a few step changes (price changes). standing orders
+('הוראת קבע', e.g. electricity) may vary more. installment plans are read from the notes ('תשלום 3 מתוך 12').
+
+the statistics are groupby aggregations over the rows (linear). only groups charged at most twice a month are
+sorted by date for the intervals, so frequent merchants (the supermarket) cost a single pass.
+"""
+import logging
+import re
+
+import numpy as np
+import pandas as pd
+
+from expenses_tracker.data_process.search_index import normalize_text
+
+logger = logging.getLogger(__name__)
+
+DATE_COL = 'תאריך עסקה'
+MERCHANT_COL = 'שם בית העסק'
+CARD_COL = '4 ספרות אחרונות של כרטיס האשראי'
+TYPE_COL = 'סוג עסקה'
+NOTES_COL = 'הערות'
+AMOUNT_COL = 'סכום חיוב'
+MONTH_COL = 'חודש חיוב'
+
+INSTALLMENTS_TYPE = 'תשלומים'
+STANDING_ORDER_TYPE = 'הוראת קבע'
+INSTALLMENT_NOTE = re.compile(r'(\d+)\s*מתוך\s*(\d+)')  # 'תשלום 3 מתוך 12'
+
+# kind -> (min charges, min interval days, max interval days)
+PERIODS = {
+    'monthly': (3, 26, 35),
+    'annual': (2, 350, 380),
+}
+MAX_CHARGES_PER_MONTH = 2
+MIN_REGULAR_SHARE = 0.75  # of the intervals within the period
+MAX_AMOUNT_CV = 0.15
+MAX_STANDING_ORDER_CV = 0.5
+MAX_PRICE_CHANGES_SHARE = 0.25  # of the intervals, amount changed from the previous charge (one change is allowed)
+MIN_PRICE_CHANGE = 0.01  # relative to the previous charge
+ACTIVE_GRACE_INTERVALS = 1.5  # a subscription is active until this many intervals passed since its last charge
+
+SUBSCRIPTION_COLS = ['merchant', 'card', 'kind', 'charges', 'first', 'last', 'amount', 'average', 'interval_days',
+                     'next_charge', 'monthly_cost', 'previous_amount', 'price_change', 'price_changed_on', 'active']
+INSTALLMENT_COLS = ['merchant', 'card', 'purchase_date', 'amount', 'payment', 'payments', 'remaining_payments',
+                    'remaining_amount', 'last_month', 'end_month']
+
+
+def merchant_keys(merchants: pd.Series) -> np.ndarray:
+    """code of the normalized merchant name of each row (-1 for none). names are normalized once each"""
+    if not isinstance(merchants.dtype, pd.CategoricalDtype):
+        merchants = merchants.astype('category')
+    normalized_codes, _ = pd.factorize(merchants.cat.categories.map(normalize_text))
+    codes = merchants.cat.codes.to_numpy()
+    return np.where(codes >= 0, normalized_codes[codes], -1)
+
+
+def group_ids(*keys) -> np.ndarray:
+    """one id per distinct combination of the keys (arrays of the rows)"""
+    return pd.MultiIndex.from_arrays(keys).factorize()[0] if len(keys) > 1 else pd.factorize(keys[0])[0]
+
+
+def optional_column(df: pd.DataFrame, col: str) -> pd.Series:
+    """df[col], or an all missing categorical column when the ledger has no col (e.g. notes, type or card)"""
+    if col in df.columns:
+        return df[col]
+    missing = pd.Categorical.from_codes(np.full(len(df), -1), categories=pd.Index([], dtype=object))
+    return pd.Series(missing, index=df.index, name=col)
+
+
+def installment_notes(notes: pd.Series) -> tuple[np.ndarray, np.ndarray]:
+    """(payment number, number of payments) of each row, NaN where the notes are not of an installment"""
+    if not isinstance(notes.dtype, pd.CategoricalDtype):
+        notes = notes.astype('category')
+    parsed = notes.cat.categories.astype(str).str.extract(INSTALLMENT_NOTE).astype(float).to_numpy()
+    parsed = np.vstack([parsed, [np.nan, np.nan]])  # code -1: no notes
+    rows = parsed[notes.cat.codes.to_numpy()]
+    return rows[:, 0], rows[:, 1]
+
+
+def installment_mask(df: pd.DataFrame) -> np.ndarray:
+    _, payments = installment_notes(optional_column(df, NOTES_COL))
+    return (optional_column(df, TYPE_COL) == INSTALLMENTS_TYPE).to_numpy() | (payments > 1)
+
+
+def day_numbers(dates: pd.Series) -> np.ndarray:
+    return dates.to_numpy(dtype='datetime64[D]').astype('int64')
+
+
+def subscriptions(df: pd.DataFrame) -> pd.DataFrame:
+    """monthly and annual charges of a merchant (and card), by monthly cost. see SUBSCRIPTION_COLS.
+    active: charged recently (compared to the latest transaction in df), next_charge is its estimate"""
+    rows = df[~installment_mask(df)]
+    rows = rows[rows[DATE_COL].notna()]
+    if rows.empty:
+        return pd.DataFrame(columns=SUBSCRIPTION_COLS)
+
+    merchant = merchant_keys(rows[MERCHANT_COL])
+    card = optional_column(rows, CARD_COL).astype('category').cat.codes.to_numpy()
+    group = group_ids(merchant, card)
+    days = day_numbers(rows[DATE_COL])
+    months = rows[DATE_COL].dt.year.to_numpy() * 12 + rows[DATE_COL].dt.month.to_numpy()
+
+    # candidates: at most a couple of charges in any month
+    per_month = pd.Series(group).groupby([group, months]).size()
+    busiest_month = per_month.groupby(level=0).max()
+    counts = np.bincount(group)
+    candidate_groups = busiest_month.index[(busiest_month <= MAX_CHARGES_PER_MONTH).to_numpy()
+                                           & (counts[busiest_month.index] >= min(p[0] for p in PERIODS.values()))]
+    candidate = np.isin(group, candidate_groups)
+    if not candidate.any():
+        return pd.DataFrame(columns=SUBSCRIPTION_COLS)
+
+    order = np.lexsort((days[candidate], group[candidate]))
+    candidates = rows[candidate].iloc[order]
+    charges = pd.DataFrame({
+        'group': group[candidate][order],
+        'day': days[candidate][order],
+        'amount': candidates[AMOUNT_COL].to_numpy(dtype=float),
+        'standing_order': (optional_column(candidates, TYPE_COL) == STANDING_ORDER_TYPE).to_numpy(),
+        'merchant': candidates[MERCHANT_COL].astype(str).str.strip().to_numpy(),
+        'card': optional_column(candidates, CARD_COL).astype('string').to_numpy(),
+    })
+    same_group = np.r_[False, charges['group'].to_numpy()[1:] == charges['group'].to_numpy()[:-1]]
+    charges['interval'] = np.where(same_group, charges['day'].diff(), np.nan)
+    previous_amount = np.where(same_group, charges['amount'].shift(), np.nan)
+    charges['previous_amount'] = previous_amount
+    charges['amount_changed'] = (np.abs(charges['amount'] - previous_amount)
+                                 > MIN_PRICE_CHANGE * np.abs(previous_amount))
+    for kind, (_, low, high) in PERIODS.items():
+        charges[kind] = charges['interval'].between(low, high)
+
+    stats = charges.groupby('group', sort=False).agg(
+        merchant=('merchant', 'last'),
+        card=('card', 'last'),
+        charges=('day', 'size'),
+        first_day=('day', 'first'),
+        last_day=('day', 'last'),
+        amount=('amount', 'last'),
+        average=('amount', 'mean'),
+        amount_std=('amount', 'std'),
+        amount_changes=('amount_changed', 'sum'),
+        standing_order=('standing_order', 'mean'),
+        interval_days=('interval', 'median'),
+        **{kind: (kind, 'sum') for kind in PERIODS},
+    )
+    intervals = stats['charges'] - 1
+    cv = (stats['amount_std'] / stats['average'].abs()).fillna(0)
+    max_cv = np.where(stats['standing_order'] >= 0.5, MAX_STANDING_ORDER_CV, MAX_AMOUNT_CV)
+    fixed_price = stats['amount_changes'] <= np.maximum(1, MAX_PRICE_CHANGES_SHARE * intervals)
+    stable = (cv <= max_cv) | fixed_price
+    kinds = [(stats['charges'] >= min_charges) & (stats[kind] >= MIN_REGULAR_SHARE * intervals) & stable
+             for kind, (min_charges, _, _) in PERIODS.items()]
+    stats['kind'] = np.select(kinds, list(PERIODS), default='')
+    stats = stats[stats['kind'] != ''].copy()
+
+    # latest price change, of subscriptions with a fixed price (not of bills that vary every month)
+    changes = charges[charges['amount_changed']].groupby('group', sort=False).agg(
+        previous_amount=('previous_amount', 'last'), changed_day=('day', 'last'))
+    stats = stats.join(changes[fixed_price.reindex(changes.index, fill_value=False)])
+
+    latest_day = days.max()
+    stats['active'] = stats['last_day'] + ACTIVE_GRACE_INTERVALS * stats['interval_days'] >= latest_day
+    for col in ['first_day', 'last_day']:
+        stats[col.removesuffix('_day')] = pd.to_datetime(stats[col], unit='D')
+    stats['next_charge'] = pd.to_datetime(stats['last_day'] + stats['interval_days'].round(), unit='D').where(
+        stats['active'])
+    stats['monthly_cost'] = np.where(stats['kind'] == 'annual', stats['amount'] / 12, stats['amount'])
+    stats['price_change'] = stats['amount'] - stats['previous_amount']
+    stats['price_changed_on'] = pd.to_datetime(stats['changed_day'], unit='D')
+
+    logger.info(f"recurring: {len(stats)} subscriptions of {len(candidate_groups)} candidate groups")
+    return (stats.sort_values(['active', 'monthly_cost'], ascending=False)[SUBSCRIPTION_COLS]
+            .reset_index(drop=True).round(2))
+
+
+def price_changes(subs: pd.DataFrame) -> pd.DataFrame:
+    """subscriptions whose price changed: the latest change, from previous_amount to amount"""
+    return subs[subs['price_change'].notna()]
+
+
+def installment_plans(df: pd.DataFrame) -> pd.DataFrame:
+    """installment plans, latest first. see INSTALLMENT_COLS.
+    a plan is the payments of a purchase: merchant, card, purchase date and number of payments (from the notes).
+    without notes, the payments of a merchant and card (and amount) are one plan of unknown length"""
+    mask = installment_mask(df)
+    rows = df[mask]
+    if rows.empty:
+        return pd.DataFrame(columns=INSTALLMENT_COLS)
+
+    payment, payments = installment_notes(optional_column(rows, NOTES_COL))
+    known = ~np.isnan(payments)
+    purchase_day = np.where(known, day_numbers(rows[DATE_COL]), -1)
+    amount_key = np.where(known, 0, rows[AMOUNT_COL].to_numpy(dtype=float))
+    card = optional_column(rows, CARD_COL)
+    group = group_ids(merchant_keys(rows[MERCHANT_COL]), card.astype('category').cat.codes.to_numpy(),
+                      purchase_day, np.nan_to_num(payments, nan=-1), amount_key)
+    plans = pd.DataFrame({
+        'group': group,
+        'merchant': rows[MERCHANT_COL].astype(str).str.strip().to_numpy(),
+        'card': card.astype('string').to_numpy(),
+        'purchase_date': rows[DATE_COL].to_numpy(),
+        'amount': rows[AMOUNT_COL].to_numpy(dtype=float),
+        'payment': payment,
+        'payments': payments,
+        'month': pd.PeriodIndex(rows[MONTH_COL], freq='M').asi8,  # ordinals
+    })
+    plans = plans.groupby('group', sort=False).agg(
+        merchant=('merchant', 'last'),
+        card=('card', 'last'),
+        purchase_date=('purchase_date', 'min'),
+        amount=('amount', 'last'),
+        payment=('payment', 'max'),
+        payments=('payments', 'max'),
+        seen=('month', 'size'),
+        last_month=('month', 'max'),
+    )
+    plans['payment'] = plans['payment'].fillna(plans['seen'])
+    plans['remaining_payments'] = plans['payments'] - plans['payment']
+    plans['remaining_amount'] = plans['remaining_payments'] * plans['amount']
+    plans['end_month'] = pd.PeriodIndex.from_ordinals(
+        (plans['last_month'] + plans['remaining_payments'].fillna(0)).astype('int64'), freq='M')
+    plans['last_month'] = pd.PeriodIndex.from_ordinals(plans['last_month'], freq='M')
+    plans.loc[plans['remaining_payments'].isna(), 'end_month'] = pd.NaT
+    plans[['payment', 'payments', 'remaining_payments']] = plans[['payment', 'payments', 'remaining_payments']].astype(
+        'Int64')
+
+    logger.info(f"recurring: {len(plans)} installment plans")
+    return (plans.sort_values(['last_month', 'remaining_amount'], ascending=False)[INSTALLMENT_COLS]
+            .reset_index(drop=True).round(2))
+
+
+def active_installments(plans: pd.DataFrame) -> pd.DataFrame:
+    """plans charged in the latest month of the plans, with payments left (or of unknown length)"""
+    if plans.empty:
+        return plans
+    current = plans['last_month'] == plans['last_month'].max()
+    return plans[current & (plans['remaining_payments'].fillna(1) > 0)]
@@ -0,0 +1,167 @@
+"""
+search index of merchant names, notes and tags, built at ingest (data/search_index.json).
+
+the index keeps the distinct values of the searched columns, with their row counts by source file,
+so it is updated incrementally like the store: values of a changed or removed statement are dropped, new ones added.
+on load, values are split into words, and words into trigrams (inverted: word -> values, trigram -> words).
+a value of several words is also indexed as one word ('סופר-פארם' as 'סופרפארם').
+
+a query word matches words that are equal, start with it, or share enough trigrams (fuzzy, e.g. spelling variants
+'מקדונלדס' / 'מקדונלד'ס', 'amazon' / 'amzon'). all query words must match; if they don't, the query is tried as
+one word ('שופר סל' finds 'שופרסל').
+"""
+import json
+import logging
+import re
+from dataclasses import dataclass
+from pathlib import Path
+
+from expenses_tracker.data_process.atomic import write_text
+
+logger = logging.getLogger(__name__)
+
+SEARCH_COLS = ['שם בית העסק', 'הערות', 'תיוגים']
+SOURCE_COL = 'קובץ מקור'
+INDEX_VERSION = 1
+
+MIN_SIMILARITY = 0.4  # trigram jaccard of a fuzzy word match
+PREFIX_SCORE = 0.9
+
+NIQQUD = re.compile('[֑-ׇ]')
+JOINING_MARKS = re.compile('[\'"`׳״]')  # removed: מקדונלד'ס -> מקדונלדס
+SEPARATORS = re.compile(r'[^\w]+')
+FINAL_LETTERS = str.maketrans('ךםןףץ', 'כמנפצ')
+
+
+def normalize_text(text: str) -> str:
+    text = NIQQUD.sub('', str(text)).lower().translate(FINAL_LETTERS)
+    text = JOINING_MARKS.sub('', text)
+    return ' '.join(SEPARATORS.sub(' ', text).split())
+
+
+def trigrams(word: str) -> set:
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+@dataclass
+class Match:
+    column: str
+    value: str
+    score: float
+    rows: int
+
+
+class SearchIndex:
+
+    def __init__(self, path=None):
+        self.path = Path(path) if path else None
+        self.values = {col: {} for col in SEARCH_COLS}  # column -> value -> {source: rows}
+        self._postings = None
+        if self.path and self.path.exists():
+            try:
+                index = json.loads(self.path.read_text(encoding='utf-8'))
+                if index.get('version') == INDEX_VERSION:
+                    self.values |= index['values']
+            except Exception as e:
+                logger.warning(f"ignoring unreadable search index {self.path}: {e}")
+
+    #### incremental updates (ingest)
+
+    def add(self, df):
+        """add the values of a parsed statements frame (with the source column)"""
+        for col in SEARCH_COLS:
+            if col not in df.columns:
+                continue
+            counts = df.groupby([SOURCE_COL, col], observed=True).size()
+            for (source, value), rows in counts.items():
+                if str(value).strip():
+                    self.values[col].setdefault(str(value), {})[source] = int(rows)
+        self._postings = None
+
+    def remove_sources(self, sources):
+        sources = set(sources)
+        for col_values in self.values.values():
+            for value in list(col_values):
+                counts = col_values[value]
+                for source in sources & counts.keys():
+                    del counts[source]
+                if not counts:
+                    del col_values[value]
+        self._postings = None
+
+    def clear(self):
+        self.values = {col: {} for col in SEARCH_COLS}
+        self._postings = None
+
+    def save(self):
+        index = {'version': INDEX_VERSION, 'values': self.values}
+        write_text(self.path, json.dumps(index, ensure_ascii=False))
+
+    #### search
+
+    def _build_postings(self):
+        entries = [(col, value) for col, col_values in self.values.items() for value in col_values]
+        word_entries = {}
+        for i, (col, value) in enumerate(entries):
+            words = normalize_text(value).split()
+            for word in words + [''.join(words)]:
+                word_entries.setdefault(word, set()).add(i)
+        trigram_words = {}
+        for word in word_entries:
+            for trigram in trigrams(word):
+                trigram_words.setdefault(trigram, set()).add(word)
+        self._postings = entries, word_entries, trigram_words
+
+    def similar_words(self, query_word: str) -> dict:
+        """index word -> score"""
+        _, word_entries, trigram_words = self._postings
+        query_trigrams = trigrams(query_word)
+        candidates = set()
+        for trigram in query_trigrams:
+            candidates |= trigram_words.get(trigram, set())
+
+        scores = {}
+        for word in candidates:
+            if word == query_word:
+                scores[word] = 1.0
+            elif word.startswith(query_word):
+                scores[word] = PREFIX_SCORE
+            elif len(query_word) >= 3:
+                word_trigrams = trigrams(word)
+                similarity = len(query_trigrams & word_trigrams) / len(query_trigrams | word_trigrams)
+                if similarity >= MIN_SIMILARITY:
+                    scores[word] = similarity
+        return scores
+
+    def search(self, query: str, limit=50) -> list[Match]:
+        """values matching every word of the query, best first"""
+        if self._postings is None:
+            self._build_postings()
+        query_words = normalize_text(query).split()
+        matches = self._search_words(query_words)
+        if not matches and len(query_words) > 1:
+            matches = self._search_words([''.join(query_words)])
+        matches.sort(key=lambda m: (m.score, m.rows), reverse=True)
+        return matches[:limit]
+
+    def _search_words(self, query_words: list) -> list[Match]:
+        entries, word_entries, _ = self._postings
+        entry_scores = None
+        for query_word in query_words:
+            word_scores = {}
+            for word, score in self.similar_words(query_word).items():
+                for i in word_entries[word]:
+                    word_scores[i] = max(word_scores.get(i, 0), score)
+            if entry_scores is None:
+                entry_scores = word_scores
+            else:
+                entry_scores = {i: s + word_scores[i] for i, s in entry_scores.items() if i in word_scores}
+        if not entry_scores:
+            return []
+
+        matches = []
+        for i, score in entry_scores.items():
+            col, value = entries[i]
+            matches.append(Match(col, value, round(score / len(query_words), 3), sum(self.values[col][value].values())))
+        return matches
@@ -0,0 +1,181 @@
+"""
+statement files and store locations. no pandas here, so quick commands (and up-to-date checks) start fast.
+"""
+import hashlib
+import json
+import os
+from datetime import datetime
+from pathlib import Path, PurePosixPath
+
+from expenses_tracker.config import Config, DEFAULT_ACCOUNT
+from expenses_tracker.data_process.atomic import write_text
+from expenses_tracker.data_process.manifest import Manifest, relative_name
+
+config = Config()
+DATA_DIR = config.data_folder
+
+STORE_FILENAME = "transactions.parquet"
+DEMO_STORE_FILENAME = "demo_transactions.parquet"
+CUBE_FILENAME = "cube.parquet"
+DEMO_CUBE_FILENAME = "demo_cube.parquet"
+SUMMARY_FILENAME = "summary.json"
+DEMO_SUMMARY_FILENAME = "demo_summary.json"
+MANIFEST_FILENAME = "manifest.json"
+DEMO_MANIFEST_FILENAME = "demo_manifest.json"
+SEARCH_INDEX_FILENAME = "search_index.json"
+DEMO_SEARCH_INDEX_FILENAME = "demo_search_index.json"
+QUERY_DB_FILENAME = "transactions.sqlite"
+DEMO_QUERY_DB_FILENAME = "demo_transactions.sqlite"
+REFRESH_SIGNAL_FILENAME = "refresh.json"
+DEMO_REFRESH_SIGNAL_FILENAME = "demo_refresh.json"
+STORE_LOCK_FILENAME = "store.lock"
+DEMO_STORE_LOCK_FILENAME = "demo_store.lock"
+
+SOURCE_SUFFIXES = ['.xlsx', '.json', '.md']  # by priority
+
+
+def is_demo() -> bool:
+    return os.getenv('DEMO') == '1'
+
+
+def account_dir(account: str) -> Path:
+    """folder of the account's statements: the data folder for the default account, else data/<account>"""
+    if account == DEFAULT_ACCOUNT:
+        return Path(DATA_DIR)
+    return Path(DATA_DIR) / account
+
+
+def account_names() -> list[str]:
+    """configured accounts, the default one included"""
+    return sorted({account['name'] for account in config.max_accounts} | {DEFAULT_ACCOUNT})
+
+
+def source_name(file) -> str:
+    """name of a statement in the store and the manifest: its path relative to the data folder"""
+    return relative_name(file, DATA_DIR)
+
+
+def account_of(name: str) -> str:
+    """account of a statement, by its source name"""
+    parts = PurePosixPath(name).parts
+    return parts[0] if len(parts) > 1 else DEFAULT_ACCOUNT
+
+
+def get_source_files() -> list[Path]:
+    """statements the store is built from, of all accounts. a month downloaded in several formats is read from
+    one file: excel, else a captured network responses json, else markdown"""
+    if is_demo():
+        pattern, folders = '*demo_expenses*', [Path(DATA_DIR)]
+    else:
+        pattern, folders = '*transactions*', [account_dir(account) for account in account_names()]
+    files_by_stem = {}
+    for suffix in reversed(SOURCE_SUFFIXES):
+        for folder in folders:
+            for f in folder.glob(f'{pattern}{suffix}'):
+                files_by_stem[f.with_suffix('')] = f
+    return list(files_by_stem.values())
+
+
+def source_fingerprint(files=None) -> tuple:
+    """(name, mtime, size) of each source file. changes when a statement is added, changed or removed"""
+    if files is None:
+        files = get_source_files()
+    fingerprint = []
+    for f in files:
+        stat = os.stat(f)
+        fingerprint.append((source_name(f), stat.st_mtime_ns, stat.st_size))
+    return tuple(sorted(fingerprint))
+
+
+def store_path() -> Path:
+    filename = DEMO_STORE_FILENAME if is_demo() else STORE_FILENAME
+    return Path(DATA_DIR) / filename
+
+
+def cube_path() -> Path:
+    filename = DEMO_CUBE_FILENAME if is_demo() else CUBE_FILENAME
+    return Path(DATA_DIR) / filename
+
+
+def summary_path() -> Path:
+    filename = DEMO_SUMMARY_FILENAME if is_demo() else SUMMARY_FILENAME
+    return Path(DATA_DIR) / filename
+
+
+def search_index_path() -> Path:
+    filename = DEMO_SEARCH_INDEX_FILENAME if is_demo() else SEARCH_INDEX_FILENAME
+    return Path(DATA_DIR) / filename
+
+
+def query_db_path() -> Path:
+    filename = DEMO_QUERY_DB_FILENAME if is_demo() else QUERY_DB_FILENAME
+    return Path(DATA_DIR) / filename
+
+
+def store_files() -> list[Path]:
+    """files saved at ingest: the ledger, the aggregates cube, the totals summary, the search index and the query db"""
+    return [store_path(), cube_path(), summary_path(), search_index_path(), query_db_path()]
+
+
+def store_lock_path() -> Path:
+    """held while the store files are updated (see atomic.FileLock)"""
+    filename = DEMO_STORE_LOCK_FILENAME if is_demo() else STORE_LOCK_FILENAME
+    return Path(DATA_DIR) / filename
+
+
+def get_manifest() -> Manifest:
+    filename = DEMO_MANIFEST_FILENAME if is_demo() else MANIFEST_FILENAME
+    return Manifest(Path(DATA_DIR) / filename, root=DATA_DIR)
+
+
+def stale_sources(files, manifest: Manifest) -> tuple[list, set]:
+    """(new or changed files, names of removed files) compared to the manifest"""
+    changed = [f for f in files if manifest.is_changed(f)]
+    removed = manifest.names() - {source_name(f) for f in files}
+    return changed, removed
+
+
+def is_up_to_date() -> bool:
+    """the store includes every current statement, and nothing else"""
+    if not all(path.exists() for path in store_files()):
+        return False
+    manifest = get_manifest()
+    changed, removed = stale_sources(get_source_files(), manifest)
+    manifest.save()  # only writes if touched files got new mtimes
+    return not changed and not removed
+
+
+def read_summary() -> dict:
+    """monthly and category totals saved with the store: {'months': {month: {total, count}},
+    'categories': {month: {category: total}}}"""
+    path = summary_path()
+    if not path.exists():
+        return {'months': {}, 'categories': {}}
+    return json.loads(path.read_text(encoding='utf-8'))
+
+
+def month_versions(summary: dict) -> dict:
+    """{month: version}: changes when the month's totals or category totals change"""
+    versions = {}
+    for month, totals in summary['months'].items():
+        month_summary = [totals, summary['categories'].get(month, {})]
+        versions[month] = hashlib.sha256(json.dumps(month_summary, sort_keys=True).encode()).hexdigest()[:16]
+    return versions
+
+
+def refresh_signal_path() -> Path:
+    filename = DEMO_REFRESH_SIGNAL_FILENAME if is_demo() else REFRESH_SIGNAL_FILENAME
+    return Path(DATA_DIR) / filename
+
+
+def write_refresh_signal(months: list):
+    """tell a running dashboard that the store changed (see refresh_daemon.py): {'time', 'months'}"""
+    signal = {'time': datetime.now().isoformat(timespec='seconds'), 'months': months}
+    write_text(refresh_signal_path(), json.dumps(signal))
+
+
+def read_refresh_signal() -> dict | None:
+    try:
+        return json.loads(refresh_signal_path().read_text(encoding='utf-8'))
+    except (OSError, json.JSONDecodeError):
+        return None
@@ -0,0 +1,320 @@
+import json
+import logging
+from contextlib import contextmanager
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from expenses_tracker.data_process import query_db
+from expenses_tracker.data_process.atomic import FileLock, replacing, write_text
+from expenses_tracker.data_process.dedup import duplicate_mask
+from expenses_tracker.data_process.manifest import Manifest
+from expenses_tracker.data_process.search_index import SearchIndex
+from expenses_tracker.data_process.sources import (
+    get_source_files, store_path, cube_path, summary_path, search_index_path, query_db_path, store_files, get_manifest,
+    stale_sources, source_name, account_of, store_lock_path
+)
+from expenses_tracker.data_process.transactions import load_transactions, read_excel_transactions
+from expenses_tracker.diagnostics import span, spanned
+
+logger = logging.getLogger(__name__)
+
+SOURCE_COL = 'קובץ מקור'
+ACCOUNT_COL = 'חשבון'  # MAX login (see Config.max_accounts), by the folder of the source file
+DATE_COLS = ['תאריך עסקה', 'תאריך חיוב']
+AMOUNT_COL = 'סכום חיוב'
+# the store keeps amounts as integer agorot, so totals are exact. load_store gives them in ₪ again
+AGOROT_COL = 'סכום חיוב באגורות'
+MONTH_COL = 'חודש חיוב'
+# columns of the ledger. the other statement columns (original amount and currency, discount club and key,
+# exchange rate, ...) are mostly empty and used by nothing
+LEDGER_COLS = ['תאריך עסקה', 'שם בית העסק', 'קטגוריה', '4 ספרות אחרונות של כרטיס האשראי', 'סוג עסקה', AMOUNT_COL,
+               'תאריך חיוב', MONTH_COL, 'הערות', 'תיוגים', ACCOUNT_COL, SOURCE_COL]
+# few distinct values, repeated every month. notes and tags too (e.g. 'תשלום 2 מתוך 3'), they are matched by the search
+CATEGORICAL_COLS = ['קטגוריה', 'שם בית העסק', '4 ספרות אחרונות של כרטיס האשראי', 'סוג עסקה', 'הערות', 'תיוגים',
+                    ACCOUNT_COL, SOURCE_COL]
+# not in every statement format (captured network responses have no tags), created empty when missing
+OPTIONAL_COLS = ['הערות', 'תיוגים']
+COUNT_COL = 'מספר עסקאות'
+# rows repeating another statement's rows, kept in the store so they come back if that statement is removed
+DUPLICATE_COL = 'כפילות'
+STORE_LOCK_TIMEOUT_SEC = 300
+_store_locks = {}  # lock file path -> FileLock (demo and real store)
+# cube dimensions, coarse to fine
+CUBE_DIMS = [MONTH_COL, 'קטגוריה', '4 ספרות אחרונות של כרטיס האשראי', 'שם בית העסק']
+
+
+def load_statement(file) -> pd.DataFrame:
+    # the capture module is imported on use, it is needed only for json captures
+    suffix = Path(file).suffix
+    if suffix == '.xlsx':
+        return read_excel_transactions(file)
+    if suffix == '.json':
+        from expenses_tracker.credit_cards.max_network_capture import read_captured_transactions
+        return read_captured_transactions(file)
+    return load_transactions(file)
+
+
+def to_agorot(amounts: pd.Series) -> pd.Series:
+    return (amounts.astype('float64') * 100).round().astype('int64')
+
+
+def normalize(df: pd.DataFrame) -> pd.DataFrame:
+    """the ledger columns, typed for the columnar store: categoricals, datetimes and integer agorot"""
+    df = df.filter(items=LEDGER_COLS)
+    for col in OPTIONAL_COLS:
+        if col not in df.columns:
+            df[col] = pd.Series(pd.NA, index=df.index, dtype='string')
+    for col in df.columns[df.dtypes == object]:
+        # markdown statements spell missing values 'NaN'. excel ones mix numbers and text
+        df[col] = df[col].where(df[col] != 'NaN').astype('string')
+    for col in DATE_COLS:
+        df[col] = pd.to_datetime(df[col])
+
+    missing_amount = df[AMOUNT_COL].isna()
+    if missing_amount.any():
+        logger.warning(f"dropping {missing_amount.sum()} transactions without a charge amount")
+        df = df[~missing_amount]
+    df[AGOROT_COL] = to_agorot(df.pop(AMOUNT_COL))
+
+    for col in df.columns.intersection(CATEGORICAL_COLS):
+        df[col] = df[col].astype('category')
+    df[ACCOUNT_COL] = accounts(df[SOURCE_COL])
+    return df
+
+
+def accounts(sources: pd.Series) -> pd.Categorical:
+    """account of each row, from the (categorical) source column: mapped once per source file"""
+    source_accounts = [account_of(name) for name in sources.cat.categories]
+    categories = sorted(set(source_accounts))
+    # code -1 (no source) maps to the last item, -1
+    codes = np.array([categories.index(account) for account in source_accounts] + [-1], dtype='int32')
+    return pd.Categorical.from_codes(codes[sources.cat.codes.to_numpy()], categories=categories)
+
+
+def with_amounts(df: pd.DataFrame) -> pd.DataFrame:
+    """stored ledger rows with the charge amounts in ₪"""
+    if AGOROT_COL in df.columns:
+        df[AMOUNT_COL] = df.pop(AGOROT_COL) / 100
+    return df
+
+
+def parse_files(files, manifest: Manifest, parsed=None) -> list[pd.DataFrame]:
+    """parsed: optional {file: transactions} of files already loaded (e.g. right after download)"""
+    parsed = {str(f): df for f, df in (parsed or {}).items()}
+    frames = []
+    for file in files:
+        try:
+            if str(file) in parsed:
+                transactions = parsed[str(file)]
+            else:
+                with span("parse", file=source_name(file)) as parse_span:
+                    transactions = load_statement(file)
+                    parse_span.rows = len(transactions)
+        except Exception as e:
+            logger.error(f"failed to load {file}: {e!r}")
+            manifest.update(file, rows=0, error=repr(e))  # not retried until the file changes
+            continue
+        logger.info(f"file: {source_name(file)}, transactions: {transactions.shape[0]}")
+        manifest.update(file, rows=len(transactions))
+        if transactions.empty:
+            continue
+        transactions[SOURCE_COL] = source_name(file)
+        frames.append(transactions)
+    return frames
+
+
+def build_cube(df: pd.DataFrame) -> pd.DataFrame:
+    """sum and count of charges by month, category, card and merchant. sums are of agorot, given in ₪.
+    rows missing a dimension (e.g. no card) are kept, so the cube totals are the ledger totals"""
+    cube = (df.groupby(CUBE_DIMS, observed=True, dropna=False)[AGOROT_COL]
+            .agg(**{AMOUNT_COL: 'sum', COUNT_COL: 'count'})
+            .reset_index())
+    cube[AMOUNT_COL] = cube[AMOUNT_COL] / 100
+    return cube
+
+
+def build_summary(cube: pd.DataFrame) -> dict:
+    """monthly totals, and category totals of each month (see sources.read_summary)"""
+    by_month = cube.groupby(MONTH_COL)[[AMOUNT_COL, COUNT_COL]].sum()
+    by_category = cube.groupby([MONTH_COL, 'קטגוריה'], observed=True)[AMOUNT_COL].sum().round(2)
+    summary = {'months': {}, 'categories': {}}
+    for month, row in by_month.iterrows():
+        summary['months'][str(month)] = {'total': round(float(row[AMOUNT_COL]), 2), 'count': int(row[COUNT_COL])}
+    for (month, category), total in by_category.items():
+        summary['categories'].setdefault(str(month), {})[str(category)] = float(total)
+    return summary
+
+
+def save_store(frames) -> pd.DataFrame:
+    """save the ledger, the aggregates cube built from it, and the totals summary.
+    duplicate rows (see dedup.py) are flagged in the ledger, and left out of the cube"""
+    frames = [f for f in frames if not f.empty]
+    if not frames:
+        for path in store_files():
+            if path.exists():
+                path.unlink()
+        return pd.DataFrame()
+
+    with span("store.save") as save_span:
+        df = normalize(pd.concat(frames, ignore_index=True))
+        with span("dedup") as dedup_span:
+            df[DUPLICATE_COL] = duplicate_mask(df)
+            dedup_span.rows = int(df[DUPLICATE_COL].sum())
+        with replacing(store_path()) as tmp:
+            df.to_parquet(tmp, index=False)
+        save_span.rows = len(df)
+    with span("aggregate") as aggregate_span:
+        cube = build_cube(df[~df[DUPLICATE_COL]])
+        with replacing(cube_path()) as tmp:
+            cube.to_parquet(tmp, index=False)
+        summary = build_summary(cube)
+        aggregate_span.rows = len(cube)
+    write_text(summary_path(), json.dumps(summary, ensure_ascii=False, indent=2))
+    logger.info(f"store saved: {store_path()}, rows: {len(df)}, cube rows: {len(cube)}")
+    return df
+
+
+def duplicate_sources(df: pd.DataFrame) -> set:
+    """sources with rows flagged as duplicates"""
+    if df.empty or DUPLICATE_COL not in df.columns:
+        return set()
+    return set(df.loc[df[DUPLICATE_COL], SOURCE_COL].astype(str))
+
+
+def update_search_index(df: pd.DataFrame, added_names, stale_names=(), rebuild=False, previous_duplicates=()):
+    """add the ledger rows of added_names to the search index, dropping the values of stale_names.
+    duplicate rows are not indexed, so a re-downloaded statement does not double the match counts.
+    duplicates depend on all statements: sources with duplicates now or before the update (previous_duplicates)
+    are indexed again"""
+    with span("search_index") as index_span:
+        index = SearchIndex(search_index_path())
+        if rebuild:
+            index.clear()
+        reindexed = duplicate_sources(df) | set(previous_duplicates)
+        index.remove_sources(set(stale_names) | reindexed)
+        if not df.empty:
+            added = df[df[SOURCE_COL].isin(set(added_names) | reindexed) & ~df[DUPLICATE_COL]]
+            index.add(added)
+            index_span.rows = len(added)
+        index.save()
+
+
+def update_query_db(df: pd.DataFrame, added_names, stale_names=(), rebuild=False):
+    """replace the query db rows of stale_names by the ledger rows of added_names (see query_db.py)"""
+    if df.empty:
+        return
+    with span("query_db") as db_span:
+        query_db.update_query_db(query_db_path(), df, added_names, stale_names, DUPLICATE_COL, rebuild)
+        db_span.rows = len(df)
+
+
+def store_lock() -> FileLock:
+    """the store files are updated by one process at a time: the dashboard or the refresh daemon.
+    each file is replaced whole (see atomic.py) and the query db is updated in one transaction, so no reader sees a
+    partial file. load_store and load_cube read while holding the lock, so the files they read are of one update"""
+    path = store_lock_path()
+    return _store_locks.setdefault(path, FileLock(path))
+
+
+def build_store(files=None, parsed=None) -> pd.DataFrame:
+    """parse all statement files and save them as a typed parquet store"""
+    with store_lock():
+        return _build_store(files, parsed)
+
+
+def _build_store(files, parsed) -> pd.DataFrame:
+    if files is None:
+        files = get_source_files()
+    logger.info(f"building store from {len(files)} files")
+
+    manifest = get_manifest()
+    for name in manifest.names():
+        manifest.remove(name)
+    df = save_store(parse_files(files, manifest, parsed))
+    update_search_index(df, manifest.names(), rebuild=True)
+    update_query_db(df, manifest.names(), rebuild=True)
+    manifest.save()
+    return df
+
+
+@spanned("store.update")
+def update_store(parsed=None) -> bool:
+    """merge new or changed statement files into the store. returns whether the store changed.
+    only the delta is parsed; rows of changed or deleted files are replaced.
+    parsed: optional {file: transactions} of files already loaded"""
+    with updated_store(parsed) as changed:
+        return changed
+
+
+@contextmanager
+def updated_store(parsed=None):
+    """update_store, holding the store lock until the block has read the store files, so they are of the same
+    update. yields whether the store changed"""
+    lock = store_lock()
+    locked = lock.acquire(STORE_LOCK_TIMEOUT_SEC)
+    if not locked:
+        logger.warning(f"store is being updated by another process for over {STORE_LOCK_TIMEOUT_SEC} sec, "
+                       f"reading the current store")
+    try:
+        yield locked and _update_store(parsed)
+    finally:
+        if locked:
+            lock.release()
+
+
+def _update_store(parsed) -> bool:
+    files = get_source_files()
+    manifest = get_manifest()
+
+    if not all(path.exists() for path in store_files()):
+        if not files:
+            return False
+        _build_store(files, parsed)
+        return True
+
+    changed, removed = stale_sources(files, manifest)
+
+    if not changed and not removed:
+        manifest.save()  # only writes if touched files got new mtimes
+        return False
+
+    logger.info(f"updating store: {len(changed)} new or changed files, {len(removed)} removed")
+    for name in removed:
+        manifest.remove(name)
+
+    stale_names = removed | {source_name(f) for f in changed}
+    df = pd.read_parquet(store_path())
+    previous_duplicates = duplicate_sources(df)
+    df = df[~df[SOURCE_COL].isin(stale_names)].drop(columns=DUPLICATE_COL, errors='ignore')
+    df = with_amounts(df)
+
+    df = save_store([df] + parse_files(changed, manifest, parsed))
+    update_search_index(df, {source_name(f) for f in changed}, stale_names, previous_duplicates=previous_duplicates)
+    update_query_db(df, {source_name(f) for f in changed}, stale_names)
+    manifest.save()
+    return True
+
+
+def read_parquet(path: Path) -> pd.DataFrame:
+    if not path.exists():
+        return pd.DataFrame()
+    return pd.read_parquet(path)
+
+
+def load_store() -> pd.DataFrame:
+    """read the transactions store (without duplicates), merging in any new or changed statements first"""
+    with updated_store():
+        df = read_parquet(store_path())
+    if DUPLICATE_COL in df.columns:
+        df = df[~df[DUPLICATE_COL]].drop(columns=DUPLICATE_COL)
+    if not df.empty and ACCOUNT_COL not in df.columns:  # store saved before accounts
+        df[ACCOUNT_COL] = accounts(df[SOURCE_COL].astype('category'))
+    return with_amounts(df)
+
+
+def load_cube() -> pd.DataFrame:
+    """read the aggregates cube, merging in any new or changed statements first"""
+    with updated_store():
+        return read_parquet(cube_path())
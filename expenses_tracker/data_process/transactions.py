@@ -0,0 +1,116 @@
+import pandas as pd
+
+# formats found in statements, tried in order. rows none of them match go to the generic parser
+DATE_FORMATS = ['%Y-%m-%d %H:%M:%S', '%d-%m-%Y', '%Y-%m-%dT%H:%M:%S']
+
+
+def clean_amounts(amounts: pd.Series) -> pd.Series:
+    """remove currency symbols and convert the column to float. unparsable values become NaN"""
+    if pd.api.types.is_numeric_dtype(amounts):
+        return amounts.astype('float64')
+    cleaned = (amounts.astype('string')
+               .str.replace('₪', '', regex=False)
+               .str.replace(',', '', regex=False)
+               .str.strip())
+    return pd.to_numeric(cleaned, errors='coerce').astype('float64')
+
+
+def parse_dates(dates: pd.Series) -> pd.Series:
+    """parse the column with one to_datetime call per format, each only on the rows still unparsed"""
+    if pd.api.types.is_datetime64_any_dtype(dates):
+        return dates
+    dates = dates.astype('string').where(lambda s: s != 'NaN')
+    result = pd.Series(pd.NaT, index=dates.index, dtype='datetime64[ns]')
+
+    remaining = dates.notna()
+    for fmt in DATE_FORMATS:
+        if not remaining.any():
+            break
+        result[remaining] = pd.to_datetime(dates[remaining], format=fmt, errors='coerce')
+        remaining &= result.isna()
+
+    if remaining.any():
+        result[remaining] = pd.to_datetime(dates[remaining], format='mixed', dayfirst=True, errors='coerce')
+    return result
+
+
+def clean_transactions(df: pd.DataFrame) -> pd.DataFrame:
+    """typed amount and date columns, and the charge month period"""
+    df['סכום חיוב'] = clean_amounts(df['סכום חיוב'])
+    df['תאריך עסקה'] = parse_dates(df['תאריך עסקה'])
+    df['תאריך חיוב'] = parse_dates(df['תאריך חיוב'])
+    df['חודש חיוב'] = df['תאריך חיוב'].dt.to_period('M')
+    return df
+
+
+def load_transactions(file_path):
+    """load and process transactions from markdown file."""
+    with open(file_path, 'r', encoding='utf-8') as file:
+        content = file.read()
+
+    # split to regular and foreign transactions
+    sections = content.split('## עסקאות חו"ל ומט"ח')
+
+    def parse_markdown_table(section):
+        lines = [line.strip() for line in section.split('\n') if line.strip()]
+        header_idx = next((i for i, line in enumerate(lines) if 'תאריך עסקה' in line), None)
+        if header_idx is None:
+            raise ValueError("no transactions table found")
+        headers = [col.strip() for col in lines[header_idx].split('|') if col.strip()]
+        # print(f"headers: {headers}")
+
+        data = []
+        for line in lines[header_idx + 1:]:  # skip header
+            if '|' not in line or 'סך הכל' in line:
+                continue
+            values = [val.strip() for val in line.split('|') if val.strip()]
+            if len(values) == len(headers):
+                data.append(dict(zip(headers, values)))
+
+        return pd.DataFrame(data)
+
+    # parse
+    regular_df = parse_markdown_table(sections[0])
+    foreign_df = parse_markdown_table(sections[1]) if len(sections) > 1 else pd.DataFrame()
+
+    # combine and clean data
+    df = pd.concat([regular_df, foreign_df], ignore_index=True)
+    df = df[df['תאריך עסקה'] != 'NaN']
+    df = df[df['סכום חיוב'] != 'NaN'].copy()
+
+    if not df.empty:
+        df = clean_transactions(df)
+
+    return df
+
+
+def read_excel_transactions(f) -> pd.DataFrame:
+    """read the transactions of both sheets (regular, and foreign 'עסקאות חו"ל ומט"ח') into one typed df"""
+    sheets = pd.read_excel(f, sheet_name=[0, 1], header=None)
+
+    frames = []
+    for sheet in sheets.values():
+        # header row is the one starting with 'תאריך עסקה', above it are user/card/month rows
+        header_rows = sheet.index[sheet.iloc[:, 0] == 'תאריך עסקה']
+        if header_rows.empty:
+            continue
+        header_idx = header_rows[0]
+        body = sheet.loc[header_idx + 1:]
+        body.columns = sheet.loc[header_idx].tolist()
+        frames.append(body)
+
+    if not frames:
+        return pd.DataFrame()
+
+    df = pd.concat(frames, ignore_index=True)
+
+    # keep transaction rows: drops empty rows and the 'סך הכל' rows at the bottom of each sheet
+    df = clean_transactions(df)
+    df = df[df['תאריך עסקה'].notna() & df['סכום חיוב'].notna()].reset_index(drop=True)
+
+    card_col = '4 ספרות אחרונות של כרטיס האשראי'
+    cards = df[card_col]
+    # excel reads the digits as numbers ('0123' as 123.0). a missing card stays missing
+    df[card_col] = cards.astype(str).str.removesuffix('.0').str.zfill(4).where(cards.notna())
+
+    return df
@@ -0,0 +1,147 @@
+"""
+lightweight spans around the pipeline stages (download, convert, parse, aggregate, llm, render).
+each span records wall time, peak RSS of the process, and rows, as a json line in data/spans.jsonl.
+
+    with span("parse", file=name) as s:
+        df = load(...)
+        s.rows = len(df)
+
+    @spanned("llm.generate")
+    def generate(...): ...
+
+spans cost a few microseconds (getrusage, and one appended line), so they stay on.
+the dashboard shows them in the Diagnostics panel: open it with ?diagnostics=1
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+from expenses_tracker.config import Config
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+config = Config()
+DATA_DIR = config.data_folder
+
+SPANS_FILENAME = "spans.jsonl"
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_write_lock = threading.Lock()
+
+
+def spans_path() -> Path:
+    return Path(DATA_DIR) / SPANS_FILENAME
+
+
+def peak_rss_mb() -> float | None:
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on macos
+    return round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+
+
+class Span:
+
+    def __init__(self, name: str, rows=None, **attrs):
+        self.name = name
+        self.rows = rows
+        self.attrs = attrs
+        self.parent = None
+        self.error = None
+
+    def record(self, duration_sec: float, rss_start: float | None) -> dict:
+        rss_end = peak_rss_mb()
+        record = {
+            'name': self.name,
+            'start': round(self.started_at, 3),
+            'duration_sec': round(duration_sec, 4),
+            'peak_rss_mb': rss_end,
+            'peak_rss_growth_mb': round(rss_end - rss_start, 1) if rss_end is not None else None,
+            'rows': self.rows,
+            'parent': self.parent,
+            'pid': os.getpid(),
+        }
+        if self.error:
+            record['error'] = self.error
+        if self.attrs:
+            record['attrs'] = {k: str(v) for k, v in self.attrs.items()}
+        return record
+
+    def __enter__(self):
+        parent = _current_span.get()
+        self.parent = parent.name if parent else None
+        self._token = _current_span.set(self)
+        self.started_at = time.time()
+        self._start = time.perf_counter()
+        self._rss_start = peak_rss_mb()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration_sec = time.perf_counter() - self._start
+        _current_span.reset(self._token)
+        if exc_type:
+            self.error = exc_type.__name__
+        write_span(self.record(duration_sec, self._rss_start))
+        return False
+
+
+def span(name: str, rows=None, **attrs) -> Span:
+    return Span(name, rows, **attrs)
+
+
+def spanned(name: str):
+    """decorator: the function call as a span. a returned DataFrame (or list) sets the span rows"""
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name) as s:
+                result = fn(*args, **kwargs)
+                if hasattr(result, '__len__') and not isinstance(result, (str, bytes, dict)):
+                    s.rows = len(result)
+                return result
+        return wrapper
+    return decorator
+
+
+def write_span(record: dict):
+    if not config.diagnostics['enabled']:
+        return
+    path = spans_path()
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    try:
+        with _write_lock:
+            if path.exists() and path.stat().st_size > config.diagnostics['max_file_mb'] * 1024 * 1024:
+                os.replace(path, path.with_suffix(".jsonl.1"))  # keep one previous file
+            with open(path, 'a', encoding='utf-8') as f:
+                f.write(line)
+    except OSError as e:
+        logger.debug(f"span not written: {e}")
+
+
+def read_spans(limit=2_000) -> list[dict]:
+    """latest spans, oldest first"""
+    path = spans_path()
+    if not path.exists():
+        return []
+    with open(path, 'r', encoding='utf-8') as f:
+        lines = deque(f, maxlen=limit)
+    spans = []
+    for line in lines:
+        try:
+            spans.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue  # a line cut by a concurrent write
+    return spans
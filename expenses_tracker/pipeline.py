@@ -0,0 +1,107 @@
+"""
+small stage graph runner: each stage starts as soon as the stages it depends on are done,
+independent stages run at the same time (threads). stage timings are reported at the end.
+
+a stage function gets the results of its dependencies as keyword arguments (by stage name).
+if a stage fails, the stages depending on it are skipped.
+"""
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from dataclasses import dataclass, field
+from typing import Callable
+
+from expenses_tracker.diagnostics import span
+
+logger = logging.getLogger(__name__)
+
+PIPELINE_WORKERS = 4
+
+
+@dataclass
+class Stage:
+    name: str
+    fn: Callable
+    deps: list = field(default_factory=list)
+    start: float = None  # sec since the pipeline started
+    end: float = None
+    status: str = "pending"  # pending, running, done, failed, skipped
+
+    @property
+    def duration(self) -> float | None:
+        if self.start is None or self.end is None:
+            return None
+        return self.end - self.start
+
+
+class Pipeline:
+
+    def __init__(self, workers=PIPELINE_WORKERS):
+        self.workers = workers
+        self.stages = {}
+        self.results = {}
+        self.started_at = None
+
+    def add(self, name: str, fn: Callable, deps=()):
+        for dep in deps:
+            if dep not in self.stages:
+                raise ValueError(f"stage '{name}' depends on unknown stage '{dep}'")
+        self.stages[name] = Stage(name, fn, list(deps))
+        return self
+
+    def run(self) -> dict:
+        """run all stages. returns results by stage name (of stages that completed)"""
+        self.started_at = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            running = {}
+            while True:
+                self._skip_blocked()
+                for stage in self._ready():
+                    stage.status = "running"
+                    stage.start = self._elapsed()
+                    kwargs = {dep: self.results[dep] for dep in stage.deps}
+                    running[pool.submit(self._run_stage, stage, kwargs)] = stage
+                    logger.info(f"stage '{stage.name}' started at {stage.start:.1f} sec")
+
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    stage = running.pop(future)
+                    stage.end = self._elapsed()
+                    try:
+                        self.results[stage.name] = future.result()
+                        stage.status = "done"
+                        logger.info(f"stage '{stage.name}' done in {stage.duration:.1f} sec")
+                    except Exception as e:
+                        stage.status = "failed"
+                        logger.exception(f"stage '{stage.name}' failed: {e}")
+
+        return self.results
+
+    @staticmethod
+    def _run_stage(stage: Stage, kwargs: dict):
+        with span(f"pipeline.{stage.name}"):
+            return stage.fn(**kwargs)
+
+    def _elapsed(self) -> float:
+        return time.perf_counter() - self.started_at
+
+    def _ready(self) -> list[Stage]:
+        return [s for s in self.stages.values()
+                if s.status == "pending" and all(self.stages[d].status == "done" for d in s.deps)]
+
+    def _skip_blocked(self):
+        for stage in self.stages.values():
+            if stage.status == "pending" and any(self.stages[d].status in ["failed", "skipped"] for d in stage.deps):
+                stage.status = "skipped"
+                logger.warning(f"stage '{stage.name}' skipped, a dependency did not complete")
+
+    def report(self) -> str:
+        lines = [f"{'stage':<12} {'status':<8} {'start':>8} {'end':>8} {'duration':>9}"]
+        for s in self.stages.values():
+            if s.duration is None:
+                lines.append(f"{s.name:<12} {s.status:<8}")
+                continue
+            lines.append(f"{s.name:<12} {s.status:<8} {s.start:>7.1f}s {s.end:>7.1f}s {s.duration:>8.1f}s")
+        return "\n".join(lines)
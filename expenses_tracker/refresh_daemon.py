@@ -0,0 +1,111 @@
+"""
+long-running refresh: downloads the statements on a schedule, and watches the data folder, ingesting new or changed
+statements as they appear (downloaded, or copied in). the dashboard started with it stays up: after each ingest,
+the months that changed are written to data/refresh.json, which the dashboard polls; it reruns with the new data,
+recomputing only those months.
+
+    python main.py refresh [--no-download] [--no-ui]
+
+the watcher polls the statements fingerprint (names, mtimes and sizes, see sources.source_fingerprint), so it needs
+no file events library. a change is ingested once the files are unchanged for another poll, so a file still being
+written is not read. settings: [refresh] in config.toml.
+"""
+import logging
+import threading
+import time
+
+from expenses_tracker.config import Config
+from expenses_tracker.data_process import ingest, sources
+from expenses_tracker.diagnostics import span
+
+logger = logging.getLogger(__name__)
+
+config = Config()
+
+
+def changed_months(before: dict, after: dict) -> list[str]:
+    """months whose totals changed between two summaries (see sources.read_summary), added and removed ones too"""
+    before_versions, after_versions = sources.month_versions(before), sources.month_versions(after)
+    months = before_versions.keys() | after_versions.keys()
+    return sorted(m for m in months if before_versions.get(m) != after_versions.get(m))
+
+
+class RefreshDaemon:
+
+    def __init__(self, download=True, download_every_hours=None, watch_interval_sec=None, insights=None):
+        options = config.refresh
+        self.download = download
+        self.download_every_sec = 3600 * (download_every_hours or options['download_every_hours'])
+        self.watch_interval_sec = watch_interval_sec or options['watch_interval_sec']
+        self.insights = options['insights'] if insights is None else insights
+        self.next_download = time.monotonic()
+        self.ingested = None  # fingerprint of the statements in the store
+        self.pending = None  # changed fingerprint, waiting to be unchanged for one more poll
+        self._stop = threading.Event()
+
+    def run(self):
+        """until stop() (or KeyboardInterrupt)"""
+        logger.info(f"refresh: watching {sources.DATA_DIR} every {self.watch_interval_sec} sec"
+                    + (f", downloading every {self.download_every_sec / 3600:g} hours" if self.download else ""))
+        while not self._stop.is_set():
+            if self.download and time.monotonic() >= self.next_download:
+                self.next_download = time.monotonic() + self.download_every_sec
+                self.download_statements()
+            self.check_sources()
+            self._stop.wait(self.watch_interval_sec)
+
+    def stop(self):
+        self._stop.set()
+
+    def check_sources(self):
+        fingerprint = sources.source_fingerprint()
+        if fingerprint == self.ingested:
+            self.pending = None
+            return
+        if fingerprint != self.pending:
+            self.pending = fingerprint
+            return
+        self.ingest()
+
+    def ingest(self) -> list[str]:
+        """merge new or changed statements into the store, and signal the dashboard. returns the changed months"""
+        before = sources.read_summary()
+        fingerprint = sources.source_fingerprint()
+        try:
+            with span("refresh.ingest"):
+                changed = ingest.refresh()
+        except Exception as e:
+            logger.exception(f"refresh: ingest failed: {e}")
+            return []
+        self.ingested, self.pending = fingerprint, None
+        if not changed:
+            return []
+
+        months = changed_months(before, sources.read_summary())
+        sources.write_refresh_signal(months)
+        logger.info(f"refresh: store updated, months: {', '.join(months) or 'none'}")
+        if months and self.insights:
+            self.generate_insights()
+        return months
+
+    def download_statements(self):
+        from expenses_tracker.credit_cards.get_max_visa_files_async import download_accounts_concurrently
+
+        accounts = config.max_accounts
+        if not accounts:
+            logger.warning("refresh: no MAX account in config.toml, not downloading")
+            return
+        try:
+            files = download_accounts_concurrently(accounts)
+        except Exception as e:
+            logger.exception(f"refresh: download failed: {e}")
+            return
+        if files:
+            self.ingest()  # the files are complete, no need to wait for the watcher
+
+    def generate_insights(self):
+        from expenses_tracker.ai.gemini import get_user_insights
+        try:
+            get_user_insights()
+        except Exception as e:
+            logger.exception(f"refresh: insights failed: {e}")
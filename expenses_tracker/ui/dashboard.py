@@ -1,5 +1,6 @@
 import logging
 import os
+import sqlite3
 from datetime import datetime
 from pathlib import Path
 
@@ -7,82 +8,190 @@ import pandas as pd
 import plotly.graph_objects as go
 import streamlit as st
 
-from expenses_tracker.config import Config
+from expenses_tracker.ai.insights_cache import latest_insights, streaming_insights
+from expenses_tracker.config import Config, setup_logging
+from expenses_tracker.data_process import query_db, recurring, sources, store
+from expenses_tracker.data_process.search_index import SearchIndex, SEARCH_COLS
+from expenses_tracker.diagnostics import read_spans, span
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
+setup_logging()  # streamlit runs this file as the entry point
 
 st.set_page_config(page_title="Expenses Dashboard", layout="wide")
 
 config = Config()
 INPUT_FILES_DIR = config.data_folder
 
+# cached ledgers (one per source files fingerprint), the old one is evicted when files change
+LEDGER_CACHE_ENTRIES = 2
+AGGREGATES_CACHE_ENTRIES = 64
+STREAMING_REFRESH_SEC = 2
+DIAGNOSTICS_SPANS = 2_000
+REFRESH_CHECK_SEC = 5  # polling of the refresh signal (see refresh_daemon.py)
+
+TABLE_COLS = ['תאריך עסקה', 'שם בית העסק', 'קטגוריה', 'סוג עסקה', 'סכום חיוב', 'תאריך חיוב',
+              '4 ספרות אחרונות של כרטיס האשראי', store.ACCOUNT_COL]
+# label -> (column, ascending)
+TABLE_SORT_OPTIONS = {
+    'Date ↓': ('תאריך עסקה', False),
+    'Date ↑': ('תאריך עסקה', True),
+    'Amount ↓': ('סכום חיוב', False),
+    'Amount ↑': ('סכום חיוב', True),
+    'Business': ('שם בית העסק', True),
+    'Category': ('קטגוריה', True),
+}
+PAGE_SIZES = [100, 250, 500]
+TABLE_ORDER_CACHE_ENTRIES = 8
+SEARCH_RESULT_ROWS = 500
+SEARCH_COL_LABELS = {'שם בית העסק': 'Business', 'הערות': 'Notes', 'תיוגים': 'Tags'}
+# reindexed: stores saved before store.OPTIONAL_COLS may lack notes or tags
+SEARCH_TABLE_COLS = TABLE_COLS + [c for c in SEARCH_COLS if c not in TABLE_COLS]
+SQL_EXAMPLE = """-- average monthly spend by category, year over year
+SELECT category, substr(month, 1, 4) AS year, ROUND(SUM(amount) / COUNT(DISTINCT month), 2) AS monthly
+FROM expenses
+GROUP BY category, year
+ORDER BY category, year"""
+# one view is rendered per run (not tabs, which all run): the ledger is loaded only by the views that need it
+VIEWS = ["Categories", "Monthly Trends", "Transactions", "Recurring", "AI Insights", "SQL"]
+
+
+@st.cache_resource(max_entries=LEDGER_CACHE_ENTRIES, show_spinner="Loading transactions...")
+def load_data(fingerprint: tuple) -> pd.DataFrame:
+    """transactions of the store. fingerprint is the cache key (see sources.source_fingerprint).
+    the frame is shared between reruns and sessions - do not modify it in place"""
+    logger.info(f"loading store, {len(fingerprint)} source files")
+    with span("render.load_ledger") as load_span:
+        df = store.load_store()
+        load_span.rows = len(df)
+    return df
 
-def clean_amount(amount):
-    """remove currency symbols and converting to float."""
-    if isinstance(amount, str):
-        return float(amount.replace('₪', '').replace(',', '').strip())
-    return amount
 
+@st.cache_resource(max_entries=LEDGER_CACHE_ENTRIES, show_spinner=False)
+def load_cube(fingerprint: tuple) -> pd.DataFrame:
+    """month x category x card x merchant sums and counts. all charts and metrics are served from it"""
+    return store.load_cube()
 
-def parse_date(date_str):
-    if pd.isna(date_str):
-        return None
 
-    try:
-        for fmt in ['%d-%m-%Y', '%Y-%m-%d %H:%M:%S']:
-            try:
-                return pd.to_datetime(date_str, format=fmt)
-            except:
-                continue
-        return pd.to_datetime(date_str)
-    except:
-        return None
-
-
-def load_transactions(file_path):
-    """load and process transactions from markdown file."""
-    with open(file_path, 'r', encoding='utf-8') as file:
-        content = file.read()
-
-    # split to regular and foreign transactions
-    sections = content.split('## עסקאות חו"ל ומט"ח')
-
-    def parse_markdown_table(section):
-        lines = [line.strip() for line in section.split('\n') if line.strip()]
-        header_idx = next(i for i, line in enumerate(lines) if 'תאריך עסקה' in line)
-        headers = [col.strip() for col in lines[header_idx].split('|') if col.strip()]
-        # print(f"headers: {headers}")
-
-        data = []
-        for line in lines[header_idx + 1:]:  # skip header
-            if '|' not in line or 'סך הכל' in line:
-                continue
-            values = [val.strip() for val in line.split('|') if val.strip()]
-            if len(values) == len(headers):
-                data.append(dict(zip(headers, values)))
-
-        return pd.DataFrame(data)
-
-    # parse
-    regular_df = parse_markdown_table(sections[0])
-    foreign_df = parse_markdown_table(sections[1]) if len(sections) > 1 else pd.DataFrame()
-
-    # combine and clean data
-    df = pd.concat([regular_df, foreign_df], ignore_index=True)
-    df = df[df['תאריך עסקה'] != 'NaN']
-    df = df[df['סכום חיוב'] != 'NaN']
-
-    if not df.empty:
-        df['סכום חיוב'] = df['סכום חיוב'].apply(clean_amount)
-        df['תאריך עסקה'] = df['תאריך עסקה'].apply(parse_date)
-        df['תאריך חיוב'] = df['תאריך חיוב'].apply(parse_date)
-        df['חודש חיוב'] = df['תאריך חיוב'].apply(lambda x: f"{x.month}/{x.year}" if isinstance(x, datetime) else None)
+def filter_month(df: pd.DataFrame, month: str) -> pd.DataFrame:
+    if month == 'All':
+        return df
+    return df[df['חודש חיוב'] == pd.Period(month, freq='M')]
 
-    return df
+
+@st.cache_data(max_entries=AGGREGATES_CACHE_ENTRIES, show_spinner=False)
+def get_months(fingerprint: tuple) -> list:
+    return sorted(load_cube(fingerprint)['חודש חיוב'].unique().tolist())
+
+
+@st.cache_data(max_entries=AGGREGATES_CACHE_ENTRIES, show_spinner=False)
+def get_month_version(fingerprint: tuple, month: str) -> str:
+    """cache key of a month's aggregates: unchanged while the month's totals are (see sources.month_versions),
+    so a refresh recomputes only the months it changed. 'All' changes with any statement"""
+    if month == 'All':
+        return str(hash(fingerprint))
+    load_cube(fingerprint)  # brings the summary up to date
+    return sources.month_versions(sources.read_summary()).get(month, '')
+
+
+# _fingerprint is not part of the cache key (leading underscore), month_version is
+@st.cache_data(max_entries=AGGREGATES_CACHE_ENTRIES, show_spinner=False)
+def get_summary(month: str, month_version: str, _fingerprint: tuple) -> tuple[float, int]:
+    """total expenses and number of transactions"""
+    cube = filter_month(load_cube(_fingerprint), month)
+    return float(cube['סכום חיוב'].sum()), int(cube[store.COUNT_COL].sum())
+
+
+@st.cache_data(max_entries=AGGREGATES_CACHE_ENTRIES, show_spinner=False)
+def get_category_totals(month: str, month_version: str, _fingerprint: tuple) -> pd.DataFrame:
+    cube = filter_month(load_cube(_fingerprint), month)
+    return (cube.groupby('קטגוריה', observed=True)['סכום חיוב']
+            .sum()
+            .reset_index()
+            .sort_values('סכום חיוב', ascending=True))
+
+
+@st.cache_data(max_entries=AGGREGATES_CACHE_ENTRIES, show_spinner=False)
+def get_monthly_totals(fingerprint: tuple) -> pd.DataFrame:
+    cube = load_cube(fingerprint)
+    monthly_data = cube.groupby('חודש חיוב')['סכום חיוב'].sum().reset_index()
+    return monthly_data.sort_values('חודש חיוב')
+
+
+def filter_transactions(df: pd.DataFrame, month: str, search: str, categories: tuple) -> pd.DataFrame:
+    df = filter_month(df, month)
+    mask = pd.Series(True, index=df.index)
+    if search:
+        # match the (few) distinct names, not every row
+        merchants = df['שם בית העסק'].cat.categories
+        mask &= df['שם בית העסק'].isin(merchants[merchants.str.contains(search, case=False, regex=False)])
+    if categories:
+        mask &= df['קטגוריה'].isin(categories)
+    return df[mask]
+
+
+@st.cache_resource(max_entries=TABLE_ORDER_CACHE_ENTRIES, show_spinner=False)
+def get_table_order(fingerprint: tuple, month: str, search: str, categories: tuple, sort_col: str,
+                    ascending: bool) -> pd.Index:
+    """row labels of the filtered transactions, sorted. kept for paging, so a page is just a slice"""
+    df = filter_transactions(load_data(fingerprint), month, search, categories)
+    return df[sort_col].sort_values(ascending=ascending, kind='stable', na_position='last').index
+
+
+def get_transactions_page(fingerprint: tuple, order: pd.Index, page: int, page_size: int) -> pd.DataFrame:
+    """page (1-based) of the sorted transactions. only the page rows are copied and sent to the browser"""
+    start = (page - 1) * page_size
+    return load_data(fingerprint).loc[order[start:start + page_size], TABLE_COLS]
+
+
+@st.cache_resource(max_entries=LEDGER_CACHE_ENTRIES, show_spinner=False)
+def load_search_index(fingerprint: tuple) -> SearchIndex:
+    """the index saved at ingest (see search_index.py). loading the cube first brings it up to date"""
+    load_cube(fingerprint)
+    return SearchIndex(sources.search_index_path())
+
+
+@st.cache_data(max_entries=AGGREGATES_CACHE_ENTRIES, show_spinner=False)
+def search_matches(fingerprint: tuple, query: str) -> pd.DataFrame:
+    """merchant names, notes and tags matching the query, best first"""
+    with span("search", query_chars=len(query)) as search_span:
+        matches = pd.DataFrame(load_search_index(fingerprint).search(query),
+                               columns=['column', 'value', 'score', 'rows'])
+        search_span.rows = len(matches)
+    return matches
+
+
+@st.cache_resource(max_entries=TABLE_ORDER_CACHE_ENTRIES, show_spinner=False)
+def get_search_rows(fingerprint: tuple, query: str) -> pd.Index:
+    """row labels of transactions with a matching value, latest first"""
+    df = load_data(fingerprint)
+    matches = search_matches(fingerprint, query)
+    mask = pd.Series(False, index=df.index)
+    for col, values in matches.groupby('column')['value']:
+        mask |= df[col].isin(values)
+    return df.loc[mask, 'תאריך עסקה'].sort_values(ascending=False, kind='stable').index
+
+
+@st.cache_data(max_entries=AGGREGATES_CACHE_ENTRIES, show_spinner="Finding recurring charges...")
+def get_recurring(fingerprint: tuple) -> tuple[pd.DataFrame, pd.DataFrame]:
+    """(subscriptions, installment plans) of the whole history"""
+    df = load_data(fingerprint)
+    with span("recurring", rows=len(df)):
+        return recurring.subscriptions(df), recurring.installment_plans(df)
+
+
+@st.cache_data(max_entries=AGGREGATES_CACHE_ENTRIES, show_spinner=False)
+def run_sql(fingerprint: tuple, sql: str) -> tuple[pd.DataFrame, float]:
+    columns, rows, sec = query_db.query(sources.query_db_path(), sql)
+    return pd.DataFrame(rows, columns=columns), sec
+
+
+@st.cache_data(max_entries=AGGREGATES_CACHE_ENTRIES, show_spinner=False)
+def read_insights(insights_file_path, mtime) -> str:
+    with open(insights_file_path, 'r', encoding='utf-8') as file:
+        return file.read()
 
 
-def categories_tab(filtered_df, tab1):
+def categories_tab(category_data, tab1):
     with tab1:
         # Add description
         # st.markdown("""
@@ -90,11 +199,6 @@ def categories_tab(filtered_df, tab1):
         #     Toggle between charts.
         # """)
 
-        category_data = (filtered_df.groupby('קטגוריה')['סכום חיוב']
-                         .sum()
-                         .reset_index()
-                         .sort_values('סכום חיוב', ascending=True))
-
         # 2 columns for controls
         col1, col2 = st.columns([2, 3])
         with col1:
@@ -192,41 +296,87 @@ def categories_tab(filtered_df, tab1):
             st.metric("Number of Categories", num_categories)
 
 
-def transactions_table_tab(filtered_df, tab3):
+def transactions_table_tab(fingerprint: tuple, month: str, categories: list, tab3):
     with tab3:
         st.subheader("Transactions")
-
-        # Display transactions table with formatting
-        display_cols = ['תאריך עסקה', 'שם בית העסק', 'קטגוריה', 'סוג עסקה', 'סכום חיוב', 'תאריך חיוב',
-                        '4 ספרות אחרונות של כרטיס האשראי']
-        formatted_df = filtered_df[display_cols].copy()
-        formatted_df['סכום חיוב'] = formatted_df['סכום חיוב'].apply(lambda x: f'₪{x:,.2f}')
-
+        transactions_table(fingerprint, month, categories)
+
+
+@st.fragment
+def transactions_table(fingerprint: tuple, month: str, categories: list):
+    """one page of transactions. paging, sorting and filters rerun only this table"""
+    col1, col2, col3, col4 = st.columns([3, 3, 2, 1])
+    search = col1.text_input("Search business", key="table_search")
+    selected_categories = col2.multiselect("Categories", categories, key="table_categories")
+    sort_label = col3.selectbox("Sort by", list(TABLE_SORT_OPTIONS), key="table_sort")
+    page_size = col4.selectbox("Rows", PAGE_SIZES, key="table_page_size")
+
+    sort_col, ascending = TABLE_SORT_OPTIONS[sort_label]
+    order = get_table_order(fingerprint, month, search, tuple(selected_categories), sort_col, ascending)
+    n_pages = max(1, -(-len(order) // page_size))
+    page = st.number_input(f"Page (of {n_pages:,}, {len(order):,} transactions)", min_value=1, max_value=n_pages,
+                           value=1, key="table_page")
+
+    page_df = get_transactions_page(fingerprint, order, min(page, n_pages), page_size)
+    st.dataframe(
+        page_df,
+        column_config={
+            'תאריך עסקה': st.column_config.DateColumn('Date', format="DD-MM-YYYY"),
+            'שם בית העסק': st.column_config.TextColumn('Business'),
+            'קטגוריה': st.column_config.TextColumn('Category'),
+            'סוג עסקה': st.column_config.TextColumn('Type'),
+            'סכום חיוב': st.column_config.NumberColumn('Amount', format="₪%.2f"),
+            'תאריך חיוב': st.column_config.DateColumn('Charge Date', format="DD-MM-YYYY"),
+            '4 ספרות אחרונות של כרטיס האשראי': st.column_config.TextColumn('Credit Card'),
+            store.ACCOUNT_COL: st.column_config.TextColumn('Account'),
+        },
+        hide_index=True,
+        use_container_width=True,
+        height=700 if len(page_df) > 10 else None
+    )
+
+
+def search_results(fingerprint: tuple, query: str):
+    """transactions of all months matching the sidebar search"""
+    matches = search_matches(fingerprint, query)
+    with st.expander(f"🔍 Search results for '{query}'", expanded=True):
+        if matches.empty:
+            st.info("No matching businesses, notes or tags.")
+            return
+        rows = get_search_rows(fingerprint, query)
+        df = load_data(fingerprint)
+        col1, col2 = st.columns(2)
+        col1.metric("Matching Transactions", f"{len(rows):,}")
+        col2.metric("Total", f"₪{df.loc[rows, 'סכום חיוב'].sum():,.2f}")
+        st.caption("Matched: " + ", ".join(
+            f"{m.value} ({SEARCH_COL_LABELS[m.column]})" for m in matches.head(10).itertuples()))
+        if len(rows) > SEARCH_RESULT_ROWS:
+            st.caption(f"Showing the latest {SEARCH_RESULT_ROWS:,} transactions")
         st.dataframe(
-            formatted_df,
+            df.loc[rows[:SEARCH_RESULT_ROWS]].reindex(columns=SEARCH_TABLE_COLS),
             column_config={
                 'תאריך עסקה': st.column_config.DateColumn('Date', format="DD-MM-YYYY"),
                 'שם בית העסק': st.column_config.TextColumn('Business'),
                 'קטגוריה': st.column_config.TextColumn('Category'),
                 'סוג עסקה': st.column_config.TextColumn('Type'),
-                'סכום חיוב': st.column_config.TextColumn('Amount'),
+                'סכום חיוב': st.column_config.NumberColumn('Amount', format="₪%.2f"),
                 'תאריך חיוב': st.column_config.DateColumn('Charge Date', format="DD-MM-YYYY"),
-                '4 ספרות אחרונות של כרטיס האשראי': st.column_config.TextColumn('Credit Card')
+                '4 ספרות אחרונות של כרטיס האשראי': st.column_config.TextColumn('Credit Card'),
+                store.ACCOUNT_COL: st.column_config.TextColumn('Account'),
+                'הערות': st.column_config.TextColumn('Notes'),
+                'תיוגים': st.column_config.TextColumn('Tags'),
             },
             hide_index=True,
             use_container_width=True,
-            height=700 if len(formatted_df) > 10 else None
-
         )
 
 
-def monthly_bar_tab(df, tab2):
+def monthly_bar_tab(monthly_data, tab2):
     with tab2:
         st.subheader("Monthly Expenses")
 
         # Monthly totals
-        monthly_data = df.groupby('חודש חיוב')['סכום חיוב'].sum().reset_index()
-        monthly_data = monthly_data.sort_values('חודש חיוב')
+        monthly_data = monthly_data.copy()
 
         monthly_data['Previous'] = monthly_data['סכום חיוב'].shift(1)
         monthly_data['Change'] = (monthly_data['סכום חיוב'] - monthly_data['Previous'])
@@ -234,7 +384,7 @@ def monthly_bar_tab(df, tab2):
 
         fig = go.Figure(data=[
             go.Bar(
-                x=monthly_data['חודש חיוב'],
+                x=monthly_data['חודש חיוב'].astype(str),
                 y=monthly_data['סכום חיוב'],
                 text=monthly_data.apply(
                     lambda row: f'₪{row["סכום חיוב"]:,.2f}<br>' +
@@ -259,13 +409,93 @@ def monthly_bar_tab(df, tab2):
         st.plotly_chart(fig, use_container_width=True)
 
 
-def ai_insights_tab(insights_file_path, tab4):
+@st.fragment(run_every=STREAMING_REFRESH_SEC)
+def streaming_insights_view():
+    """insights while they are generated. re-read every few seconds, until complete"""
+    partial_file = streaming_insights(INPUT_FILES_DIR)
+    try:
+        partial_text = partial_file.read_text(encoding='utf-8')
+    except (AttributeError, FileNotFoundError):
+        st.rerun()  # generation completed (or failed), show the latest insights
+    st.caption("Generating insights...")
+    st.markdown(partial_text)
+
+
+def recurring_tab(fingerprint: tuple, tab4):
     with tab4:
+        st.subheader("Subscriptions and Installments")
+        st.caption("Detected over all months: charges of a business every month or year, and installment plans")
+        subs, plans = get_recurring(fingerprint)
+        active = subs[subs['active'].astype(bool)]
+        remaining = recurring.active_installments(plans)
+
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Subscriptions per Month", f"₪{active['monthly_cost'].sum():,.2f}", f"{len(active)} active",
+                    delta_color="off")
+        col2.metric("Installments Left to Pay", f"₪{remaining['remaining_amount'].sum():,.2f}",
+                    f"{len(remaining)} plans", delta_color="off")
+        col3.metric("Price Changes", len(recurring.price_changes(active)))
+
+        st.markdown("**Subscriptions**")
+        if subs.empty:
+            st.info("No subscriptions found.")
+        else:
+            st.dataframe(
+                subs,
+                column_config={
+                    'merchant': st.column_config.TextColumn('Business'),
+                    'card': st.column_config.TextColumn('Credit Card'),
+                    'kind': st.column_config.TextColumn('Every'),
+                    'charges': st.column_config.NumberColumn('Charges'),
+                    'first': st.column_config.DateColumn('First', format="DD-MM-YYYY"),
+                    'last': st.column_config.DateColumn('Last', format="DD-MM-YYYY"),
+                    'amount': st.column_config.NumberColumn('Amount', format="₪%.2f"),
+                    'average': st.column_config.NumberColumn('Average', format="₪%.2f"),
+                    'interval_days': st.column_config.NumberColumn('Interval (days)'),
+                    'next_charge': st.column_config.DateColumn('Next Charge', format="DD-MM-YYYY"),
+                    'monthly_cost': st.column_config.NumberColumn('Monthly Cost', format="₪%.2f"),
+                    'previous_amount': st.column_config.NumberColumn('Previous Amount', format="₪%.2f"),
+                    'price_change': st.column_config.NumberColumn('Price Change', format="₪%.2f"),
+                    'price_changed_on': st.column_config.DateColumn('Changed On', format="DD-MM-YYYY"),
+                    'active': st.column_config.CheckboxColumn('Active'),
+                },
+                hide_index=True,
+                use_container_width=True,
+            )
+
+        st.markdown("**Installment plans**")
+        if plans.empty:
+            st.info("No installment plans found.")
+        else:
+            st.dataframe(
+                plans.astype({'last_month': str, 'end_month': str}).replace('NaT', None),
+                column_config={
+                    'merchant': st.column_config.TextColumn('Business'),
+                    'card': st.column_config.TextColumn('Credit Card'),
+                    'purchase_date': st.column_config.DateColumn('Purchased', format="DD-MM-YYYY"),
+                    'amount': st.column_config.NumberColumn('Payment', format="₪%.2f"),
+                    'payment': st.column_config.NumberColumn('Paid'),
+                    'payments': st.column_config.NumberColumn('Payments'),
+                    'remaining_payments': st.column_config.NumberColumn('Remaining'),
+                    'remaining_amount': st.column_config.NumberColumn('Left to Pay', format="₪%.2f"),
+                    'last_month': st.column_config.TextColumn('Last Charged'),
+                    'end_month': st.column_config.TextColumn('Ends'),
+                },
+                hide_index=True,
+                use_container_width=True,
+            )
+
+
+def ai_insights_tab(insights_file_path, tab5):
+    with tab5:
         st.subheader("💡 AI Insights")
+        if (os.getenv('DEMO') != '1') and streaming_insights(INPUT_FILES_DIR):
+            streaming_insights_view()
+            return
+
         insights_content = None
         try:
-            with open(insights_file_path, 'r', encoding='utf-8') as file:
-                insights_content = file.read()
+            insights_content = read_insights(insights_file_path, os.path.getmtime(insights_file_path))
         except Exception as e:
             logger.error(f"Error loading AI insights: {e}")
 
@@ -276,65 +506,136 @@ def ai_insights_tab(insights_file_path, tab4):
         st.caption("Last updated: " + datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
 
 
+def sql_tab(fingerprint: tuple, tab6):
+    with tab6:
+        st.subheader("SQL")
+        st.caption("Read only SELECT queries on the `expenses` view (duplicates excluded, amount in ₪) "
+                   "and the `transactions` table (amount_agorot). Columns: "
+                   + ", ".join(c for c in query_db.COLUMNS if c != 'seq'))
+        sql_query(fingerprint)
+
+
+@st.fragment
+def sql_query(fingerprint: tuple):
+    """the query runs when edited (ctrl+enter), rerunning only this panel"""
+    sql = st.text_area("Query", SQL_EXAMPLE, height=150, key="sql_query")
+    try:
+        result, sec = run_sql(fingerprint, sql)
+    except (sqlite3.Error, FileNotFoundError) as e:
+        st.error(f"Query failed: {e}")
+        return
+    st.caption(f"{len(result):,} rows in {sec * 1000:.1f} ms"
+               + (f" (first {query_db.DEFAULT_LIMIT:,})" if len(result) == query_db.DEFAULT_LIMIT else ""))
+    st.dataframe(result, hide_index=True, use_container_width=True)
+
+
+@st.fragment(run_every=REFRESH_CHECK_SEC)
+def refresh_watcher():
+    """rerun the app when the refresh daemon updated the store. the new fingerprint reloads the ledger,
+    and month versions recompute only the changed months"""
+    signal = sources.read_refresh_signal()
+    seen = st.session_state.setdefault('refresh_seen', signal)
+    if signal == seen:
+        return
+    st.session_state['refresh_seen'] = signal
+    logger.info(f"store refreshed at {signal['time']}, months: {signal['months']}")
+    st.toast(f"New statements: {', '.join(signal['months']) or 'no changes in totals'}")
+    st.rerun()
+
+
+def diagnostics_panel():
+    """stage timings and memory of the latest runs (see diagnostics.py). shown with ?diagnostics=1"""
+    with st.expander("🩺 Diagnostics", expanded=True):
+        spans = pd.DataFrame(read_spans(DIAGNOSTICS_SPANS))
+        if spans.empty:
+            st.info("No spans recorded yet.")
+            return
+        spans['time'] = pd.to_datetime(spans['start'], unit='s').dt.strftime('%Y-%m-%d %H:%M:%S')
+
+        st.markdown("**By stage**")
+        by_stage = spans.groupby('name').agg(
+            count=('duration_sec', 'size'),
+            mean_sec=('duration_sec', 'mean'),
+            p95_sec=('duration_sec', lambda d: d.quantile(0.95)),
+            max_sec=('duration_sec', 'max'),
+            peak_rss_mb=('peak_rss_mb', 'max'),
+            last_rows=('rows', 'last'),
+        ).sort_values('max_sec', ascending=False)
+        st.dataframe(by_stage.round(3), use_container_width=True)
+
+        st.markdown("**Latest spans**")
+        latest_cols = ['time', 'name', 'duration_sec', 'peak_rss_mb', 'peak_rss_growth_mb', 'rows', 'parent']
+        latest = spans.iloc[::-1].head(100).reindex(columns=latest_cols + ['attrs', 'error'])
+        latest['attrs'] = latest['attrs'].map(
+            lambda attrs: ', '.join(f"{k}={v}" for k, v in attrs.items()) if isinstance(attrs, dict) else None)
+        st.dataframe(latest.dropna(axis=1, how='all'), use_container_width=True, hide_index=True)
+
+
 def main():
     st.title("📊 Expenses Dashboard")
+    refresh_watcher()  # also while there is no data yet
 
-    # find md files
     if os.getenv('DEMO') == '1':
-        logger.info("using demo files")
-        files = list(Path(INPUT_FILES_DIR).glob('*demo_expenses*.md'))
         insights_file = Path(INPUT_FILES_DIR) / 'demo_insights.md'
     else:
-        files = list(Path(INPUT_FILES_DIR).glob('*transactions*.md'))
-        # latest insights file
-        insights_files = list(Path(INPUT_FILES_DIR).glob('user_insights_gemini_*.md'))
-        insights_files.sort(key=os.path.getmtime, reverse=True)
-        insights_file = insights_files[0] if insights_files else None
+        insights_file = latest_insights(INPUT_FILES_DIR)
 
     logger.debug(f"insights file: {insights_file}")
-    logger.info(f"found {len(files)} markdown files.")
 
-    df = pd.DataFrame()
-    for file in files:
-        try:
-            transactions = load_transactions(file)
-            logger.info(f"file: {Path(file).name}, transactions: {transactions.shape[0]}")
-            df = pd.concat([df, transactions], ignore_index=True)
-        except Exception as e:
-            st.error(f"Error loading data: {e}")
+    try:
+        fingerprint = sources.source_fingerprint()
+        cube = load_cube(fingerprint)
+    except Exception as e:
+        st.error(f"Error loading data: {e}")
+        return
 
-    if df.empty:
+    if cube.empty:
         st.error("No data found.")
         return
 
-    logger.debug(f"df size: {df.shape}")
-    logger.debug(sorted(df['חודש חיוב'].unique().tolist()))
-
-    # print(df.head())
+    months = get_months(fingerprint)
+    logger.debug(months)
 
     st.sidebar.header("Filters")
-    available_months = ['All'] + sorted(df['חודש חיוב'].unique().tolist(), reverse=True)
+    available_months = ['All'] + [str(m) for m in months[::-1]]
     selected_month = st.sidebar.selectbox("Select Month", available_months)
-
-    # filter data based on selection
-    if selected_month != 'All':
-        filtered_df = df[df['חודש חיוב'] == selected_month]
-    else:
-        filtered_df = df
+    query = st.sidebar.text_input("Search", placeholder="business, notes or tags", key="sidebar_search",
+                                  help="all months. spelling variants match too").strip()
 
     # summary metrics
+    month_version = get_month_version(fingerprint, selected_month)
+    total_expenses, num_transactions = get_summary(selected_month, month_version, fingerprint)
     col1, col2 = st.columns(2)
     with col1:
-        st.metric("Total Expenses", f"₪{filtered_df['סכום חיוב'].sum():,.2f}")
+        st.metric("Total Expenses", f"₪{total_expenses:,.2f}")
     with col2:
-        st.metric("Number of Transactions", len(filtered_df))
-
-    # tabs
-    tab1, tab2, tab3, tab4 = st.tabs(["Categories", "Monthly Trends", "Transactions", "AI Insights"])
-    categories_tab(filtered_df, tab1)
-    monthly_bar_tab(df, tab2)
-    transactions_table_tab(filtered_df, tab3)
-    ai_insights_tab(insights_file, tab4)
+        st.metric("Number of Transactions", num_transactions)
+
+    if query:
+        search_results(fingerprint, query)
+
+    # views
+    view = st.segmented_control("View", VIEWS, default=VIEWS[0], key="view", label_visibility="collapsed")
+    view = view or VIEWS[0]  # deselected
+    with span("render", month=selected_month, view=view) as render_span:
+        container = st.container()
+        if view == "Categories":
+            categories_tab(get_category_totals(selected_month, month_version, fingerprint), container)
+        elif view == "Monthly Trends":
+            monthly_bar_tab(get_monthly_totals(fingerprint), container)
+        elif view == "Transactions":
+            category_totals = get_category_totals(selected_month, month_version, fingerprint)
+            transactions_table_tab(fingerprint, selected_month, category_totals['קטגוריה'].tolist()[::-1], container)
+        elif view == "Recurring":
+            recurring_tab(fingerprint, container)
+        elif view == "AI Insights":
+            ai_insights_tab(insights_file, container)
+        elif view == "SQL":
+            sql_tab(fingerprint, container)
+        render_span.rows = num_transactions
+
+    if st.query_params.get("diagnostics") == "1":
+        diagnostics_panel()
 
 
 if __name__ == "__main__":
@@ -1,57 +1,209 @@
+"""
+python main.py                          download statements, update the store, generate insights, open the dashboard
+python main.py demo                     dashboard of the demo statements
+python main.py ui                       dashboard of the statements already downloaded
+python main.py ingest                   merge new or changed statements of the data folder into the store
+python main.py totals [--month 2024-12] monthly totals (or a month's categories), without loading pandas
+python main.py insights [--chunked]     generate AI insights
+python main.py refresh                  keep the dashboard up, download on a schedule and ingest new statements
+python main.py query "SELECT ..."       sql query of the transactions (see data_process/query_db.py)
+
+heavy dependencies (pandas, playwright, gemini) are imported only by the commands that use them.
+--demo runs any command on the demo statements.
+"""
+import argparse
 import logging
 import os
 import subprocess
 import sys
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 
-from expenses_tracker.ai.gemini import get_user_insights
-from expenses_tracker.config import Config
-from expenses_tracker.credit_cards.get_max_visa_files import login_and_download_from_max
-from expenses_tracker.data_process import process_credit_files
+from expenses_tracker.config import Config, setup_logging
+from expenses_tracker.data_process import ingest, sources
 
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.DEBUG, format="%(asctime)s - %(name)s - %(levelname)s - %(message)s")
 
 config = Config()
 
+STATEMENT_SUFFIXES = ('.xlsx', '.json')  # downloaded files the store reads (pdf files are only for validation)
+
 
-def run_ui():
-    # streamlit run dashboard.py
+def run_ui() -> subprocess.Popen | None:
+    """start the dashboard server (streamlit run dashboard.py), without waiting for it"""
     try:
         dashboard_path = Path(__file__).parent / "expenses_tracker/ui/dashboard.py"
-        subprocess.run(
-            ["streamlit", "run", dashboard_path],
-            capture_output=False,
-            text=True,
-            shell=True
-        )
+        return subprocess.Popen([sys.executable, "-m", "streamlit", "run", str(dashboard_path)])
     except Exception as e:
         print(f"failed to start streamlit: {e}")
+        return None
 
 
-if __name__ == '__main__':
+def run_pipeline():
+    """download -> ingest -> (dashboard, insights).
+    each statement is parsed as soon as it is downloaded, and the dashboard starts while insights are generated
+    (the AI tab shows them when ready)"""
+    from expenses_tracker.ai.gemini import get_user_insights
+    from expenses_tracker.credit_cards.get_max_visa_files_async import download_accounts_concurrently
+    from expenses_tracker.data_process import store
+    from expenses_tracker.pipeline import Pipeline
 
-    # os.environ['DEMO'] = '1'
-    if ((len(sys.argv) >= 2) and (sys.argv[1] == 'demo')) or os.getenv('DEMO'):
-        os.environ['DEMO'] = '1'
-        logger.info("demo mode")
+    accounts = config.max_accounts
+    if not accounts:
+        logger.warning("no MAX account in config.toml ([max_credentials] or [[max_accounts]]), nothing to download")
+    parse_pool = ThreadPoolExecutor(max_workers=2)
+    parsing = {}
+
+    def parse_when_downloaded(file):
+        if str(file).endswith(STATEMENT_SUFFIXES):
+            parsing[file] = parse_pool.submit(store.load_statement, file)
+
+    def download():
+        return download_accounts_concurrently(accounts, on_download=parse_when_downloaded)
+
+    def merge(download):
+        parsed = {}
+        for file, future in parsing.items():
+            try:
+                parsed[file] = future.result()
+            except Exception:
+                continue  # loaded again by the store, which logs the error
+        parse_pool.shutdown()
+        return ingest.refresh(download, parsed=parsed)
+
+    pipeline = Pipeline()
+    pipeline.add("download", download)
+    pipeline.add("ingest", merge, deps=["download"])
+    pipeline.add("dashboard", lambda ingest: run_ui(), deps=["ingest"])
+    pipeline.add("insights", lambda ingest: get_user_insights(), deps=["ingest"])
+    results = pipeline.run()
+    logger.info(f"pipeline timings:\n{pipeline.report()}")
+    return results.get("dashboard")
 
-        excel_files = list(
-            Path(config.data_folder).glob('demo*.xlsx'))  # demo excel generates random amounts when opened
-        for file in excel_files:
-            process_credit_files.to_markdown(str(file))
 
-        run_ui()
-    else:
-        # download from MAX
-        max_creds = config.max_credentials
-        excel_files = login_and_download_from_max(max_creds['username'], max_creds['password'])
+def run_demo():
+    excel_files = list(
+        Path(config.data_folder).glob('demo*.xlsx'))  # demo excel generates random amounts when opened
+    ingest.refresh(excel_files)
+    return run_ui()
 
-        # convert to md
-        for file in excel_files:
-            process_credit_files.to_markdown(file)
 
-        # gemini
-        insights_file = get_user_insights()
+def print_totals(month=None):
+    ingest.refresh()
+    summary = sources.read_summary()
+    if month:
+        categories = summary['categories'].get(month)
+        if not categories:
+            print(f"no transactions in {month}. months: {', '.join(summary['months'])}")
+            return
+        for category, total in sorted(categories.items(), key=lambda c: c[1], reverse=True):
+            print(f"{category:<30} {total:>12,.2f}")
+        print(f"{'total':<30} {summary['months'][month]['total']:>12,.2f}")
+        return
 
-        run_ui()
+    if not summary['months']:
+        print("no transactions found")
+        return
+    for month, totals in summary['months'].items():
+        print(f"{month:<10} {totals['total']:>12,.2f} {totals['count']:>6} transactions")
+
+
+def run_insights(chunked=False, period='M'):
+    from expenses_tracker.ai.gemini import get_user_insights
+
+    ingest.refresh()
+    insights_file = get_user_insights(chunked=chunked, period=period)
+    if insights_file is None:
+        sys.exit(1)
+    print(insights_file)
+
+
+def run_query(sql: str, limit: int):
+    import sqlite3
+    from expenses_tracker.data_process import query_db
+
+    ingest.refresh()
+    try:
+        columns, rows, sec = query_db.query(sources.query_db_path(), sql, limit=limit)
+    except (sqlite3.Error, FileNotFoundError) as e:
+        print(f"query failed: {e}")
+        sys.exit(1)
+    if columns:
+        print(query_db.format_table(columns, rows))
+    print(f"{len(rows):,} rows{' (limit)' if len(rows) == limit else ''} in {sec * 1000:.1f} ms")
+
+
+def run_refresh(download=True, ui=True):
+    """refresh daemon (see refresh_daemon.py), with the dashboard running next to it"""
+    from expenses_tracker.refresh_daemon import RefreshDaemon
+
+    daemon = RefreshDaemon(download=download)
+    daemon.ingest()
+    ui_process = run_ui() if ui else None
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        logger.info("refresh stopped")
+    finally:
+        if ui_process:
+            ui_process.terminate()
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="credit card expenses downloader, tracker and visualizer")
+    parser.add_argument('--demo', action='store_true', help="use the demo statements")
+    commands = parser.add_subparsers(dest='command')
+    commands.add_parser('run', help="download, ingest, insights and dashboard (default)")
+    commands.add_parser('demo', help="dashboard of the demo statements")
+    commands.add_parser('ui', help="dashboard of the statements already downloaded")
+    commands.add_parser('ingest', help="merge new or changed statements into the store")
+    totals = commands.add_parser('totals', help="monthly totals")
+    totals.add_argument('--month', help="yyyy-mm: totals by category of the month")
+    insights = commands.add_parser('insights', help="generate AI insights")
+    insights.add_argument('--chunked', action='store_true', help="summarize each period, then combine")
+    insights.add_argument('--period', default='M', choices=['M', 'Q'])
+    refresh = commands.add_parser('refresh', help="keep the dashboard up, download on a schedule and ingest "
+                                                  "new statements as they appear")
+    refresh.add_argument('--no-download', action='store_true', help="only watch the data folder")
+    refresh.add_argument('--no-ui', action='store_true', help="without starting the dashboard")
+    query = commands.add_parser('query', help="sql query of the transactions: the 'expenses' view, or the "
+                                              "'transactions' table (with duplicates)")
+    query.add_argument('sql')
+    query.add_argument('--limit', type=int, default=100, help="rows to print")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.demo or (args.command == 'demo') or os.getenv('DEMO'):
+        os.environ['DEMO'] = '1'
+    command = args.command or ('demo' if sources.is_demo() else 'run')
+    setup_logging(logging.WARNING if command in ['totals', 'query'] else logging.DEBUG)
+    logger.info(f"command: {command}{' (demo)' if sources.is_demo() else ''}")
+
+    ui_process = None
+    if command == 'run':
+        ui_process = run_pipeline()
+    elif command == 'demo':
+        ui_process = run_demo()
+    elif command == 'ui':
+        ingest.refresh()
+        ui_process = run_ui()
+    elif command == 'ingest':
+        changed = ingest.refresh()
+        print(f"store {'updated' if changed else 'up to date'}: {sources.store_path()}")
+    elif command == 'totals':
+        print_totals(args.month)
+    elif command == 'insights':
+        run_insights(args.chunked, args.period)
+    elif command == 'refresh':
+        run_refresh(download=not args.no_download, ui=not args.no_ui)
+    elif command == 'query':
+        run_query(args.sql, args.limit)
+
+    if ui_process:
+        ui_process.wait()
+
+
+if __name__ == '__main__':
+    main()
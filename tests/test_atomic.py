@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from expenses_tracker.data_process.atomic import FileLock, pid_alive
+
+posix_only = pytest.mark.skipif(os.name == 'nt', reason="pids are not checked on windows")
+
+
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+
+@posix_only
+def test_lock_of_dead_process_is_taken_over(tmp_path):
+    path = tmp_path / "store.lock"
+    path.write_text(str(dead_pid()))
+    lock = FileLock(path)
+    assert lock.acquire(timeout_sec=1)
+    assert path.read_text() == str(os.getpid())
+    lock.release()
+    assert not path.exists()
+
+
+@posix_only
+def test_lock_of_running_process_is_kept_however_old(tmp_path):
+    path = tmp_path / "store.lock"
+    path.write_text(str(os.getppid()))
+    os.utime(path, (0, 0))
+    assert pid_alive(os.getppid())
+    assert not FileLock(path, stale_sec=1).acquire(timeout_sec=0.5)
+    assert path.exists()
+
+
+def test_release_keeps_a_lock_taken_over(tmp_path):
+    path = tmp_path / "store.lock"
+    lock = FileLock(path)
+    with lock:
+        path.write_text(str(os.getppid()))  # another process took it over
+    assert path.read_text() == str(os.getppid())
+
+
+def test_reentrant(tmp_path):
+    path = tmp_path / "store.lock"
+    lock = FileLock(path)
+    with lock:
+        with lock:
+            assert path.exists()
+        assert path.exists()
+    assert not path.exists()
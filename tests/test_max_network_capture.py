@@ -0,0 +1,85 @@
+"""
+replay of MAX api responses: the capture path must give the same transactions as the excel statement of the same
+month. the fixture (data/fixtures/max_transactions_responses.json, december 2024) is synthetic: it was built from
+the demo statement, in the payload format max_network_capture.py expects, which is not verified against the live
+api. so these tests check the mapping to statement columns and types, not the api format; a real recorded capture
+should replace the fixture.
+"""
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from expenses_tracker.credit_cards.max_network_capture import (
+    TRANSACTIONS_API, load_fixture, read_captured_transactions, transactions_from_responses
+)
+from expenses_tracker.data_process.transactions import read_excel_transactions
+
+DATA_DIR = Path(__file__).parent.parent / "expenses_tracker" / "data"
+FIXTURE = DATA_DIR / "fixtures" / "max_transactions_responses.json"
+STATEMENT = DATA_DIR / "demo_expenses_דצמבר 2024.xlsx"
+
+AMOUNT_COL = 'סכום חיוב'
+# typed by clean_transactions in both paths
+TYPED_COLS = ['תאריך עסקה', 'תאריך חיוב', 'חודש חיוב', AMOUNT_COL]
+
+
+@pytest.fixture(scope="module")
+def captured() -> pd.DataFrame:
+    return read_captured_transactions(FIXTURE)
+
+
+@pytest.fixture(scope="module")
+def statement() -> pd.DataFrame:
+    return read_excel_transactions(STATEMENT)
+
+
+def test_columns_match_statement(captured, statement):
+    # the api has no tags / discount columns, the rest are the statement's columns, in its order
+    assert list(captured.columns) == [c for c in statement.columns if c in captured.columns]
+    assert set(TYPED_COLS) <= set(captured.columns)
+    for col in TYPED_COLS:
+        assert captured[col].dtype == statement[col].dtype, col
+
+
+def test_same_month(captured, statement):
+    assert set(captured['חודש חיוב']) == set(statement['חודש חיוב']) == {pd.Period('2024-12', 'M')}
+
+
+def test_totals_match_statement(captured, statement):
+    assert len(captured) == len(statement)
+    assert captured[AMOUNT_COL].sum() == pytest.approx(statement[AMOUNT_COL].sum())
+
+
+@pytest.mark.parametrize("by", ['קטגוריה', '4 ספרות אחרונות של כרטיס האשראי', 'סוג עסקה', 'תאריך עסקה'])
+def test_grouped_totals_match_statement(captured, statement, by):
+    captured_totals = captured.groupby(by)[AMOUNT_COL].sum()
+    statement_totals = statement.groupby(by)[AMOUNT_COL].sum()
+    pd.testing.assert_series_equal(captured_totals, statement_totals, check_exact=False)
+
+
+def transactions_response(body) -> dict:
+    return {'url': f"https://onlinelcapi.max.co.il{TRANSACTIONS_API}", 'status': 200, 'body': body}
+
+
+@pytest.mark.parametrize("responses", [
+    [],
+    [transactions_response({'data': {}})],
+    [transactions_response({'result': {'items': []}})],
+    [transactions_response({'result': {'transactions': [{'date': '2024-11-03', 'amount': 10}]}})],
+    [transactions_response({'result': {'transactions': [
+        {'purchaseDate': 'soon', 'paymentDate': None, 'merchantName': 'x', 'actualPaymentAmount': None}]}})],
+])
+def test_unexpected_payload_fails(responses):
+    with pytest.raises(ValueError, match="unexpected MAX api payload"):
+        transactions_from_responses(responses)
+
+
+def test_month_without_transactions():
+    df = transactions_from_responses([transactions_response({'result': {'transactions': []}})])
+    assert df.empty
+
+
+def test_fixture_categories_are_named(captured):
+    ids = {str(c['id']) for c in load_fixture(FIXTURE)[0]['body']['result']}
+    assert not set(captured['קטגוריה']) & ids
@@ -0,0 +1,49 @@
+"""the sql panel and `main.py query` run user input: only reads are allowed"""
+import sqlite3
+
+import pytest
+
+from expenses_tracker.data_process import query_db
+
+
+@pytest.fixture
+def db(tmp_path):
+    path = tmp_path / "transactions.sqlite"
+    query_db.connect(path).close()
+    return path
+
+
+def test_select(db):
+    columns, rows, _ = query_db.query(db, "-- totals\nWITH t AS (SELECT amount FROM expenses) SELECT count(*) FROM t")
+    assert columns == ['count(*)']
+    assert rows == [(0,)]
+
+
+@pytest.mark.parametrize("sql", [
+    "ATTACH DATABASE '{other}' AS e",
+    "SELECT 1; ATTACH DATABASE '{other}' AS e",
+    "DELETE FROM transactions",
+    "INSERT INTO transactions (source, seq, amount_agorot) VALUES ('x', 0, 1)",
+    "WITH t AS (SELECT 1) DELETE FROM transactions",
+    "PRAGMA journal_mode=DELETE",
+    "SELECT * FROM pragma_table_info('transactions')",
+])
+def test_refused(db, tmp_path, sql):
+    other = tmp_path / "other.db"
+    with pytest.raises(sqlite3.Error):
+        query_db.query(db, sql.format(other=other))
+    assert not other.exists()
+
+
+def test_authorizer_denies_attach_and_writes(db, tmp_path):
+    # the authorizer alone, for statements check_select would let through
+    other = tmp_path / "other.db"
+    conn = sqlite3.connect(db)
+    conn.set_authorizer(query_db.authorize_query)
+    try:
+        for sql in [f"ATTACH DATABASE '{other}' AS e", "CREATE TABLE z (x)", "DELETE FROM duplicates"]:
+            with pytest.raises(sqlite3.DatabaseError, match="not authorized"):
+                conn.execute(sql)
+    finally:
+        conn.close()
+    assert not other.exists()
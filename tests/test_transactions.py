@@ -0,0 +1,38 @@
+import pandas as pd
+import pytest
+
+from expenses_tracker.data_process.transactions import load_transactions, read_excel_transactions
+
+CARD_COL = '4 ספרות אחרונות של כרטיס האשראי'
+HEADER = ['תאריך עסקה', 'שם בית העסק', 'קטגוריה', CARD_COL, 'סוג עסקה', 'סכום חיוב', 'תאריך חיוב']
+
+
+def write_statement(path, rows):
+    """a statement like MAX's: user and month rows above the header, a total row at the bottom, and a foreign
+    transactions sheet"""
+    sheet = [['user'], ['12/2024'], HEADER, *rows, [None, None, None, None, 'סך הכל', 100]]
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame(sheet).to_excel(writer, sheet_name='עסקאות במועד החיוב', header=False, index=False)
+        pd.DataFrame([HEADER]).to_excel(writer, sheet_name='עסקאות חו"ל ומט"ח', header=False, index=False)
+
+
+def test_read_excel_transactions_cards(tmp_path):
+    path = tmp_path / "transactions_2024-12.xlsx"
+    write_statement(path, [
+        ['03-11-2024', 'סופרמרקט', 'מזון וצריכה', 1234, 'רגילה', 60, '01-12-2024'],
+        ['04-11-2024', 'מסעדה', 'מסעדות, קפה וברים', 123, 'רגילה', 40, '01-12-2024'],
+        ['05-11-2024', 'העברה', 'שונות', None, 'רגילה', 0.5, '01-12-2024'],
+    ])
+    df = read_excel_transactions(path)
+    assert len(df) == 3
+    assert df[CARD_COL].tolist()[:2] == ['1234', '0123']
+    assert df[CARD_COL].isna().tolist() == [False, False, True]
+    assert df['סכום חיוב'].sum() == 100.5
+    assert (df['חודש חיוב'] == pd.Period('2024-12', 'M')).all()
+
+
+def test_load_transactions_without_table(tmp_path):
+    path = tmp_path / "transactions_2024-12.md"
+    path.write_text("# statement\n\nno transactions\n", encoding='utf-8')
+    with pytest.raises(ValueError, match="no transactions table"):
+        load_transactions(path)